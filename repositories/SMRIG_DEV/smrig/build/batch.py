@@ -0,0 +1,485 @@
+"""
+Headless batch builder.
+
+Builds many (job, asset, variant) combinations, each in its own worker
+process, with a bounded number of workers running at the same time. Workers
+report their progress as json lines prefixed with MESSAGE_PREFIX on stdout,
+every other output line is kept as the build log. Builds that run longer than
+the timeout are killed. A summary of all builds can be written to a json file.
+
+The default worker command runs this module in mayapy. Any command that
+follows the message protocol can be used instead, ie. the stub worker of this
+module that simulates a build without maya::
+
+	builder = BatchBuilder(builds, command=[sys.executable, batch.__file__, "--stub-worker",
+	                                        "{job}", "{asset}", "{variant}"])
+
+Messages sent by a worker::
+
+	{"type": "start", "steps": 80}
+	{"type": "step", "index": 0, "label": "New scene", "status": "success", "time": 0.1}
+	{"type": "done", "status": "success"}
+
+Command line::
+
+	mayapy batch.py --workers 4 --timeout 3600 --summary summary.json job:asset:variant ...
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+try:
+	# python 3
+	import queue
+
+except:
+	# python 2.7
+	import Queue as queue
+
+log = logging.getLogger("smrig.build.batch")
+
+MESSAGE_PREFIX = "@@smrig "
+LOG_TAIL_LENGTH = 50
+POLL_INTERVAL = 0.1
+
+
+def get_mayapy():
+	"""
+	:return: path to mayapy of the running maya or MAYA_LOCATION, "mayapy" otherwise
+	:rtype: str
+	"""
+	executable = "mayapy.exe" if sys.platform == "win32" else "mayapy"
+	maya_location = os.environ.get("MAYA_LOCATION")
+
+	if maya_location and os.path.isfile(os.path.join(maya_location, "bin", executable)):
+		return os.path.join(maya_location, "bin", executable)
+
+	return executable
+
+
+def get_default_command():
+	"""
+	:return: worker command building a rig in mayapy
+	:rtype: list
+	"""
+	return [get_mayapy(), os.path.abspath(__file__).replace(".pyc", ".py"), "--worker", "{job}", "{asset}", "{variant}"]
+
+
+def emit(message_type, **kwargs):
+	"""
+	Send a message from a worker to the batch builder.
+
+	:param str message_type: start, step or done
+	:param kwargs: message data
+	"""
+	kwargs["type"] = message_type
+	sys.stdout.write(MESSAGE_PREFIX + json.dumps(kwargs) + "\n")
+	sys.stdout.flush()
+
+
+def parse_message(line):
+	"""
+	:param str line: worker output line
+	:return: message, None if the line is not a message
+	:rtype: dict/None
+	"""
+	if not line.startswith(MESSAGE_PREFIX):
+		return
+
+	try:
+		return json.loads(line[len(MESSAGE_PREFIX):])
+	except ValueError:
+		return
+
+
+class BatchBuilder(object):
+	"""
+	Run builds in parallel worker processes.
+
+	USAGE:
+		builder = BatchBuilder([("job", "asset", "base"), ("job", "asset", "anim")], workers=2, timeout=3600)
+		results = builder.run()
+		builder.write_summary("/path/to/summary.json")
+	"""
+
+	def __init__(self, builds, command=None, workers=2, timeout=None, on_message=None, env=None):
+		"""
+		:param list builds: (job, asset, variant) tuples
+		:param list command: worker command, {job}, {asset} and {variant} are replaced per build
+		:param int workers: max number of builds running at the same time
+		:param float timeout: seconds after which a build is killed, no timeout when None
+		:param func on_message: called with (build result, message) for every worker message
+		:param dict env: environment of the worker processes, defaults to the current one
+		"""
+		self.builds = [tuple(b) for b in builds]
+		self.command = command if command else get_default_command()
+		self.workers = max(1, workers)
+		self.timeout = timeout
+		self.on_message = on_message
+		self.env = env
+		self.results = []
+		self.start_time = None
+		self.end_time = None
+
+	def get_command(self, build):
+		"""
+		:param tuple build: (job, asset, variant)
+		:return: worker command for a build
+		:rtype: list
+		"""
+		job, asset, variant = build
+		return [c.format(job=job, asset=asset, variant=variant) for c in self.command]
+
+	def start_build(self, build, lines):
+		"""
+		Start the worker process of a build, its output is read on a thread
+		and put on the lines queue.
+
+		:param tuple build: (job, asset, variant)
+		:param queue.Queue lines: receives (result, line) tuples, line is None at the end of the output
+		:return: build result
+		:rtype: dict
+		"""
+		job, asset, variant = build
+		result = {"job": job,
+		          "asset": asset,
+		          "variant": variant,
+		          "status": "running",
+		          "returncode": None,
+		          "start_time": time.time(),
+		          "wall_time": None,
+		          "step_count": None,
+		          "steps": [],
+		          "failed_step": None,
+		          "error": None,
+		          "log": collections.deque(maxlen=LOG_TAIL_LENGTH)}
+
+		try:
+			process = subprocess.Popen(self.get_command(build),
+			                           stdout=subprocess.PIPE,
+			                           stderr=subprocess.STDOUT,
+			                           env=self.env,
+			                           universal_newlines=True)
+
+		except OSError as e:
+			result["status"] = "error"
+			result["error"] = str(e)
+			result["wall_time"] = 0.0
+			log.error("Could not start build {}: {}".format(build, e))
+			return result
+
+		def read():
+			for line in iter(process.stdout.readline, ""):
+				lines.put((result, line.rstrip("\r\n")))
+
+			process.stdout.close()
+			lines.put((result, None))
+
+		thread = threading.Thread(target=read)
+		thread.daemon = True
+		thread.start()
+
+		result["process"] = process
+		result["eof"] = False
+		log.info("Started build {} {} {}".format(job, asset, variant))
+
+		return result
+
+	def handle_line(self, result, line):
+		"""
+		Process an output line of a worker.
+
+		:param dict result: build result
+		:param str line:
+		"""
+		if line is None:
+			result["eof"] = True
+			return
+
+		message = parse_message(line)
+		if message is None:
+			result.get("log").append(line)
+			return
+
+		message_type = message.get("type")
+
+		if message_type == "start":
+			result["step_count"] = message.get("steps")
+
+		elif message_type == "step":
+			result.get("steps").append(message)
+			if message.get("status") != "success" and result.get("failed_step") is None:
+				result["failed_step"] = message.get("index")
+
+		elif message_type == "done":
+			result["error"] = message.get("error")
+			result["done_status"] = message.get("status")
+
+		log.debug("{} {}: {}".format(result.get("asset"), result.get("variant"), message))
+
+		if self.on_message:
+			self.on_message(result, message)
+
+	def finish_build(self, result, status=None):
+		"""
+		:param dict result: build result
+		:param str status: force the status, ie. timeout
+		"""
+		process = result.pop("process")
+		result.pop("eof", None)
+
+		result["returncode"] = process.returncode
+		result["wall_time"] = time.time() - result.get("start_time")
+
+		if status:
+			result["status"] = status
+		elif process.returncode == 0 and result.pop("done_status", None) == "success":
+			result["status"] = "success"
+		else:
+			result["status"] = "failed"
+
+		result.pop("done_status", None)
+		log.info("Finished build {} {} {}: {} ({:.1f}s)".format(result.get("job"),
+		                                                        result.get("asset"),
+		                                                        result.get("variant"),
+		                                                        result.get("status"),
+		                                                        result.get("wall_time")))
+
+	def run(self):
+		"""
+		Run all builds, at most workers at a time.
+
+		:return: build results in the order of the builds
+		:rtype: list
+		"""
+		self.start_time = time.time()
+		self.results = []
+
+		pending = collections.deque(self.builds)
+		running = []
+		lines = queue.Queue()
+
+		while pending or running:
+			while pending and len(running) < self.workers:
+				result = self.start_build(pending.popleft(), lines)
+				self.results.append(result)
+
+				if "process" in result:
+					running.append(result)
+
+			try:
+				result, line = lines.get(timeout=POLL_INTERVAL)
+				self.handle_line(result, line)
+
+				# drain without blocking so chatty workers don't slow down the loop
+				while True:
+					result, line = lines.get_nowait()
+					self.handle_line(result, line)
+
+			except queue.Empty:
+				pass
+
+			for result in list(running):
+				process = result.get("process")
+
+				if self.timeout and time.time() - result.get("start_time") > self.timeout:
+					process.kill()
+					process.wait()
+					self.finish_build(result, status="timeout")
+					running.remove(result)
+
+				elif process.poll() is not None and result.get("eof"):
+					self.finish_build(result)
+					running.remove(result)
+
+		self.end_time = time.time()
+		return self.results
+
+	def get_summary(self):
+		"""
+		:return: summary of all builds
+		:rtype: dict
+		"""
+		builds = []
+		for result in self.results:
+			result = dict(result)
+			result["log"] = list(result.get("log") or [])
+			result.pop("process", None)
+			result.pop("eof", None)
+			builds.append(result)
+
+		counts = collections.Counter(b.get("status") for b in builds)
+
+		return {"start_time": self.start_time,
+		        "wall_time": (self.end_time or time.time()) - (self.start_time or time.time()),
+		        "total": len(builds),
+		        "succeeded": counts.get("success", 0),
+		        "failed": counts.get("failed", 0),
+		        "timed_out": counts.get("timeout", 0),
+		        "errors": counts.get("error", 0),
+		        "builds": builds}
+
+	def write_summary(self, file_path):
+		"""
+		Write the summary as json.
+
+		:param str file_path:
+		:return: summary
+		:rtype: dict
+		"""
+		summary = self.get_summary()
+		with open(file_path, "w") as f:
+			json.dump(summary, f, indent=4, sort_keys=True)
+
+		log.info("Wrote batch build summary: {}".format(file_path))
+		return summary
+
+
+# Workers -----------------------------------------------------------------------------
+
+
+def run_worker(job, asset, variant):
+	"""
+	Build a rig in mayapy and report every step to the batch builder.
+
+	:param str job:
+	:param str asset:
+	:param str variant:
+	:return: exit code
+	:rtype: int
+	"""
+	import maya.standalone
+	maya.standalone.initialize(name="python")
+
+	try:
+		from smrig import env
+		from smrig.build import common
+
+		env.set_job(job)
+		env.asset.set_asset(asset)
+		env.asset.set_variant(variant)
+
+		manager = common.Manager()
+		manager.reload_manager()
+		manager.current_step_index = 0
+
+		emit("start", steps=len(manager.build_list))
+
+		# the step index is read from the manager so labels and timings always belong to the step that ran
+		while manager.current_step_index < len(manager.build_list):
+			index = int(manager.current_step_index)
+			label = manager.build_list[index].get("label")
+			step_time = time.time()
+
+			try:
+				manager.build_next_step()
+
+			except Exception as e:
+				emit("step", index=index, label=label, status="failed", time=time.time() - step_time)
+				emit("done", status="failed", error=str(e))
+				return 1
+
+			if manager.current_step_index == index:
+				emit("step", index=index, label=label, status="failed", time=time.time() - step_time)
+				emit("done", status="failed", error="Step {} did not complete.".format(index))
+				return 1
+
+			emit("step", index=index, label=label, status="success", time=time.time() - step_time)
+
+		emit("done", status="success")
+		return 0
+
+	except Exception as e:
+		emit("done", status="failed", error=str(e))
+		return 1
+
+	finally:
+		maya.standalone.uninitialize()
+
+
+def run_stub_worker(job, asset, variant, steps=3, delay=0.0, fail_step=None):
+	"""
+	Simulate a build without maya, used to test the batch builder.
+
+	:param str job:
+	:param str asset:
+	:param str variant:
+	:param int steps: number of steps
+	:param float delay: seconds per step
+	:param int fail_step: index of a step that fails
+	:return: exit code
+	:rtype: int
+	"""
+	emit("start", steps=steps)
+
+	for index in range(steps):
+		print("Building {} {} {} step {}".format(job, asset, variant, index))
+		time.sleep(delay)
+
+		if index == fail_step:
+			emit("step", index=index, label="step {}".format(index), status="failed", time=delay)
+			emit("done", status="failed", error="Step {} failed".format(index))
+			return 1
+
+		emit("step", index=index, label="step {}".format(index), status="success", time=delay)
+
+	emit("done", status="success")
+	return 0
+
+
+def main(args=None):
+	"""
+	Command line entry point for the batch builder and its workers.
+
+	:param list args:
+	:return: exit code
+	:rtype: int
+	"""
+	parser = argparse.ArgumentParser(description="Build rigs in parallel headless maya sessions.")
+	parser.add_argument("builds", nargs="*", help="job:asset:variant")
+	parser.add_argument("--workers", type=int, default=2)
+	parser.add_argument("--timeout", type=float, default=None, help="seconds per build")
+	parser.add_argument("--summary", default=None, help="write summary json here")
+	parser.add_argument("--worker", nargs=3, metavar=("JOB", "ASSET", "VARIANT"), help="run a single build")
+	parser.add_argument("--stub-worker", nargs=3, metavar=("JOB", "ASSET", "VARIANT"), help="simulate a build")
+	parser.add_argument("--stub-steps", type=int, default=3)
+	parser.add_argument("--stub-delay", type=float, default=0.0)
+	parser.add_argument("--stub-fail-step", type=int, default=None)
+	args = parser.parse_args(args)
+
+	if args.worker:
+		return run_worker(*args.worker)
+
+	if args.stub_worker:
+		return run_stub_worker(*args.stub_worker,
+		                       steps=args.stub_steps,
+		                       delay=args.stub_delay,
+		                       fail_step=args.stub_fail_step)
+
+	logging.basicConfig(level=logging.INFO)
+
+	builds = [b.split(":") for b in args.builds]
+	invalid = [b for b in builds if len(b) != 3]
+	if invalid:
+		parser.error("Builds must be job:asset:variant, got: {}".format(invalid))
+
+	builder = BatchBuilder(builds, workers=args.workers, timeout=args.timeout)
+	builder.run()
+
+	summary = builder.write_summary(args.summary) if args.summary else builder.get_summary()
+	log.info("{} builds: {} succeeded, {} failed, {} timed out.".format(summary.get("total"),
+	                                                                 summary.get("succeeded"),
+	                                                                 summary.get("failed") + summary.get("errors"),
+	                                                                 summary.get("timed_out")))
+
+	return 0 if summary.get("succeeded") == summary.get("total") else 1
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -1,10 +1,15 @@
 import getpass
+import glob
+import hashlib
+import json
 import logging
 import os
 
 import maya.cmds as cmds
 import maya.mel as mel
 from smrig import env
+from smrig.build import loader
+from smrig.build import profiler
 from smrig.lib import decoratorslib
 from smrig.lib import iolib
 from smrig.lib import pathlib
@@ -12,7 +17,11 @@ from smrig.lib import utilslib
 
 log = logging.getLogger("smrig.build")
 
-CACHE_NAME_FORMAT = "{}_{}_{}_{}_smrig_build_step_cache.mb"
+CACHE_NAME_FORMAT = "{}_{}_{}_{}_{}_smrig_build_step_cache.mb"
+CACHE_NAME_PATTERN = "*_smrig_build_step_cache.mb"
+STATE_NAME_FORMAT = "{}_{}_{}_smrig_build_state.json"
+STEP_HASH_KEYS = ["item_type", "import_code", "command_code", "enabled", "inputs"]
+DATA_INPUT_PREFIX = "data:"
 
 exec("""
 try:
@@ -38,6 +47,8 @@ class Manager():
 		self.current_step_index = 0
 		self.build_list = []
 		self.data = {}
+		self.profile = None
+		self.step_hashes = None
 
 		self.reload_manager()
 
@@ -136,6 +147,65 @@ class Manager():
 		cmds.setAttr("{}.currentIndex".format(self.status_node), self.current_step_index)
 		cmds.setAttr("{}.buildStatus".format(self.status_node), status_list, type="string")
 
+	def get_step_hashes(self):
+		"""
+		Get a hash per build step that identifies the scene state after running
+		it. Every hash includes the hash of the previous step, the step code,
+		the modification time of the step module and the fingerprint of the
+		inputs declared by the step, so a change invalidates that step and all
+		steps after it. When no step declares inputs the fingerprint of the
+		whole asset data folder is used instead.
+
+		:return: step hashes
+		:rtype: list
+		"""
+		data_path = env.asset.get_data_path()
+		declared = any(s.get("inputs") for s in self.build_list)
+
+		# without declared inputs any change in the data folder invalidates all steps
+		previous = get_files_fingerprint(data_path) if data_path and not declared else ""
+
+		results = []
+		for step_data in self.build_list:
+			step = [step_data.get(k) for k in STEP_HASH_KEYS]
+
+			file_path = step_data.get("file_path")
+			if file_path and os.path.isfile(file_path):
+				stat = os.stat(file_path)
+				step.append([stat.st_size, stat.st_mtime])
+
+			if step_data.get("inputs"):
+				step.append(get_inputs_fingerprint(step_data.get("inputs")))
+
+			content = json.dumps([previous, step], sort_keys=True).encode("utf-8")
+			previous = hashlib.sha1(content).hexdigest()
+			results.append(previous)
+
+		return results
+
+	def get_build_hashes(self):
+		"""
+		Get the step hashes of the current build, they are computed once when
+		the build starts and reused for every step.
+
+		:return: step hashes
+		:rtype: list
+		"""
+		if self.step_hashes is None:
+			self.step_hashes = self.get_step_hashes()
+
+		return self.step_hashes
+
+	def get_cache_file_path(self, index, step_hash):
+		"""
+		:param int index: step index
+		:param str step_hash: step hash
+		:return: cache file path of a build step
+		:rtype: str
+		"""
+		file_name = CACHE_NAME_FORMAT.format(self.asset, self.variant, getpass.getuser(), index, step_hash[:16])
+		return os.path.join(env.prefs.get_cache_directory(), file_name)
+
 	def cache_build_step(self, index):
 		"""
 		Save cache file to prefs cache directory.
@@ -149,10 +219,7 @@ class Manager():
 		utilslib.scene.remove_unknown_nodes()
 		utilslib.scene.remove_unknown_plugins()
 
-		file_path = os.path.join(cache_path, CACHE_NAME_FORMAT.format(self.asset,
-		                                                              self.variant,
-		                                                              getpass.getuser(),
-		                                                              index))
+		file_path = self.get_cache_file_path(index, self.get_build_hashes()[index])
 		try:
 			cmds.file(file_path, pr=1, ea=1, f=1, type='mayaBinary')
 			log.debug("Cached build step: {}".format(file_path))
@@ -160,24 +227,134 @@ class Manager():
 		except Exception as e:
 			log.warning("Could not save build step cache file.")
 
-	def check_imports(self):
+		self.evict_cache()
+
+	def find_cached_step(self, last_index=None):
+		"""
+		Find the latest build step with a valid cache file.
+
+		:param int last_index: only look at steps up to this index
+		:return: step index and cache file path, (None, None) if there is no valid cache
+		:rtype: tuple
+		"""
+		step_hashes = self.get_build_hashes()
+		last_index = len(step_hashes) - 1 if last_index is None else min(last_index, len(step_hashes) - 1)
+
+		for index in range(last_index, -1, -1):
+			file_path = self.get_cache_file_path(index, step_hashes[index])
+			if os.path.isfile(file_path):
+				return index, file_path
+
+		return None, None
+
+	def resume_from_cache(self, last_index=None):
 		"""
-		Check module imports and update status
+		Open the latest valid build step cache file and mark all steps up to it
+		as built.
 
+		:param int last_index: only look at steps up to this index
+		:return: index of the next step to build, 0 if there is no valid cache
+		:rtype: int
+		"""
+		index, file_path = self.find_cached_step(last_index)
+		if index is None:
+			log.info("No valid build step cache found.")
+			return 0
+
+		cmds.file(file_path, o=True, f=True)
+		os.utime(file_path, None)
+
+		for i in range(index + 1):
+			self.build_list[i]["status"] = "success"
+
+		self.current_step_index = index + 1
+		self.update_status_node()
+
+		log.info("Resumed build from step {}: {}".format(index, self.build_list[index].get("label")))
+		return index + 1
+
+	def evict_cache(self, budget=None):
+		"""
+		Delete build step cache files until they fit in the disk budget. The
+		budget covers the cache files of every asset and variant in the cache
+		directory. Files of this asset, variant and user that are not valid for
+		the current build list go first, then the least recently used files.
+
+		:param int budget: budget in MB, defaults to the prefs cache budget
+		:return: deleted files
+		:rtype: list
+		"""
+		budget = env.prefs.get_cache_budget() if budget is None else budget
+		budget = budget * 1024 * 1024
+
+		step_hashes = self.get_build_hashes()
+		valid = set(self.get_cache_file_path(i, h) for i, h in enumerate(step_hashes))
+		prefix = "{}_{}_{}_".format(self.asset, self.variant, getpass.getuser())
+
+		files = []
+		for file_path in glob.glob(os.path.join(env.prefs.get_cache_directory(), CACHE_NAME_PATTERN)):
+			try:
+				stat = os.stat(file_path)
+			except OSError:
+				continue
+
+			stale = os.path.basename(file_path).startswith(prefix) and file_path not in valid
+			files.append((not stale, stat.st_mtime, stat.st_size, file_path))
+
+		total = sum(f[2] for f in files)
+		deleted = []
+
+		for _, _, size, file_path in sorted(files):
+			if total <= budget:
+				break
+
+			try:
+				os.remove(file_path)
+			except OSError:
+				continue
+
+			total -= size
+			deleted.append(file_path)
+			log.debug("Evicted build step cache: {}".format(file_path))
+
+		return deleted
+
+	def check_imports(self, threads=4):
+		"""
+		Check module imports and update status. The python step modules are
+		first checked for syntax errors in parallel threads, modules are only
+		reloaded when their file changed since they were last loaded.
+
+		:param int threads: number of threads compiling the step modules
 		:return:
 		"""
-		for step_data in self.build_list:
+		file_paths = {}
+		for index, step_data in enumerate(self.build_list):
+			if (step_data.get("item_type") or "").lower() != "python":
+				continue
+
+			for _, module_names in loader.parse_import(step_data.get("import_code")) or []:
+				for module_name in module_names:
+					file_path = loader.find_file_path(module_name)
+					if file_path:
+						file_paths[index] = file_path
+						break
+
+		errors = loader.validate(file_paths.values(), threads=threads)
+
+		for index, step_data in enumerate(self.build_list):
 			import_code = step_data.get("import_code")
-			item_type = step_data.get("item_type")
-			index = self.build_list.index(step_data) if step_data in self.build_list else -1
+			item_type = step_data.get("item_type") or ""
 
 			try:
 				if item_type.lower() == "python":
-					exec("{}".format(import_code))
-					exec("reload({})".format(import_code.split(" ")[-1]))
+					error = errors.get(file_paths.get(index))
+					if error:
+						self.build_list[index]["file_path"] = file_paths.get(index)
+						self.build_list[index]["status"] = error
+						continue
 
-					file_path = eval("{}.__file__".format(import_code.split(" ")[-1]))
-					file_path = file_path.replace(".pyc", ".py") if file_path else ""
+					_, file_path = loader.load(import_code)
 					self.build_list[index]["file_path"] = file_path
 
 				elif item_type.lower() == "mel":
@@ -189,6 +366,27 @@ class Manager():
 				err = err[0] if err else "Error"
 				self.build_list[index]["status"] = err
 
+	def get_import_timings(self):
+		"""
+		Get the import and reload times of the python step modules.
+
+		:return: [(step label, file path, import time, reload time, reload count)]
+		:rtype: list
+		"""
+		timings = loader.get_timings()
+		results = []
+
+		for step_data in self.build_list:
+			timing = timings.get(step_data.get("file_path"))
+			if timing:
+				results.append((step_data.get("label"),
+				                step_data.get("file_path"),
+				                timing.get("import_time"),
+				                timing.get("reload_time"),
+				                timing.get("reloads")))
+
+		return results
+
 	def build_step_from_data(self, step_data):
 		"""
 		Run the step code based on step dict.
@@ -211,21 +409,31 @@ class Manager():
 			return True
 
 		elif command_code:
+			sample = self.profile.start_step() if self.profile else None
+
 			try:
 				msg = "Buidling step {}: {}\n\n\tlabel: {}\n\tcode type: {}\n\texecuting code:\n\t\t{}\n\t\t{}\n"
 				msg = msg.format(index, "-" * 60, label, item_type, import_code, command_code)
 				log.debug(msg)
 
 				if item_type.lower() == "python":
-					exec("{}\n{}\n{}".format(import_code, import_code.split(" ")[-1], command_code))
+					# step code runs with the globals of this module like it always did
+					namespace, _ = loader.load(import_code, dict(globals()))
+					exec(command_code, namespace)
 
 				elif item_type.lower() == "mel":
 					mel.eval("{};{}".format(import_code, command_code))
 
+				if sample:
+					self.profile.end_step(sample, index, label, "success")
+
 				msg = "Completed step {}: {} {}".format(index, label, "-" * 60)
 				log.info(msg)
 
 			except Exception as e:
+				if sample:
+					self.profile.end_step(sample, index, label, "failed")
+
 				msg = "Failed step {}: {} {}".format(index, label, "-" * 60)
 				log.info(msg)
 				log.error(utilslib.py.get_exception())
@@ -248,38 +456,152 @@ class Manager():
 			return
 
 		index = int(self.current_step_index)
+		if not index or not self.profile:
+			self.profile = profiler.BuildProfile(self.asset, self.variant, env.prefs.get_profile_scene_counts())
+			self.step_hashes = None
+
 		result = self.build_step_from_data(self.build_list[index])
 
 		if result is True:
 			self.build_list[self.current_step_index]["status"] = "success"
 			self.current_step_index = index + 1
 			self.update_status_node()
+			self.record_step(index)
+
+			if self.current_step_index >= len(self.build_list):
+				self.write_profile()
 
 		elif type(result) is Exception:
 			err = utilslib.py.get_exception_info(result)
 			err = err[0] if err else "Error"
 			self.build_list[self.current_step_index]["status"] = err
 			self.update_status_node()
+			self.write_profile()
 			raise result
 
-	def build_steps(self, restart=False, start_index=None, last_index=None):
+	def get_state_file_path(self):
+		"""
+		:return: file path of the recorded step hashes in the prefs cache directory
+		:rtype: str
+		"""
+		file_name = STATE_NAME_FORMAT.format(self.asset, self.variant, getpass.getuser())
+		return os.path.join(env.prefs.get_cache_directory(), file_name)
+
+	def read_state(self):
+		"""
+		:return: hashes of the steps recorded after their last successful run
+		:rtype: list
+		"""
+		file_path = self.get_state_file_path()
+		if not os.path.isfile(file_path):
+			return []
+
+		try:
+			return iolib.json.read(file_path).get("steps", [])
+		except Exception:
+			return []
+
+	def record_step(self, index, step_hashes=None):
+		"""
+		Record the hash of a successfully built step.
+
+		:param int index: step index
+		:param list step_hashes: current step hashes, the hashes of the current build when not provided
+		"""
+		step_hashes = step_hashes if step_hashes else self.get_build_hashes()
+		recorded = self.read_state()[:len(step_hashes)]
+		recorded.extend([None] * (len(step_hashes) - len(recorded)))
+		recorded[index] = step_hashes[index]
+
+		try:
+			pathlib.make_dirs(env.prefs.get_cache_directory())
+			iolib.json.write(self.get_state_file_path(), {"steps": recorded})
+		except Exception as e:
+			log.warning("Could not record build state: {}".format(e))
+
+	def get_changed_step(self, step_hashes=None):
+		"""
+		Get the earliest step whose code, module or declared inputs changed since
+		its last successful run.
+
+		:param list step_hashes: current step hashes, computed when not provided
+		:return: step index, the step count when nothing changed
+		:rtype: int
+		"""
+		step_hashes = step_hashes if step_hashes else self.get_build_hashes()
+		recorded = self.read_state()
+
+		for index, step_hash in enumerate(step_hashes):
+			if index >= len(recorded) or recorded[index] != step_hash:
+				return index
+
+		return len(step_hashes)
+
+	def get_incremental_start(self, last_index=None):
+		"""
+		Get the step an incremental build starts from. The steps already built
+		in the scene are kept when they didn't change, otherwise the latest valid
+		build step cache before the first changed step is opened.
+
+		:param int last_index: end range
+		:return: index of the first step to build
+		:rtype: int
+		"""
+		step_hashes = self.get_build_hashes()
+		changed = self.get_changed_step(step_hashes)
+
+		built = 0
+		for status in self.status:
+			if status != "success":
+				break
+			built += 1
+
+		if changed < len(step_hashes):
+			log.info("First changed step {}: {}".format(changed, self.build_list[changed].get("label")))
+
+		if built and changed >= built:
+			return built
+
+		if not changed:
+			return 0
+
+		last_index = changed - 1 if last_index is None else min(last_index, changed - 1)
+		return self.resume_from_cache(last_index)
+
+	def build_steps(self, restart=False, start_index=None, last_index=None, resume=False, incremental=False):
 		"""
 		Run through the remaining build or rebuild from start to finish.
 
 		:param bool restart: Start from beginning
 		:param int start_index: start range
 		:param int last_index: end range
+		:param bool resume: when restarting, continue from the latest valid build step cache
+		:param bool incremental: only rebuild from the first step whose code or declared inputs changed
 		:return: Result, True if succeeded, Exception if failed
 		:rtype: None
 		"""
 		self.current_step_index = 0 if restart else self.current_step_index
 		self.current_step_index = start_index if start_index else self.current_step_index
+		complete_index = len(self.build_list) - 1
+		self.step_hashes = None
+
+		# incremental and resume return the next step to build, not the last built one
+		if incremental and not start_index:
+			self.current_step_index = self.get_incremental_start(last_index)
+			complete_index = len(self.build_list)
+
+		elif restart and resume and not start_index:
+			self.current_step_index = self.resume_from_cache(last_index)
+			complete_index = len(self.build_list)
 
-		if self.current_step_index >= len(self.build_list) - 1:
+		if self.current_step_index >= complete_index:
 			log.info("Build is complete.")
 			return
 
 		index = int(self.current_step_index)
+		self.profile = profiler.BuildProfile(self.asset, self.variant, env.prefs.get_profile_scene_counts())
+		step_hashes = self.get_build_hashes()
+
 		for index in range(index, len(self.build_list)):
 			result = self.build_step_from_data(self.build_list[index])
 
@@ -287,6 +609,7 @@ class Manager():
 				self.build_list[index]["status"] = "success"
 				self.current_step_index = index
 				self.update_status_node()
+				self.record_step(index, step_hashes)
 
 			elif type(result) is Exception:
 				err = utilslib.py.get_exception_info(result)
@@ -294,14 +617,45 @@ class Manager():
 				self.build_list[self.current_step_index]["status"] = err
 				self.current_step_index = index - 1
 				self.update_status_node()
+				self.write_profile()
 				raise result
 
 			if last_index and index == last_index:
+				self.write_profile()
 				log.info("Completed selected steps.")
 				return
 
+		self.write_profile()
 		log.info("Build is complete.")
 
+	def write_profile(self):
+		"""
+		Append the profile of the current build to the build history file next
+		to the build file, see :mod:`smrig.build.profiler`.
+
+		:return:
+		"""
+		if self.profile and self.path:
+			self.profile.write(profiler.get_history_file(self.path))
+
+		self.profile = None
+		self.step_hashes = None
+
+	def get_profile_report(self, baseline_size=5, threshold=0.2, metric="wall_time"):
+		"""
+		Compare the latest build of this variant against the builds before it.
+
+		:param int baseline_size: number of previous builds in the baseline
+		:param float threshold: relative increase flagged as a regression
+		:param str metric: wall_time, cpu_time, peak_rss, nodes, dag_nodes or connections
+		:return: per step comparison
+		:rtype: list
+		"""
+		results = profiler.get_report(profiler.get_history_file(self.path), self.variant, baseline_size, threshold,
+		                              metric)
+		log.info("\n" + profiler.format_report(results, metric))
+		return results
+
 	def write_build_list(self):
 		"""
 		write build list to disk
@@ -323,6 +677,94 @@ class Manager():
 				"label": item.get("label"),
 			})
 
+			if item.get("inputs"):
+				build_list[-1]["inputs"] = item.get("inputs")
+
 		data[self.variant] = build_list
 		iolib.json.write(self.path, data)
 		log.debug("Wrote build list to disk")
+
+
+def get_files_fingerprint(directory):
+	"""
+	Get a hash of the names, sizes and modification times of all files in a
+	directory, hidden files and folders are ignored.
+
+	:param str directory:
+	:return: sha1 hex digest
+	:rtype: str
+	"""
+	sha = hashlib.sha1()
+
+	for root, dirs, files in os.walk(directory):
+		dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+
+		for file_name in sorted(f for f in files if not f.startswith(".")):
+			file_path = os.path.join(root, file_name)
+			try:
+				stat = os.stat(file_path)
+			except OSError:
+				continue
+
+			relative_path = os.path.relpath(file_path, directory).replace(os.sep, "/")
+			sha.update("{}|{}|{}\n".format(relative_path, stat.st_size, stat.st_mtime).encode("utf-8"))
+
+	return sha.hexdigest()
+
+
+def resolve_inputs(inputs):
+	"""
+	Resolve the inputs declared by a build step into paths. Inputs can be:
+		- "data:<type>", the folder of a data type in the asset data folder
+		- paths with {rigbuild}, {data}, {asset} and {variant} tokens
+		- paths relative to the rigbuild folder
+		- glob patterns, ie. "{rigbuild}/../model/*.mb" picks up new model versions
+
+	:param str/list inputs:
+	:return: resolved paths
+	:rtype: list
+	"""
+	rigbuild_path = env.asset.get_rigbuild_path()
+	data_path = env.asset.get_data_path()
+	tokens = {"rigbuild": rigbuild_path,
+	          "data": data_path,
+	          "asset": env.asset.get_asset(),
+	          "variant": env.asset.get_variant()}
+
+	results = []
+	for item in utilslib.conversion.as_list(inputs):
+		if item.startswith(DATA_INPUT_PREFIX):
+			path = os.path.join(data_path, item[len(DATA_INPUT_PREFIX):])
+		else:
+			path = os.path.expanduser(item.format(**tokens))
+			path = path if os.path.isabs(path) else os.path.join(rigbuild_path, path)
+
+		path = os.path.normpath(path)
+		results.extend(sorted(glob.glob(path)) if glob.has_magic(path) else [path])
+
+	return results
+
+
+def get_inputs_fingerprint(inputs):
+	"""
+	Get a hash of the declared inputs of a build step, files are identified by
+	their size and modification time, folders by all files inside them.
+
+	:param str/list inputs:
+	:return: sha1 hex digest
+	:rtype: str
+	"""
+	sha = hashlib.sha1()
+
+	for path in resolve_inputs(inputs):
+		if os.path.isdir(path):
+			fingerprint = get_files_fingerprint(path)
+		elif os.path.isfile(path):
+			stat = os.stat(path)
+			fingerprint = "{}|{}".format(stat.st_size, stat.st_mtime)
+		else:
+			fingerprint = "missing"
+
+		sha.update("{}|{}\n".format(path, fingerprint).encode("utf-8"))
+
+	return sha.hexdigest()
@@ -0,0 +1,193 @@
+"""
+In memory cache of the DNA readers used by the MetaHuman calibration steps.
+
+A session reads every DNA file once and keeps the reader in memory as long as
+the file doesn't change on disk. Calibrated readers are kept per source file
+until a step saves them, the saved reader then becomes the reader of the
+destination file so the next step doesn't parse it again.
+
+The session doesn't import the DNA libraries, the read, calibrate and save
+functions are passed in so it can be used with a fake reader:
+
+	session = DNASession(read_dna, DNACalibDNAReader, save_dna)
+	calibrated = session.get_calibrated(character_dna)
+	...
+	session.save(calibrated, mesh_dna)
+	reader = session.get_reader(mesh_dna)  # no file read
+
+Steps that modify a calibrated reader get a fresh copy of the source reader
+(reset=True) and release the calibrated readers when they fail, so running a
+step again after a failure never applies its changes twice.
+"""
+import functools
+import logging
+import os
+
+log = logging.getLogger("smrig.build.dnasession")
+
+
+def get_stamp(path):
+	"""
+	:param str path:
+	:return: size and modification time of a file, None if it does not exist
+	:rtype: tuple/None
+	"""
+	try:
+		stat = os.stat(path)
+		return stat.st_size, stat.st_mtime
+	except OSError:
+		return None
+
+
+class DNASession(object):
+	"""
+	Cache of DNA readers and calibrated readers keyed by file path.
+	"""
+
+	def __init__(self, read_func, calibrate_func, save_func):
+		"""
+		:param func read_func: read a DNA file, returns a reader
+		:param func calibrate_func: create a calibrated copy of a reader
+		:param func save_func: save a reader to a DNA file
+		"""
+		self.read_func = read_func
+		self.calibrate_func = calibrate_func
+		self.save_func = save_func
+
+		self.readers = {}
+		self.calibrated = {}
+		self.stats = {"reads": 0, "hits": 0, "saves": 0}
+
+	@staticmethod
+	def get_key(path):
+		"""
+		:param str path:
+		:return: cache key of a file path
+		:rtype: str
+		"""
+		return os.path.normcase(os.path.abspath(path))
+
+	def get_reader(self, path):
+		"""
+		Get the reader of a DNA file, the file is only read again when it
+		changed on disk.
+
+		:param str path:
+		:return: reader
+		"""
+		key = self.get_key(path)
+		stamp = get_stamp(path)
+		entry = self.readers.get(key)
+
+		if entry and entry[0] == stamp:
+			self.stats["hits"] += 1
+			return entry[1]
+
+		if entry:
+			self.invalidate(path)
+
+		reader = self.read_func(path)
+		self.readers[key] = (stamp, reader)
+		self.stats["reads"] += 1
+
+		log.debug("Read DNA: {}".format(path))
+		return reader
+
+	def get_calibrated(self, path, reset=False):
+		"""
+		Get the calibrated reader of a DNA file. The same calibrated reader is
+		returned until it is saved or invalidated, changes made by a step are
+		seen by the next step.
+
+		:param str path:
+		:param bool reset: start from a new calibrated copy of the source reader,
+			steps modifying the calibrated reader in place use this
+		:return: calibrated reader
+		"""
+		key = self.get_key(path)
+		reader = self.get_reader(path)
+		entry = self.calibrated.get(key)
+
+		if entry and entry[0] is reader and not reset:
+			return entry[1]
+
+		calibrated = self.calibrate_func(reader)
+		self.calibrated[key] = (reader, calibrated)
+		return calibrated
+
+	def save(self, reader, path):
+		"""
+		Save a reader to a DNA file. The reader becomes the cached reader of
+		the file, a saved calibrated reader is released from its source file so
+		the next step starts from the source again.
+
+		:param reader:
+		:param str path:
+		"""
+		self.save_func(reader, path)
+		self.stats["saves"] += 1
+
+		for key in [k for k, e in self.calibrated.items() if e[1] is reader]:
+			self.calibrated.pop(key)
+
+		self.invalidate(path)
+		self.readers[self.get_key(path)] = (get_stamp(path), reader)
+
+	def invalidate(self, path=None):
+		"""
+		Drop the cached readers of a DNA file, call this after a file is written
+		outside the session.
+
+		:param str path: all files when None
+		"""
+		if path is None:
+			self.readers.clear()
+			self.calibrated.clear()
+			return
+
+		key = self.get_key(path)
+		self.readers.pop(key, None)
+		self.calibrated.pop(key, None)
+
+	def release_calibrated(self):
+		"""
+		Drop all calibrated readers, ie. after a step failed half way through
+		modifying them.
+		"""
+		self.calibrated.clear()
+
+	def release_on_error(self, func):
+		"""
+		Decorator releasing the calibrated readers when the step fails, the
+		next run starts from the source readers again.
+
+		:param func func: step function
+		:return: wrapped step function
+		:rtype: func
+		"""
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			try:
+				return func(*args, **kwargs)
+			except Exception:
+				self.release_calibrated()
+				raise
+
+		return wrapper
+
+	def run(self, steps):
+		"""
+		Run steps in this session, calibrated readers are released when a step
+		fails.
+
+		:param list steps: step functions
+		"""
+		for step in steps:
+			try:
+				step()
+			except Exception:
+				self.release_calibrated()
+				raise
+
+		log.debug("DNA session: {}".format(self.stats))
@@ -0,0 +1,255 @@
+"""
+Cached loading of build step modules.
+
+Step modules are imported once and only reloaded when their file changed on
+disk, the cache is keyed by the resolved file path and its modification time.
+Modules that were already imported before their first load are reloaded once,
+they may be older than their file.
+Import and reload timings are kept per module. Step modules can be checked for
+syntax errors in parallel threads without importing them, so the scene is not
+touched.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+try:
+	import queue
+except:
+	import Queue as queue
+
+try:
+	from importlib import reload
+except ImportError:
+	pass
+
+try:
+	from importlib import util as importlib_util
+except ImportError:
+	importlib_util = None
+	import pkgutil
+
+log = logging.getLogger("smrig.build.loader")
+
+IMPORT_RE = re.compile(r"^\s*import\s+([\w.]+)(?:\s+as\s+(\w+))?\s*$")
+FROM_IMPORT_RE = re.compile(r"^\s*from\s+([\w.]+)\s+import\s+(\w+)(?:\s+as\s+(\w+))?\s*$")
+
+MODULE_CACHE = {}
+COMPILE_CACHE = {}
+
+
+def parse_import(import_code):
+	"""
+	Get the modules of simple import statements, ie. "import a.b as c" or
+	"from a import b". The candidates are ordered from most to least specific,
+	"from a import b" can import module "a.b" or attribute "b" of module "a".
+
+	:param str import_code:
+	:return: [(bound name, [module name candidates])], None if the code is not a simple import
+	:rtype: list/None
+	"""
+	results = []
+	for line in [l for l in re.split(r"[;\n]", import_code or "") if l.strip()]:
+		match = IMPORT_RE.match(line)
+		if match:
+			module_name, alias = match.groups()
+			results.append((alias or module_name.split(".")[0], [module_name]))
+			continue
+
+		match = FROM_IMPORT_RE.match(line)
+		if match:
+			package, name, alias = match.groups()
+			results.append((alias or name, ["{}.{}".format(package, name), package]))
+			continue
+
+		return None
+
+	return results
+
+
+def get_file_path(module):
+	"""
+	:param module module:
+	:return: source file path of a module, empty string for built in modules
+	:rtype: str
+	"""
+	file_path = getattr(module, "__file__", None) or ""
+	if file_path.endswith((".pyc", ".pyo")):
+		file_path = file_path[:-1]
+
+	return os.path.abspath(file_path) if file_path else ""
+
+
+def find_file_path(module_name):
+	"""
+	Find the source file of a module without importing it. Parent packages may
+	be imported to resolve the path.
+
+	:param str module_name:
+	:return: source file path, empty string if not found
+	:rtype: str
+	"""
+	if module_name in sys.modules:
+		return get_file_path(sys.modules.get(module_name))
+
+	try:
+		if importlib_util is not None:
+			spec = importlib_util.find_spec(module_name)
+			file_path = spec.origin if spec and spec.has_location else ""
+		else:
+			loader = pkgutil.find_loader(module_name)
+			file_path = loader.get_filename() if loader else ""
+
+	except Exception:
+		return ""
+
+	return file_path if file_path and file_path.endswith(".py") else ""
+
+
+def get_stamp(file_path):
+	"""
+	:param str file_path:
+	:return: size and modification time of a file, None if it does not exist
+	:rtype: tuple/None
+	"""
+	try:
+		stat = os.stat(file_path)
+		return stat.st_size, stat.st_mtime
+	except OSError:
+		return None
+
+
+def load(import_code, namespace=None):
+	"""
+	Import the modules of a step, modules are reloaded only when their file
+	changed since they were last loaded. A module imported before its first
+	load (ie. by another tool) is reloaded the first time it is seen.
+
+	:param str import_code:
+	:param dict namespace: globals the import code runs in, a new dict when None
+	:return: namespace holding the imported names, source file path of the step module
+	:rtype: tuple
+	"""
+	namespace = {} if namespace is None else namespace
+	imported = set(sys.modules)
+	start = time.time()
+	exec(import_code, namespace)
+	import_time = time.time() - start
+
+	file_path = ""
+	for name, module_names in parse_import(import_code) or []:
+		modules = [sys.modules.get(n) for n in module_names if sys.modules.get(n) is not None]
+		module = modules[0] if modules else sys.modules.get(getattr(namespace.get(name), "__module__", None))
+		if module is None:
+			continue
+
+		file_path = get_file_path(module)
+		stamp = get_stamp(file_path) if file_path else None
+		entry = MODULE_CACHE.get(file_path)
+
+		if entry is None:
+			# only a module imported by the code above is known to match its file
+			entry = MODULE_CACHE[file_path] = {"module": module.__name__,
+			                                   "stamp": None if module.__name__ in imported else stamp,
+			                                   "import_time": import_time,
+			                                   "reload_time": None,
+			                                   "reloads": 0}
+
+		if stamp != entry.get("stamp"):
+			start = time.time()
+			module = reload(module)
+			exec(import_code, namespace)
+
+			entry.update({"stamp": stamp, "reload_time": time.time() - start, "reloads": entry.get("reloads") + 1})
+			log.debug("Reloaded changed module: {}".format(file_path))
+
+	return namespace, file_path
+
+
+def compile_file(file_path):
+	"""
+	Compile a module file to check it for syntax errors, the result is cached
+	until the file changes.
+
+	:param str file_path:
+	:return: error message, None when the file compiled
+	:rtype: str/None
+	"""
+	stamp = get_stamp(file_path)
+	if stamp is None:
+		return None
+
+	cached = COMPILE_CACHE.get(file_path)
+	if cached and cached[0] == stamp:
+		return cached[1]
+
+	error = None
+	try:
+		with open(file_path, "rb") as f:
+			compile(f.read(), file_path, "exec", dont_inherit=True)
+
+	except SyntaxError as e:
+		error = "SyntaxError: {} ({}, line {})".format(e.msg, os.path.basename(file_path), e.lineno)
+
+	except (TypeError, ValueError) as e:
+		error = "{}: {}".format(e.__class__.__name__, e)
+
+	COMPILE_CACHE[file_path] = (stamp, error)
+	return error
+
+
+def validate(file_paths, threads=4):
+	"""
+	Compile module files in parallel threads.
+
+	:param list file_paths:
+	:param int threads:
+	:return: {file path: error message or None}
+	:rtype: dict
+	"""
+	file_paths = sorted(set(p for p in file_paths if p))
+	results = {}
+	jobs = queue.Queue()
+
+	for file_path in file_paths:
+		jobs.put(file_path)
+
+	def worker():
+		while True:
+			try:
+				file_path = jobs.get_nowait()
+			except queue.Empty:
+				return
+
+			results[file_path] = compile_file(file_path)
+
+	workers = [threading.Thread(target=worker) for _ in range(max(1, min(threads, len(file_paths))))]
+	for thread in workers:
+		thread.daemon = True
+		thread.start()
+
+	for thread in workers:
+		thread.join()
+
+	return results
+
+
+def get_timings():
+	"""
+	:return: {file path: {module, import_time, reload_time, reloads}}
+	:rtype: dict
+	"""
+	return dict((k, dict((n, v) for n, v in e.items() if n != "stamp")) for k, e in MODULE_CACHE.items() if k)
+
+
+def clear_cache():
+	"""
+	Clear the module and compile caches, all modules reload on their next load.
+	"""
+	for entry in MODULE_CACHE.values():
+		entry["stamp"] = None
+
+	COMPILE_CACHE.clear()
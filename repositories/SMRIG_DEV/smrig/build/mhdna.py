@@ -4,12 +4,15 @@ Imports the `contextlib` module, which provides utilities for working with conte
 import json
 import os
 import sys
+import time
 from os import environ
 from sys import path as syspath
 from sys import platform
 
+from smrig.build import dnasession
 from smrig.build import mh
 from smrig.lib import pathlib
+from smrig.lib import pointslib
 
 # if you use Maya, use absolute path
 ROOT_DIR = r"C:/Users/briol/Documents/maya/scripts/SMRIG_DEV/dna_calibration"
@@ -226,6 +229,22 @@ def get_mesh_vertex_positions_from_scene(meshName):
 		return None
 
 
+def get_mesh_points_from_scene(mesh_name):
+	"""
+	Get the object space vertex positions of a mesh as one flat float buffer
+	(x0, y0, z0, x1, ...), queried in a single call.
+
+	:param str mesh_name:
+	:return: flat points, None if the mesh is missing
+	:rtype: list/None
+	"""
+	if not cmds.objExists(mesh_name):
+		print(f"{mesh_name} is missing, skipping it")
+		return None
+
+	return cmds.xform(f"{mesh_name}.vtx[*]", query=True, objectSpace=True, translation=True)
+
+
 def run_joints_command(reader, calibrated):
 	"""
 	This function runs joints command to set the neutral translations and rotations of all joints in the reader.
@@ -280,7 +299,7 @@ def run_joints_command(reader, calibrated):
 		raise RuntimeError(f"Error run_joints_command: {status.message}")
 
 
-def run_vertices_command(calibrated, old_vertices_positions, new_vertices_positions, mesh_index):
+def run_vertices_command(calibrated, old_vertices_positions, new_vertices_positions, mesh_index, epsilon=0.0):
 	"""
 	This function takes in several parameters and performs the following steps:
 
@@ -296,6 +315,9 @@ def run_vertices_command(calibrated, old_vertices_positions, new_vertices_positi
 	- old_vertices_positions: A list of old vertex positions.
 	- new_vertices_positions: A list of new vertex positions.
 	- mesh_index: The index of the mesh.
+	- epsilon: Vertices whose delta components are all within epsilon are left unchanged.
+
+	Positions can be flat buffers (x0, y0, z0, x1, ...) or lists of [x, y, z].
 
 	Raises:
 	- RuntimeError: If there is an error during the execution of the commands.
@@ -312,13 +334,17 @@ def run_vertices_command(calibrated, old_vertices_positions, new_vertices_positi
 	run_vertices_command(calibrated, old_vertices_positions, new_vertices_positions, mesh_index)
 
 	"""
+	if old_vertices_positions is None or new_vertices_positions is None:
+		print(f"Skipping mesh {mesh_index}, vertex positions are missing")
+		return
+
 	# Making deltas between old vertices positions and new one
-	deltas = []
-	for new_vertex, old_vertex in zip(new_vertices_positions, old_vertices_positions):
-		delta = []
-		for new, old in zip(new_vertex, old_vertex):
-			delta.append(new - old)
-		deltas.append(delta)
+	start = time.time()
+	deltas, changed = pointslib.get_deltas(old_vertices_positions, new_vertices_positions, epsilon)
+
+	if not changed:
+		print(f"Mesh {mesh_index} unchanged, skipping it")
+		return
 
 	# This is step 5 sub-step c
 	new_neutral_mesh = SetVertexPositionsCommand(
@@ -334,6 +360,8 @@ def run_vertices_command(calibrated, old_vertices_positions, new_vertices_positi
 		status = Status.get()
 		raise RuntimeError(f"Error run_vertices_command: {status.message}")
 
+	print(f"Moved {len(changed)} of {len(deltas)} vertices of mesh {mesh_index} in {time.time() - start:.3f}s")
+
 
 def prepare_rotated_dna(dna_path, rotated_dna_path):
 	"""
@@ -348,16 +376,14 @@ def prepare_rotated_dna(dna_path, rotated_dna_path):
 
 	Note that this function assumes the presence of the `read_dna`, `save_dna`, and `DNA` classes/functions, which are not shown here.
 	"""
-	reader = read_dna(dna_path)
-
 	# Copies DNA contents and will serve as input/output parameter to commands
-	calibrated = DNACalibDNAReader(reader)
+	calibrated = SESSION.get_calibrated(dna_path, reset=True)
 
 	# Modifies calibrated DNA in-place
 	rotate = RotateCommand([90.0, 0.0, 0.0], [0.0, 0.0, 0.0])
 	rotate.run(calibrated)
 
-	save_dna(calibrated, rotated_dna_path)
+	SESSION.save(calibrated, rotated_dna_path)
 	return DNA(rotated_dna_path)
 
 
@@ -803,6 +829,10 @@ root_joint = "spine_04"
 add_vtx_color = True
 fbx_root = "root"
 character_name = "BaseMH"
+vertex_epsilon = 1e-5  # scene units, smaller vertex deltas are not written to the dna
+
+# dna files are read once and kept in memory across the steps
+SESSION = dnasession.DNASession(read_dna, DNACalibDNAReader, save_dna)
 
 
 ########################################################################################################################
@@ -846,8 +876,8 @@ def step_one():
 
 	# Steps
 	show_meshes(character_dna)
-	reader = read_dna(character_dna)
-	calibrated = DNACalibDNAReader(reader)
+	reader = SESSION.get_reader(character_dna)
+	calibrated = SESSION.get_calibrated(character_dna)
 	print("STEP ONE DONE")
 
 
@@ -879,8 +909,8 @@ def step_two():
 
 	It is important to note that this code appears to be a part of a larger script, and its correct execution depends on the proper implementation of the other parts of the script.
 	"""
-	reader = read_dna(character_dna)
-	calibrated = DNACalibDNAReader(reader)
+	reader = SESSION.get_reader(character_dna)
+	calibrated = SESSION.get_calibrated(character_dna)
 	model = pathlib.normpath(os.path.join(mh.get_mh_rigbuild_dir(), "metahuman", "sourceAssets", "mh_2_sm_model.mb"))
 	cmds.file(model, i=True, mergeNamespacesOnClash=True, namespace=":")
 	jnts = cmds.listRelatives("neck_01", ad=True, type="joint")
@@ -890,6 +920,7 @@ def step_two():
 ##################################
 # This is step 3
 ##################################
+@SESSION.release_on_error
 def step_three():
 	"""
 	This code snippet is a part of a software development project and is responsible for performing certain operations on DNA data. Here's a brief explanation of the code:
@@ -928,44 +959,45 @@ def step_three():
 
 	Note: This documentation assumes that there are other functions and variables defined elsewhere in the code, but they are not included in the given snippet.
 	"""
-	reader = read_dna(character_dna)
-	calibrated = DNACalibDNAReader(reader)
+	reader = SESSION.get_reader(character_dna)
+	calibrated = SESSION.get_calibrated(character_dna, reset=True)
 
 	lod_mesh = "head_lod0_mesh"
 	sm_mesh = "head_MH2SM"
 	run_vertices_command(
-		calibrated, get_mesh_vertex_positions_from_scene(lod_mesh),
-		get_mesh_vertex_positions_from_scene(sm_mesh), 0
+		calibrated, get_mesh_points_from_scene(lod_mesh),
+		get_mesh_points_from_scene(sm_mesh), 0, epsilon=vertex_epsilon
 	)
 
 	lod_mesh = "teeth_lod0_mesh"
 	sm_mesh = "teeth_MH2SM"
 	run_vertices_command(
-		calibrated, get_mesh_vertex_positions_from_scene(lod_mesh),
-		get_mesh_vertex_positions_from_scene(sm_mesh), 1
+		calibrated, get_mesh_points_from_scene(lod_mesh),
+		get_mesh_points_from_scene(sm_mesh), 1, epsilon=vertex_epsilon
 	)
 
 	lod_mesh = "eyeLeft_lod0_mesh"
 	sm_mesh = "eyeLeft_MH2SM"
 	run_vertices_command(
-		calibrated, get_mesh_vertex_positions_from_scene(lod_mesh),
-		get_mesh_vertex_positions_from_scene(sm_mesh), 3
+		calibrated, get_mesh_points_from_scene(lod_mesh),
+		get_mesh_points_from_scene(sm_mesh), 3, epsilon=vertex_epsilon
 	)
 
 	lod_mesh = "eyeRight_lod0_mesh"
 	sm_mesh = "eyeRight_MH2SM"
 	run_vertices_command(
-		calibrated, get_mesh_vertex_positions_from_scene(lod_mesh),
-		get_mesh_vertex_positions_from_scene(sm_mesh), 4
+		calibrated, get_mesh_points_from_scene(lod_mesh),
+		get_mesh_points_from_scene(sm_mesh), 4, epsilon=vertex_epsilon
 	)
 
-	save_dna(calibrated, mesh_dna)
+	SESSION.save(calibrated, mesh_dna)
 
 
 ##################################
 # This is step 4
 ##################################
 
+@SESSION.release_on_error
 def step_four():
 	"""
 	This code snippet is a part of a software that performs certain operations on 3D meshes and joints in Autodesk Maya.
@@ -1032,8 +1064,8 @@ def step_four():
 	Please note that this documentation is based on the code provided and may not encompass the entire functionality of the software.
 	"""
 	build_meshes(mesh_dna)
-	reader = read_dna(mesh_dna)
-	calibrated = DNACalibDNAReader(reader)
+	reader = SESSION.get_reader(mesh_dna)
+	calibrated = SESSION.get_calibrated(mesh_dna, reset=True)
 	cmds.file(base, i=True, mergeNamespacesOnClash=True, namespace=":")
 
 	# snap joints
@@ -1067,7 +1099,7 @@ def step_four():
 	mh.mh_snap_joints_to_closest(mesh="head_base", dmesh="head_lod0_mesh", joints=offset_jnts)
 
 	mh.mh_snap_all_joint_locs()
-	save_dna(calibrated, jnt_dna)
+	SESSION.save(calibrated, jnt_dna)
 
 
 ##################################
@@ -1095,7 +1127,7 @@ def step_five():
 
 	Note: This code does not provide any input/output parameters or return a value. It assumes the necessary classes and functions are imported and exist. The documentation does not include implementation details or type information.
 	"""
-	reader = read_dna(jnt_dna)
+	reader = SESSION.get_reader(jnt_dna)
 
 	stream = FileStream(final_dna, FileStream.AccessMode_Write, FileStream.OpenMode_Binary)
 	writer = BinaryStreamWriter(stream)
@@ -1109,6 +1141,8 @@ def step_five():
 
 	writer.setAnimatedMapLODs(anim_lods)
 	writer.write()
+	SESSION.invalidate(final_dna)
+
 	if not Status.isOk():
 		status = Status.get()
 		raise RuntimeError(f"Error saving DNA: {status.message}")
@@ -1144,3 +1178,16 @@ def step_six():
 	assemble_scene(final_dna, analog_gui_path, gui_path, aas_path)
 	cmds.file(rename=review_scene)
 	cmds.file(save=True)
+
+
+def run_pipeline(steps=None):
+	"""
+	Run the calibration steps in a single DNA session, every DNA file is read
+	once and the calibrated readers are passed on in memory.
+
+	:param list steps: step functions, defaults to step_one to step_six
+	"""
+	steps = steps if steps else [step_one, step_two, step_three, step_four, step_five, step_six]
+
+	SESSION.invalidate()
+	SESSION.run(steps)
@@ -0,0 +1,391 @@
+"""
+Build step profiler.
+
+Every build step is measured for wall time, cpu time and peak memory. The
+change in node, dag node and connection count of the scene is only measured
+with the profile_scene_counts pref, every sample scans the whole scene. One
+record per build is appended to a json-lines history file next to build.json.
+The report compares the latest build against the median of the builds before
+it and flags steps that got slower.
+
+This module doesn't import maya or smrig at the top so the report can be run
+from a plain python interpreter:
+
+	python profiler.py /path/to/rigbuild/build_history.jsonl --variant base --threshold 0.25
+"""
+import argparse
+import datetime
+import getpass
+import json
+import logging
+import os
+import sys
+import time
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+try:
+	import psutil
+except ImportError:
+	psutil = None
+
+log = logging.getLogger("smrig.build.profiler")
+
+HISTORY_FILE_NAME = "build_history.jsonl"
+METRICS = ["wall_time", "cpu_time", "peak_rss", "nodes", "dag_nodes", "connections"]
+
+
+def get_history_file(build_file):
+	"""
+	:param str build_file: path of build.json
+	:return: path of the history file next to the build file
+	:rtype: str
+	"""
+	return os.path.join(os.path.dirname(build_file), HISTORY_FILE_NAME)
+
+
+def get_cpu_time():
+	"""
+	:return: user and system cpu time of the process in seconds
+	:rtype: float
+	"""
+	times = os.times()
+	return times[0] + times[1]
+
+
+def get_peak_rss():
+	"""
+	:return: peak resident memory of the process in MB, None if unknown
+	:rtype: float/None
+	"""
+	if resource is not None:
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		# bytes on mac, kilobytes everywhere else
+		return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+	if psutil is not None:
+		info = psutil.Process().memory_info()
+		return getattr(info, "peak_wset", info.rss) / (1024.0 * 1024.0)
+
+
+def get_scene_counts():
+	"""
+	:return: node, dag node and connection count of the scene
+	:rtype: dict
+	"""
+	import maya.cmds as cmds
+
+	nodes = cmds.ls() or []
+	connections = cmds.listConnections(nodes, source=False, destination=True, connections=True, plugs=True) or []
+
+	return {"nodes": len(nodes),
+	        "dag_nodes": len(cmds.ls(dag=True) or []),
+	        "connections": len(connections) // 2}
+
+
+class BuildProfile(object):
+	"""
+	Collect step measurements of a single build.
+
+	USAGE:
+		profile = BuildProfile("asset", "variant")
+		sample = profile.start_step()
+		...
+		profile.end_step(sample, 0, "Build skeleton", "success")
+		profile.write(get_history_file(build_file))
+	"""
+
+	def __init__(self, asset=None, variant=None, scene_counts=False):
+		"""
+		:param str asset:
+		:param str variant:
+		:param bool scene_counts: measure node, dag node and connection count deltas, every sample scans the scene
+		"""
+		self.asset = asset
+		self.variant = variant
+		self.scene_counts = scene_counts
+		self.start_time = time.time()
+		self.overhead = 0.0
+		self.steps = []
+
+	def sample(self, timestamps_last=False):
+		"""
+		The scene counts scan the whole scene, the timestamps are taken on the
+		side of the scan that keeps it out of the measured step.
+
+		:param bool timestamps_last: count the scene before taking the timestamps (step start)
+		:return: current wall time, cpu time, peak rss and scene counts
+		:rtype: dict
+		"""
+		result = {} if timestamps_last else self.get_timestamps()
+
+		if self.scene_counts:
+			t = time.time()
+			try:
+				result.update(get_scene_counts())
+			except Exception as e:
+				log.debug("Unable to count scene nodes: {}".format(e))
+
+			self.overhead += time.time() - t
+
+		if timestamps_last:
+			result.update(self.get_timestamps())
+
+		return result
+
+	@staticmethod
+	def get_timestamps():
+		"""
+		:return: current wall time, cpu time and peak rss
+		:rtype: dict
+		"""
+		return {"wall_time": time.time(), "cpu_time": get_cpu_time(), "peak_rss": get_peak_rss()}
+
+	def start_step(self):
+		"""
+		:return: sample taken before the step runs
+		:rtype: dict
+		"""
+		return self.sample(timestamps_last=True)
+
+	def end_step(self, start_sample, index, label, status):
+		"""
+		Record a step, the values are the difference between the samples taken
+		before and after the step. The peak rss is the process peak after the
+		step.
+
+		:param dict start_sample:
+		:param int index:
+		:param str label:
+		:param str status:
+		:return: step record
+		:rtype: dict
+		"""
+		end_sample = self.sample()
+		record = {"index": index, "label": label, "status": status, "peak_rss": end_sample.get("peak_rss")}
+
+		for metric in ["wall_time", "cpu_time", "nodes", "dag_nodes", "connections"]:
+			if start_sample.get(metric) is not None and end_sample.get(metric) is not None:
+				record[metric] = end_sample.get(metric) - start_sample.get(metric)
+
+		self.steps.append(record)
+		return record
+
+	def to_dict(self):
+		"""
+		:return: build record
+		:rtype: dict
+		"""
+		return {"date": datetime.datetime.now().isoformat(),
+		        "user": getpass.getuser(),
+		        "asset": self.asset,
+		        "variant": self.variant,
+		        "wall_time": time.time() - self.start_time,
+		        "profiler_time": self.overhead,
+		        "complete": bool(self.steps) and all(s.get("status") == "success" for s in self.steps),
+		        "steps": self.steps}
+
+	def write(self, file_path):
+		"""
+		Append the build record to a history file.
+
+		:param str file_path:
+		"""
+		if not self.steps:
+			return
+
+		try:
+			with open(file_path, "a") as f:
+				f.write(json.dumps(self.to_dict(), sort_keys=True) + "\n")
+
+			log.debug("Wrote build profile: {}".format(file_path))
+
+		except (IOError, OSError) as e:
+			log.warning("Could not write build profile {}: {}".format(file_path, e))
+
+
+def read_history(file_path, variant=None):
+	"""
+	Read the build records of a history file, oldest first. Corrupt lines are
+	skipped.
+
+	:param str file_path:
+	:param str variant: only return records of this variant
+	:return: build records
+	:rtype: list
+	"""
+	records = []
+	if not os.path.isfile(file_path):
+		return records
+
+	with open(file_path, "r") as f:
+		for line in f:
+			line = line.strip()
+			if not line:
+				continue
+
+			try:
+				record = json.loads(line)
+			except ValueError:
+				log.debug("Skipped corrupt history line in {}".format(file_path))
+				continue
+
+			if variant is None or record.get("variant") == variant:
+				records.append(record)
+
+	return records
+
+
+def get_step_key(step):
+	"""
+	:param dict step:
+	:return: key used to match steps between builds
+	:rtype: str
+	"""
+	return step.get("label") or str(step.get("index"))
+
+
+def median(values):
+	"""
+	:param list values:
+	:return: median of the values
+	:rtype: float
+	"""
+	values = sorted(values)
+	middle = len(values) // 2
+
+	if len(values) % 2:
+		return values[middle]
+
+	return (values[middle - 1] + values[middle]) / 2.0
+
+
+def compare(records, baseline_size=5, threshold=0.2, metric="wall_time", min_value=0.05):
+	"""
+	Compare the latest build against the median of the builds before it. Only
+	successful steps are compared.
+
+	:param list records: build records, oldest first
+	:param int baseline_size: number of previous builds in the baseline
+	:param float threshold: relative increase flagged as a regression
+	:param str metric: one of METRICS
+	:param float min_value: ignore steps whose latest and baseline values are both below this
+	:return: per step comparison of the latest build (label, index, latest, baseline, ratio, regressed)
+	:rtype: list
+	"""
+	if not records:
+		return []
+
+	latest = records[-1]
+	baseline_records = records[-baseline_size - 1:-1] if baseline_size else []
+
+	baseline_values = {}
+	for record in baseline_records:
+		for step in record.get("steps", []):
+			if step.get("status") == "success" and step.get(metric) is not None:
+				baseline_values.setdefault(get_step_key(step), []).append(step.get(metric))
+
+	results = []
+	for step in latest.get("steps", []):
+		value = step.get(metric)
+		values = baseline_values.get(get_step_key(step))
+
+		if value is None or step.get("status") != "success":
+			continue
+
+		baseline = median(values) if values else None
+		ratio = value / float(baseline) if baseline else None
+		regressed = bool(baseline is not None and
+		                 max(abs(value), abs(baseline)) >= min_value and
+		                 value - baseline > abs(baseline) * threshold)
+
+		results.append({"label": step.get("label"),
+		                "index": step.get("index"),
+		                "latest": value,
+		                "baseline": baseline,
+		                "ratio": ratio,
+		                "regressed": regressed})
+
+	return results
+
+
+def get_report(file_path, variant=None, baseline_size=5, threshold=0.2, metric="wall_time", min_value=0.05):
+	"""
+	Compare the latest build in a history file against its baseline.
+
+	:param str file_path: history file or build.json
+	:param str variant:
+	:param int baseline_size:
+	:param float threshold:
+	:param str metric:
+	:param float min_value:
+	:return: per step comparison, see :func:`compare`
+	:rtype: list
+	"""
+	if os.path.basename(file_path) != HISTORY_FILE_NAME and not file_path.endswith(".jsonl"):
+		file_path = get_history_file(file_path)
+
+	records = read_history(file_path, variant=variant)
+	return compare(records, baseline_size, threshold, metric, min_value)
+
+
+def format_report(results, metric="wall_time", regressions_only=False):
+	"""
+	:param list results: see :func:`compare`
+	:param str metric:
+	:param bool regressions_only:
+	:return: report table
+	:rtype: str
+	"""
+	lines = ["{:>5}  {:<40} {:>12} {:>12} {:>8}".format("step", "label", "latest", "baseline", "ratio")]
+
+	for result in results:
+		if regressions_only and not result.get("regressed"):
+			continue
+
+		baseline = result.get("baseline")
+		ratio = result.get("ratio")
+
+		lines.append("{:>5}  {:<40} {:>12.3f} {:>12} {:>8} {}".format(
+			result.get("index"),
+			(result.get("label") or "")[:40],
+			result.get("latest"),
+			"{:.3f}".format(baseline) if baseline is not None else "-",
+			"{:.2f}x".format(ratio) if ratio is not None else "-",
+			"REGRESSED" if result.get("regressed") else ""))
+
+	regressions = len([r for r in results if r.get("regressed")])
+	lines.append("{} of {} steps regressed ({}).".format(regressions, len(results), metric))
+
+	return "\n".join(lines)
+
+
+def main(args=None):
+	"""
+	Command line report.
+
+	:param list args:
+	:return: exit code, 1 when steps regressed
+	:rtype: int
+	"""
+	parser = argparse.ArgumentParser(description="Compare the latest build against previous builds.")
+	parser.add_argument("file_path", help="build_history.jsonl or build.json")
+	parser.add_argument("--variant", default=None)
+	parser.add_argument("--baseline", type=int, default=5, help="number of previous builds in the baseline")
+	parser.add_argument("--threshold", type=float, default=0.2, help="relative increase flagged as a regression")
+	parser.add_argument("--metric", default="wall_time", choices=METRICS)
+	parser.add_argument("--min-value", type=float, default=0.05, help="ignore steps below this value")
+	parser.add_argument("--regressions-only", action="store_true")
+	args = parser.parse_args(args)
+
+	results = get_report(args.file_path, args.variant, args.baseline, args.threshold, args.metric, args.min_value)
+	print(format_report(results, args.metric, args.regressions_only))
+
+	return 1 if any(r.get("regressed") for r in results) else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -7,14 +7,16 @@ from smrig.dataio import types
 from smrig.dataio import utils
 from smrig.gui.mel import prompts
 from smrig.lib import decoratorslib
+from smrig.lib import iolib
 from smrig.lib import pathlib
+from smrig.lib import selectionlib
 from smrig.lib import utilslib
 
 log = logging.getLogger("smrig.dataexporter.common")
 
 
 @decoratorslib.preserve_selection
-def save(deformer, node=None, directory=None, sub_directory=False, force=True, *args, **kwargs):
+def save(deformer, node=None, directory=None, sub_directory=False, force=True, incremental=False, *args, **kwargs):
 	"""
 	Save specified deformers
 
@@ -23,6 +25,7 @@ def save(deformer, node=None, directory=None, sub_directory=False, force=True, *
 	:param str directory:
 	:param bool sub_directory: Put into sub-directories based on deforemr type.
 	:param bool force: Force overwrite
+	:param bool incremental: keep the existing file untouched when its content didn't change
 	:param args:
 	:param kwargs:
 	:return:
@@ -65,7 +68,20 @@ def save(deformer, node=None, directory=None, sub_directory=False, force=True, *
 			return
 
 	pathlib.make_dirs(os.path.dirname(file_path))
-	module.save(export_node, file_path, *args, **kwargs)
+
+	if not incremental or not os.path.isfile(file_path):
+		module.save(export_node, file_path, *args, **kwargs)
+		return file_path
+
+	# save next to the existing file and only replace it when the content changed
+	temp_path = os.path.join(os.path.dirname(file_path), ".incremental." + os.path.basename(file_path))
+	module.save(export_node, temp_path, *args, **kwargs)
+
+	if iolib.manifest.get_content_hash(temp_path) == iolib.manifest.get_content_hash(file_path):
+		os.remove(temp_path)
+		log.info("Skipped unchanged {}".format(file_path))
+	else:
+		iolib.manifest.replace_file(temp_path, file_path)
 
 	return file_path
 
@@ -83,16 +99,17 @@ def load(file_path=None, *args, **kwargs):
 	file_path = file_path if file_path else utils.browser("import multiple", extension="*")
 	file_path = utilslib.conversion.as_list(file_path)
 
-	for file in file_path:
-		extension = os.path.splitext(file)[-1][1:]
-		module = [m for t, m in types.modules.items() if m.file_extension == extension]
-		module = module[0] if module else None
+	with selectionlib.hierarchy_session():
+		for file in file_path:
+			extension = os.path.splitext(file)[-1][1:]
+			module = [m for t, m in types.modules.items() if m.file_extension == extension]
+			module = module[0] if module else None
 
-		if not module:
-			log.warning("File is not a dataexporter file: {}".format(file))
-			continue
+			if not module:
+				log.warning("File is not a dataexporter file: {}".format(file))
+				continue
 
-		module.load(file, *args, **kwargs)
+			module.load(file, *args, **kwargs)
 
 
 @decoratorslib.preserve_selection
@@ -136,6 +153,7 @@ def save_to_asset(deformer, node=None, *args, **kwargs):
 	:return:
 	"""
 	data_path = env.asset.get_data_path()
+	kwargs.setdefault("incremental", True)
 	save(deformer, node=node, directory=data_path, sub_directory=True, *args, **kwargs)
 
 
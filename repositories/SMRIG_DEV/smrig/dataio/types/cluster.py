@@ -7,6 +7,7 @@ from smrig.dataio import utils
 from smrig.lib import deformlib
 from smrig.lib import geometrylib
 from smrig.lib import iolib
+from smrig.lib import naminglib
 from smrig.lib import selectionlib
 
 deformer_type = "cluster"
@@ -121,7 +122,7 @@ class Cluster(object):
 		self.get_data()
 		soft_weights = selectionlib.get_soft_selection_weights()
 
-		new_shapes = soft_weights["weights"].keys()
+		new_shapes = list(soft_weights["weights"].keys())
 		for i, shape in enumerate(new_shapes):
 			shapec = []
 			if cmds.nodeType(shape) == "mesh":
@@ -190,7 +191,17 @@ class Cluster(object):
 			cmpt_count = fn_comp.elementCount()
 			weight_mfloat_array = om.MFloatArray(cmpt_count, weight)
 
-			if data:
+			# soft selection weights are stored by flat index, they are set in
+			# the element order of the member components
+			if data and name in (data.get("sparse") or {}):
+				indices, weights = data["sparse"].get(name)
+				lookup = dict(zip(indices, weights))
+				weight_mfloat_array = om.MFloatArray(cmpt_count, 0.0)
+
+				for i, flat_index in enumerate(self.get_flat_indices(dag_path, cmpts, node_type)):
+					weight_mfloat_array.set(lookup.get(flat_index, 0.0), i)
+
+			elif data:
 				weight_array = data["weights"].get(name) or {}
 				weight_mfloat_array = om.MFloatArray(len(weight_array))
 
@@ -200,6 +211,18 @@ class Cluster(object):
 			self.fn_cls.setWeight(dag_path, cmpts, weight_mfloat_array)
 		return True
 
+	@staticmethod
+	def get_flat_indices(dag_path, cmpts, node_type):
+		"""
+		:param om.MDagPath dag_path: member shape
+		:param om.MObject cmpts: member components
+		:param str node_type:
+		:return: flat index of every member component, see selectionlib.get_component_order
+		:rtype: list
+		"""
+		elements = selectionlib.get_component_elements(cmpts, node_type)
+		return selectionlib.get_flat_indices(elements, selectionlib.get_component_order(dag_path))
+
 	@classmethod
 	def load(cls, file_path=None, method="vertexID", remap=None, create_weighted_node=True, **kwargs):
 		"""
@@ -296,43 +319,21 @@ def get_required_nodes(file_path):
 
 def remap_nodes(data, remap):
 	"""
+	Remap shapes, weighted and prebind nodes and weights keys in a single pass,
+	returns a new dict.
 
 	:param data:
-	:param remap:
+	:param list/Remapper remap:
 	:return:
 	"""
 	if not remap:
 		return data
 
-	data = dict(data)
-	weights_dict = data.get("weights")
-	shapes = data.get("shapes")
-	weighted_node = data.get("weightedNode") or ""
-	prebind_node = data.get("prebindNode") or ""
-
-	for search, replace in remap:
-
-		# remap shape
-		for i, shape in enumerate(shapes):
-			if search in shape:
-				shapes[i] = shape.replace(search, replace)
-
-		data["shapes"] = shapes
-
-		if search in weighted_node:
-			data["weightedNode"] = weighted_node.replace(search, replace)
-
-		if search in prebind_node:
-			data["prebindNode"] = prebind_node.replace(search, replace)
-
-		# remap influences
-		for influence, value in weights_dict.items():
-			if search in influence:
-				r_influence = influence.replace(search, replace)
+	remapper = naminglib.remapping.get_remapper(remap)
+	data = remapper.remap_data(data, {"shapes": None, "weightedNode": None, "prebindNode": None})
 
-				if r_influence != influence:
-					data['weights'][r_influence] = value
-					del data['weights'][influence]
+	if data.get("weights"):
+		data["weights"] = remapper.remap_keys(data.get("weights"))
 
 	return data
 
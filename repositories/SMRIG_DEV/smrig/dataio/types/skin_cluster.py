@@ -6,8 +6,11 @@ import maya.cmds as cmds
 from smrig.dataio import utils
 from smrig.lib import geometrylib
 from smrig.lib import iolib
+from smrig.lib import naminglib
 from smrig.lib import nodepathlib
 from smrig.lib import selectionlib
+from smrig.lib import weightslib
+from smrig.lib.apilib import conversion
 
 deformer_type = "skinCluster"
 file_extension = utils.get_extension(deformer_type).lower()
@@ -39,13 +42,18 @@ class SkinCluster(object):
 		self.fn_set.getMembers(self.skn_members, False)
 		self.skn_members.getDagPath(0, self.skn_dag_path, self.skn_cmpts)
 
-	def get_data(self):
+	def get_data(self, sparse=False):
 		"""
 		Gather all dataexporter for export
 
+		:param bool sparse: store weights in the sparse (csr) format under 'sparseWeights'
 		:return:
 		"""
-		self.get_weights()
+		if sparse:
+			self.get_sparse_weights()
+		else:
+			self.get_weights()
+
 		self.get_blend_weights()
 
 		if cmds.nodeType(self.shape) == "mesh":
@@ -70,6 +78,9 @@ class SkinCluster(object):
 			'meshData': mesh_data
 		}
 
+		if sparse:
+			self.data['sparseWeights'] = self.data.pop('weights')
+
 	def get_blend_weights(self):
 		"""
 		Get DQ blend weights as MDoubleArray
@@ -88,15 +99,32 @@ class SkinCluster(object):
 		weights = self.get_weights_array()
 		inf_path_array = om.MDagPathArray()
 		number_infs = self.fn_skn.influenceObjects(inf_path_array)
-		number_cmpts_per_inf = int(weights.length() / number_infs)
+		influence_weights = weightslib.to_influence_major(list(weights), number_infs)
 
 		self.weights = {}
 		for i in range(inf_path_array.length()):
 			inf_name = cmds.ls(inf_path_array[i].fullPathName(), sn=1)[0]
 			inf_name = nodepathlib.remove_namespace(inf_name)
+			self.weights[inf_name] = influence_weights[i]
+
+	def get_sparse_weights(self):
+		"""
+		Get weights dataexporter in the sparse (csr) format with the influence names
+		stored under 'influences'.
+
+		:return:
+		"""
+		weights = self.get_weights_array()
+		inf_path_array = om.MDagPathArray()
+		number_infs = self.fn_skn.influenceObjects(inf_path_array)
+
+		influences = []
+		for i in range(inf_path_array.length()):
+			inf_name = cmds.ls(inf_path_array[i].fullPathName(), sn=1)[0]
+			influences.append(nodepathlib.remove_namespace(inf_name))
 
-			weight_list = [weights[ii * number_infs + i] for ii in range(number_cmpts_per_inf)]
-			self.weights[inf_name] = weight_list
+		self.weights = weightslib.to_sparse(list(weights), number_infs)
+		self.weights["influences"] = influences
 
 	def get_weights_array(self):
 		"""
@@ -112,14 +140,15 @@ class SkinCluster(object):
 		self.fn_skn.getWeights(self.skn_dag_path, self.skn_cmpts, weights, p_int)
 		return weights
 
-	def save(self, file_path):
+	def save(self, file_path, sparse=False):
 		"""
 		Write weights file to disk as cPickle.
 
 		:param file_path:
+		:param bool sparse: store weights in the sparse (csr) format
 		:return:
 		"""
-		self.get_data()
+		self.get_data(sparse=sparse)
 		iolib.pickle.write(file_path, self.data)
 		log.info("Saved {} to: {}".format(self.deformer, file_path))
 
@@ -141,10 +170,7 @@ class SkinCluster(object):
 		:param blend_weights:
 		:return:
 		"""
-		blend_weights_array = om.MDoubleArray(len(blend_weights))
-		for i, w in enumerate(blend_weights):
-			blend_weights_array.set(w, i)
-
+		blend_weights_array = conversion.to_double_array(blend_weights)
 		self.fn_skn.setBlendWeights(self.skn_dag_path, self.skn_cmpts, blend_weights_array)
 		self.blend_weights = blend_weights
 
@@ -155,27 +181,63 @@ class SkinCluster(object):
 		:param weights_dict:
 		:return:
 		"""
-		weights = self.get_weights_array()
+		if weightslib.is_sparse(weights_dict):
+			return self.set_sparse_weights(weights_dict)
+
+		weights = list(self.get_weights_array())
 		inf_path_array = om.MDagPathArray()
 		number_infs = self.fn_skn.influenceObjects(inf_path_array)
-		number_cmpts_per_inf = weights.length() / number_infs
+
+		inf_indices = {}
+		for i in range(inf_path_array.length()):
+			inf_name = cmds.ls(inf_path_array[i].fullPathName(), sn=1)[0]
+			inf_indices[nodepathlib.remove_namespace(inf_name)] = i
 
 		try:
 			for influence, weight_list in weights_dict.items():
-				for i in range(inf_path_array.length()):
-					inf_name = cmds.ls(inf_path_array[i].fullPathName(), sn=1)[0]
-					inf_name = nodepathlib.remove_namespace(inf_name)
-
-					if inf_name == influence:
-						for ii in range(number_cmpts_per_inf):
-							weights.set(weight_list[ii], ii * number_infs + i)
+				if influence in inf_indices:
+					weights[inf_indices[influence]::number_infs] = weightslib.as_list(weight_list)
 		except:
 			return
 
-		self.set_weights_array(weights)
+		self.set_weights_array(conversion.to_double_array(weights))
 		self.weights = weights_dict
 		return True
 
+	def set_sparse_weights(self, sparse):
+		"""
+		Set weights from sparse (csr) weights, the stored influences are mapped
+		onto the skin cluster influences by name and written into a single zero
+		filled MDoubleArray.
+
+		:param dict sparse:
+		:return:
+		"""
+		inf_path_array = om.MDagPathArray()
+		number_infs = self.fn_skn.influenceObjects(inf_path_array)
+
+		inf_indices = {}
+		for i in range(inf_path_array.length()):
+			inf_name = cmds.ls(inf_path_array[i].fullPathName(), sn=1)[0]
+			inf_indices[nodepathlib.remove_namespace(inf_name)] = i
+
+		try:
+			influence_map = [inf_indices[influence] for influence in sparse.get("influences")]
+		except KeyError:
+			return
+
+		if sparse.get("vertex_count") * number_infs != self.get_weights_array().length():
+			return
+
+		# only the stored non zero weights are written into the zero filled array
+		weights = om.MDoubleArray(sparse.get("vertex_count") * number_infs, 0.0)
+		for i, value in zip(weightslib.get_flat_indices(sparse, influence_map, number_infs), sparse.get("values")):
+			weights.set(value, i)
+
+		self.set_weights_array(weights)
+		self.weights = sparse
+		return True
+
 	def set_weights_array(self, weights_array):
 		"""
 		This sets the weights from an MDoubleArray input object.
@@ -185,10 +247,7 @@ class SkinCluster(object):
 		"""
 		inf_path_array = om.MDagPathArray()
 		number_infs = self.fn_skn.influenceObjects(inf_path_array)
-		inf_indecies = om.MIntArray(number_infs)
-
-		for i in range(number_infs):
-			inf_indecies.set(i, i)
+		inf_indecies = conversion.to_int_array(range(number_infs))
 
 		cmds.setAttr("{}.normalizeWeights".format(self.deformer), False)
 		self.fn_skn.setWeights(self.skn_dag_path, self.skn_cmpts, inf_indecies, weights_array, False)
@@ -207,14 +266,15 @@ class SkinCluster(object):
 
 		name = data.get("name")
 		shape = data.get("shape")
-		weights = data.get("weights")
+		weights = data.get("sparseWeights") or data.get("weights")
 		blend_weights = data.get("blendWeights")
 		mesh_data = data.get("meshData")
+		influences = get_influences(data)
 
-		if utils.check_missing_nodes(name, [shape] + list(weights.keys())):
-			return (name, [shape] + list(weights.keys()))
+		if utils.check_missing_nodes(name, [shape] + influences):
+			return (name, [shape] + influences)
 
-		influences = selectionlib.sort_by_hierarchy(list(weights.keys()))
+		influences = selectionlib.sort_by_hierarchy(influences)
 
 		# unbind current geo and create skin cluster
 		if utils.get_deformers(shape, deformer_type):
@@ -258,52 +318,60 @@ def get_required_nodes(file_path):
 	"""
 	data = iolib.pickle.read(file_path)
 	shape = data.get("shape")
-	weights = data.get("weights")
 
-	return [shape] + weights.keys()
+	return [shape] + get_influences(data)
+
+
+def get_influences(data):
+	"""
+	Get influence names from either dense or sparse weights data.
+
+	:param dict data:
+	:return: influences
+	:rtype: list
+	"""
+	sparse = data.get("sparseWeights")
+	if sparse:
+		return list(sparse.get("influences"))
+
+	return list(data.get("weights").keys())
 
 
 def remap_nodes(data, remap):
 	"""
+	Remap shape and influences of dense or sparse weights in a single pass,
+	returns a new dict.
 
 	:param data:
-	:param remap:
+	:param list/Remapper remap:
 	:return:
 	"""
 	if not remap:
 		return data
 
-	data = dict(data)
-	weights_dict = data.get("weights")
-	shape = data.get("shape")
-
-	for search, replace in remap:
-
-		# remap shape
-		if search in shape:
-			data["shape"] = shape.replace(search, replace)
+	remapper = naminglib.remapping.get_remapper(remap)
+	data = remapper.remap_data(data, {"shape": None})
 
-		# remap influences
-		for influence, value in weights_dict.items():
-			if search in influence:
-				r_influence = influence.replace(search, replace)
+	if data.get("weights"):
+		data["weights"] = remapper.remap_keys(data.get("weights"))
 
-				if r_influence != influence:
-					data['weights'][r_influence] = value
-					del data['weights'][influence]
+	if data.get("sparseWeights"):
+		data["sparseWeights"] = dict(data.get("sparseWeights"))
+		data["sparseWeights"]["influences"] = remapper.remap_list(data["sparseWeights"]["influences"])
 
 	return data
 
 
-def save(deformer, file_path):
+def save(deformer, file_path, sparse=False):
 	"""
 
 	:param deformer:
 	:param file_path:
+	:param bool sparse: store weights in the sparse (csr) format
 	:return:
 	"""
 	skin_obj = SkinCluster(deformer)
-	skin_obj.save(file_path)
+	skin_obj.save(file_path, sparse=sparse)
 
 
 def load(file_path, *args, **kwargs):
@@ -1,4 +1,7 @@
+from . import binary
 from . import io
+from . import manifest
+from . import meshstore
 from . import tools
 from . import topology
 from . import types
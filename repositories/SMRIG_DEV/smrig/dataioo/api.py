@@ -1,29 +1,41 @@
+import logging
+import random
+import time
+
 import maya.OpenMaya as OpenMaya
 import maya.OpenMayaAnim as OpenMayaAnim
 import maya.cmds as cmds
+from smrig.lib import weightslib
+from smrig.lib.apilib import conversion
+
+log = logging.getLogger("deformerIO.api")
 
 
-def get_weights(deformer):
+def get_weights(deformer, sparse=False):
 	"""
 	get deformer weights as list
 
 	:param deformer:
+	:param bool sparse: store skin weights in the sparse (csr) format
 	:return:
 	"""
 	try:
 		if cmds.nodeType(deformer) in "skinCluster":
-			return [get_skin_weights_array(deformer)]
+			return [get_skin_weights_array(deformer, sparse=sparse)]
 		else:
 			return get_deformer_weights_array(deformer)
 	except:
 		return [None] * len(cmds.deformer(deformer, q=1, g=1))
 
 
-def get_skin_weights_array(deformer):
+def get_skin_weights_array(deformer, sparse=False):
 	"""
-	Get skin weights and blend weights arrays
+	Get skin weights and blend weights arrays. When sparse the weights are
+	returned as a dict with per vertex influence indices and values, see
+	:mod:`smrig.lib.weightslib`.
 
 	:param str deformer:
+	:param bool sparse: return weights in the sparse (csr) format
 	:return list: (weights, blend weights)
 	"""
 	weights = OpenMaya.MDoubleArray()
@@ -42,6 +54,10 @@ def get_skin_weights_array(deformer):
 	fn_skin.getWeights(dag_path, cmpts, weights, p_int)
 	fn_skin.getBlendWeights(dag_path, cmpts, blend_weights)
 
+	if sparse:
+		influence_count = OpenMaya.MScriptUtil.getUint(p_int)
+		return weightslib.to_sparse(list(weights), influence_count), list(blend_weights)
+
 	return list(weights), list(blend_weights)
 
 
@@ -75,27 +91,39 @@ def convert_to_array(py_list, double_array=False):
 	:param double_array:
 	:return: OpenMaya.MFloatArray
 	"""
-	array = create_double_array(len(py_list)) if double_array else create_float_array(len(py_list))
+	if double_array:
+		return conversion.to_double_array(py_list)
+
+	return conversion.to_float_array(py_list)
+
+
+def convert_sparse_to_array(sparse, influence_map=None, influence_count=None):
+	"""
+	Expand sparse weights straight into a flat, vertex major MDoubleArray. Only
+	the stored non zero weights are placed, the rest of the array stays zero.
 
-	for ii, value in enumerate(py_list):
-		array.set(value, ii)
+	:param dict sparse:
+	:param list/dict influence_map: maps stored influence index to target influence index
+	:param int influence_count: influence count of the target, defaults to the stored count
+	:return: OpenMaya.MDoubleArray
+	"""
+	influence_count = influence_count or sparse.get("influence_count")
+	weights = OpenMaya.MDoubleArray(sparse.get("vertex_count") * influence_count, 0.0)
+
+	for i, value in zip(weightslib.get_flat_indices(sparse, influence_map, influence_count), sparse.get("values")):
+		weights.set(value, i)
 
-	return array
+	return weights
 
 
 def convert_to_int_array(py_list):
 	"""
-	Convert a python list to an MFloatArray
+	Convert a python list to an MIntArray
 
 	:param list py_list:
-	:return: OpenMaya.MFloatArray
+	:return: OpenMaya.MIntArray
 	"""
-	array = create_int_array(len(py_list))
-
-	for ii, value in enumerate(py_list):
-		array.set(value, ii)
-
-	return array
+	return conversion.to_int_array(py_list)
 
 
 def create_float_array(length, value=None):
@@ -312,3 +340,59 @@ def find_plug(dep, attr):
 	"""
 	fn_dep = OpenMaya.MFnDependencyNode(dep)
 	return fn_dep.findPlug(attr, True)
+
+
+def benchmark_marshalling(size=1000000, influence_count=10):
+	"""
+	Micro-benchmark the bulk array marshalling against the per element loops
+	it replaced, on synthetic weights. Results are logged and returned.
+
+	USAGE:
+		from smrig.dataioo import api
+		api.benchmark_marshalling()
+
+	:param int size: number of weights
+	:param int influence_count: used for the transpose benchmarks
+	:return: {name: (loop seconds, bulk seconds)}
+	:rtype: dict
+	"""
+	size -= size % influence_count
+	weights = [random.random() for _ in range(size)]
+	vertex_count = size // influence_count
+	results = {}
+
+	def run(func):
+		t = time.time()
+		func()
+		return time.time() - t
+
+	def loop_array(create_array):
+		array = create_array(size)
+		for ii, value in enumerate(weights):
+			array.set(value, ii)
+
+	def loop_influence_major():
+		return [[weights[ii * influence_count + i] for ii in range(vertex_count)] for i in range(influence_count)]
+
+	influence_weights = weightslib.to_influence_major(weights, influence_count)
+
+	def loop_vertex_major():
+		array = create_double_array(size)
+		for i, values in enumerate(influence_weights):
+			for ii in range(vertex_count):
+				array.set(values[ii], ii * influence_count + i)
+
+	results["to_double_array"] = (run(lambda: loop_array(create_double_array)),
+	                              run(lambda: conversion.to_double_array(weights)))
+	results["to_float_array"] = (run(lambda: loop_array(create_float_array)),
+	                             run(lambda: conversion.to_float_array(weights)))
+	results["to_influence_major"] = (run(loop_influence_major),
+	                                 run(lambda: weightslib.to_influence_major(weights, influence_count)))
+	results["to_vertex_major"] = (run(loop_vertex_major),
+	                              run(lambda: conversion.to_double_array(weightslib.to_vertex_major(influence_weights))))
+
+	for name, (loop_time, bulk_time) in sorted(results.items()):
+		log.info("{}: loop {:.3f}s, bulk {:.3f}s ({:.1f}x)".format(name, loop_time, bulk_time,
+		                                                          loop_time / max(bulk_time, 1e-9)))
+
+	return results
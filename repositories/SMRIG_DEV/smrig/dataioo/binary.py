@@ -0,0 +1,416 @@
+"""
+Columnar binary deformer data file.
+
+Layout::
+
+	magic (4 bytes) | version (uint16) | reserved (uint16) | header size (uint32)
+	header (utf-8 json, padded to 8 bytes)
+	array blobs (little endian, each aligned to 8 bytes)
+
+The header stores the data dict with every large numeric list (weights, points,
+poly connects, uvs, ...) replaced by a reference into the array table. Arrays
+are memory-mapped on read and only paged in once they are accessed.
+
+Arrays are stored losslessly (int32, int64 and float64) so data read back from
+a file hashes the same as the exported data. Lists mixing ints and floats stay
+in the json header.
+"""
+import array
+import itertools
+import json
+import logging
+import mmap
+import struct
+import sys
+
+try:
+	from collections.abc import MutableSequence
+except ImportError:
+	from collections import MutableSequence
+
+log = logging.getLogger("deformerIO.binary")
+
+MAGIC = b"SMDB"
+VERSION = 1
+ALIGNMENT = 8
+MIN_ARRAY_LENGTH = 32
+MAX_ROW_WIDTH = 16
+FLOAT32_KEYS = []
+ARRAY_KEY = "__array__"
+
+INT32_MIN = -2 ** 31
+INT32_MAX = 2 ** 31 - 1
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+if sys.version_info[0] < 3:
+	int_types = (int, long)  # Python 2
+else:
+	int_types = (int,)  # Python 3
+
+_CAN_CAST = hasattr(memoryview, "cast")
+_LITTLE_ENDIAN = sys.byteorder == "little"
+_INT64_TYPECODE = "q" if "q" in getattr(array, "typecodes", "") else None
+
+
+class ArrayView(MutableSequence):
+	"""
+	Sequence over an array blob stored in a binary data file. The values are
+	only read from the (memory-mapped) buffer on first access. Two dimensional
+	arrays (ie. points) return their rows as lists.
+
+	The view behaves like a list, the first change copies the values into a
+	list (copy on write) so the file buffer is never modified.
+	"""
+
+	def __init__(self, buffer, typecode, offset, length, shape):
+		self._buffer = buffer
+		self._values = None
+		self._list = None
+		self.typecode = typecode
+		self.offset = offset
+		self.length = length
+		self.shape = tuple(shape)
+
+	def __repr__(self):
+		return "ArrayView(typecode='{}', shape={})".format(self.typecode, self.shape)
+
+	def __len__(self):
+		if self._list is not None:
+			return len(self._list)
+
+		return self.shape[0]
+
+	def __iter__(self):
+		if self._list is not None:
+			return iter(self._list)
+
+		if len(self.shape) == 1:
+			return iter(self.values)
+
+		return (self[i] for i in range(self.shape[0]))
+
+	def __getitem__(self, index):
+		if self._list is not None:
+			return self._list[index]
+
+		if len(self.shape) == 1:
+			if isinstance(index, slice):
+				return list(self.values[index])
+
+			return self.values[index]
+
+		if isinstance(index, slice):
+			return [self[i] for i in range(*index.indices(self.shape[0]))]
+
+		index = index + self.shape[0] if index < 0 else index
+		if not 0 <= index < self.shape[0]:
+			raise IndexError("ArrayView index out of range")
+
+		width = self.shape[1]
+		return list(self.values[index * width:(index + 1) * width])
+
+	def __setitem__(self, index, value):
+		self.get_list()[index] = value
+
+	def __delitem__(self, index):
+		del self.get_list()[index]
+
+	def insert(self, index, value):
+		self.get_list().insert(index, value)
+
+	def __add__(self, other):
+		return self.tolist() + list(other)
+
+	def __radd__(self, other):
+		return list(other) + self.tolist()
+
+	def __mul__(self, count):
+		return self.tolist() * count
+
+	__rmul__ = __mul__
+
+	def __eq__(self, other):
+		if isinstance(other, ArrayView):
+			other = other.tolist()
+
+		return self.tolist() == other
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	__hash__ = None
+
+	def __reduce__(self):
+		# pickle as a plain list so converted files never depend on this module
+		return list, (self.tolist(),)
+
+	def get_list(self):
+		"""
+		Copy the values into a list the first time the view is changed.
+
+		:return: values
+		:rtype: list
+		"""
+		if self._list is None:
+			self._list = self.tolist()
+
+		return self._list
+
+	def sort(self, *args, **kwargs):
+		self.get_list().sort(*args, **kwargs)
+
+	@property
+	def values(self):
+		"""
+		Flat values of the array, read from the buffer on first access.
+
+		:return: memoryview or array.array
+		"""
+		if self._values is None:
+			item_size = array.array(self.typecode).itemsize
+			end = self.offset + self.length * item_size
+
+			if _CAN_CAST and _LITTLE_ENDIAN:
+				self._values = memoryview(self._buffer)[self.offset:end].cast(self.typecode)
+
+			else:
+				values = array.array(self.typecode)
+				frombytes = getattr(values, "frombytes", None) or values.fromstring
+				frombytes(bytes(self._buffer[self.offset:end]))
+
+				if not _LITTLE_ENDIAN:
+					values.byteswap()
+
+				self._values = values
+
+		return self._values
+
+	def tolist(self):
+		"""
+		:return: Array values as (nested) python list
+		:rtype: list
+		"""
+		if self._list is not None:
+			return list(self._list)
+
+		if len(self.shape) == 1:
+			return self.values.tolist()
+
+		return list(self)
+
+
+def default(obj):
+	"""
+	json.dump default handler so data read from a binary file can be written
+	back out as json.
+
+	:param obj:
+	:return:
+	"""
+	if isinstance(obj, ArrayView):
+		return obj.tolist()
+
+	raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
+
+
+def write(file_path, data, float32_keys=None):
+	"""
+	Write data dict to a columnar binary file.
+
+	:param str file_path:
+	:param dict data:
+	:param list float32_keys: data keys whose float arrays are stored as float32,
+		these are lossy and will not hash the same when read back
+	"""
+	float32_keys = FLOAT32_KEYS if float32_keys is None else float32_keys
+
+	arrays = []
+	skeleton = extract_arrays(data, arrays, float32_keys)
+
+	specs = []
+	offset = 0
+	for values, shape in arrays:
+		offset = align(offset)
+		specs.append({"typecode": values.typecode, "offset": offset, "length": len(values), "shape": shape})
+		offset += len(values) * values.itemsize
+
+	header = json.dumps({"data": skeleton, "arrays": specs}, separators=(",", ":")).encode("utf-8")
+
+	with open(file_path, "wb") as f:
+		f.write(MAGIC)
+		f.write(struct.pack("<HHI", VERSION, 0, len(header)))
+		f.write(header)
+
+		data_start = align(f.tell())
+		f.write(b"\0" * (data_start - f.tell()))
+
+		for (values, shape), spec in zip(arrays, specs):
+			f.write(b"\0" * (data_start + spec.get("offset") - f.tell()))
+
+			if not _LITTLE_ENDIAN:
+				values.byteswap()
+
+			values.tofile(f)
+
+
+def read(file_path, mmap_arrays=True):
+	"""
+	Read data dict from a columnar binary file.
+
+	:param str file_path:
+	:param bool mmap_arrays: memory-map the file instead of reading it into memory
+	:return: data
+	:rtype: dict
+	:raise ValueError: When the file is not a binary data file.
+	"""
+	with open(file_path, "rb") as f:
+		prefix = f.read(len(MAGIC) + 8)
+
+		if prefix[:len(MAGIC)] != MAGIC:
+			raise ValueError("'{}' is not a binary data file.".format(file_path))
+
+		version, _, header_size = struct.unpack("<HHI", prefix[len(MAGIC):])
+		if version > VERSION:
+			raise ValueError("'{}' was written with a newer version ({}).".format(file_path, version))
+
+		header = json.loads(f.read(header_size).decode("utf-8"))
+		data_start = align(f.tell())
+
+		if not header.get("arrays"):
+			buffer = None
+
+		elif mmap_arrays:
+			buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+		else:
+			f.seek(0)
+			buffer = f.read()
+
+	views = [ArrayView(buffer,
+	                   spec.get("typecode"),
+	                   data_start + spec.get("offset"),
+	                   spec.get("length"),
+	                   spec.get("shape")) for spec in header.get("arrays")]
+
+	return resolve_arrays(header.get("data"), views)
+
+
+# Helper functions --------------------------------------------------------------------
+
+
+def align(offset):
+	"""
+	:param int offset:
+	:return: offset rounded up to the next alignment boundary
+	:rtype: int
+	"""
+	return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def get_typecode(values, float32=False):
+	"""
+	Get the array typecode for a flat list of values, None if the values are not
+	all numbers or cannot be stored without loss (ie. ints mixed with floats).
+
+	:param list values:
+	:param bool float32:
+	:return: "i", "q", "f", "d" or None
+	:rtype: str/None
+	"""
+	value_types = set(map(type, values))
+
+	if bool in value_types:
+		return
+
+	if value_types.issubset(int_types):
+		if INT32_MIN <= min(values) and max(values) <= INT32_MAX:
+			return "i"
+
+		if INT64_MIN <= min(values) and max(values) <= INT64_MAX:
+			return _INT64_TYPECODE
+
+	elif value_types == {float}:
+		return "f" if float32 else "d"
+
+
+def to_array(value, float32=False):
+	"""
+	Convert a list of numbers or a list of equal length rows of numbers into a
+	typed array.
+
+	:param list/tuple value:
+	:param bool float32:
+	:return: (array.array, shape) or None if the value cannot be stored as an array
+	:rtype: tuple/None
+	"""
+	if len(value) < MIN_ARRAY_LENGTH:
+		return
+
+	shape = [len(value)]
+	flat = value
+
+	if isinstance(value[0], (list, tuple)):
+		width = len(value[0])
+		if not width or width > MAX_ROW_WIDTH:
+			return
+
+		for row in value:
+			if not isinstance(row, (list, tuple)) or len(row) != width:
+				return
+
+		shape.append(width)
+		flat = list(itertools.chain.from_iterable(value))
+
+	typecode = get_typecode(flat, float32)
+	if not typecode:
+		return
+
+	return array.array(typecode, flat), shape
+
+
+def extract_arrays(value, arrays, float32_keys, key=None):
+	"""
+	Recursively replace numeric lists in the data with array references.
+
+	:param value:
+	:param list arrays: collects (array.array, shape) tuples
+	:param list float32_keys:
+	:param str key: dict key the value is stored under
+	:return: json serializable skeleton
+	"""
+	if isinstance(value, dict):
+		return {k: extract_arrays(v, arrays, float32_keys, key=k) for k, v in value.items()}
+
+	elif isinstance(value, (list, tuple)):
+		result = to_array(value, float32=key in float32_keys) if value else None
+		if result:
+			arrays.append(result)
+			return {ARRAY_KEY: len(arrays) - 1}
+
+		return [extract_arrays(v, arrays, float32_keys, key=key) for v in value]
+
+	elif isinstance(value, ArrayView):
+		return extract_arrays(value.tolist(), arrays, float32_keys, key=key)
+
+	return value
+
+
+def resolve_arrays(value, views):
+	"""
+	Recursively replace array references in the skeleton with array views.
+
+	:param value:
+	:param list views:
+	:return: data
+	"""
+	if isinstance(value, dict):
+		if len(value) == 1 and ARRAY_KEY in value:
+			return views[value.get(ARRAY_KEY)]
+
+		return {k: resolve_arrays(v, views) for k, v in value.items()}
+
+	elif isinstance(value, list):
+		return [resolve_arrays(v, views) for v in value]
+
+	return value
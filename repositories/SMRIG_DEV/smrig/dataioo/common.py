@@ -1,21 +1,43 @@
 import logging
 import os
+import time
 
 import maya.cmds as cmds
 from smrig import env
+from smrig.dataioo import binary
 from smrig.dataioo import io
+from smrig.dataioo import manifest
+from smrig.dataioo import meshstore
+from smrig.dataioo import tools
 from smrig.dataioo import types
 from smrig.dataioo import utils
+from smrig.lib import iolib
+from smrig.lib.naminglib import remapping
 
 log = logging.getLogger("deformerIO")
 
+# data keys holding node references: the key of the node name for lists of dicts, None for (nested) lists of names
+REMAP_FIELDS = {
+	"geometry": "name",
+	"transforms": "name",
+	"curves": "sdk_driver",
+	"joints": None,
+	"nodes": None,
+	"drivers": None,
+	"driven": None,
+	"wuo": None,
+	"connections": None,
+	"assignments": None
+}
+
 
 @utils.timer
 
 @utils.preserve_selection
 
 def export_deformer(deformer_node=None, deformer_type=None, file_path=None, versioned=False, sub_dir=False,
-                    dir_path=None, **kwargs):
+                    dir_path=None, compress=False, writer=None, manifest_entries=None, shared_meshes=True,
+                    incremental=False, report=None, manifests=None, **kwargs):
 	"""
 	Export deformer to file on disk
 	TODO: add versioning functionality
@@ -26,9 +48,17 @@ def export_deformer(deformer_node=None, deformer_type=None, file_path=None, vers
 	:param versioned:
 	:param sub_dir:
 	:param dir_path:
+	:param bool compress: gzip json and pickle files (adds .gz to the file name)
+	:param io.AsyncWriter writer: hand json, pickle and binary files to this writer instead of writing them here
+	:param dict manifest_entries: collect the manifest entry here instead of updating the folder manifest
+	:param bool shared_meshes: store mesh data in the shared mesh store instead of embedding it in the file
+	:param bool incremental: skip writing when the file on disk holds the same data
+	:param dict report: collects the "written" and "skipped" file paths
+	:param dict manifests: {directory: manifest} shared between exports so every folder manifest is read once
 	:param kwargs:
 	:return:
 	"""
+	t = time.time()
 	mod, deformer_type = get_module_from_deformer_type(deformer_node, deformer_type)
 
 	file_path = build_export_path(file_path, deformer_node, deformer_type, mod.file_type, sub_dir, versioned,
@@ -37,13 +67,44 @@ def export_deformer(deformer_node=None, deformer_type=None, file_path=None, vers
 		return
 
 	data = mod.get_data(deformer_node, file_path=file_path, **kwargs)
+	file_data = data
+
+	if mod.file_type in ["json", "pickle", "dbin"]:
+		file_path = file_path + ".gz" if compress and mod.file_type in ["json", "pickle"] else file_path
+		file_data = meshstore.externalize_data(data, file_path) if shared_meshes else data
+		data_hash = iolib.manifest.get_data_hash(file_data, default=binary.default)
+
+		if incremental and manifest.get_recorded_data_hash(file_path, manifests) == data_hash:
+			if report is not None:
+				report.setdefault("skipped", []).append(file_path)
 
-	if mod.file_type in ["json", "pickle"]:
-		io.write_file(file_path, data)
+			utils.delete_export_data_nodes()
+			log.info("Skipped unchanged {} '{}': {}".format(deformer_type, deformer_node, file_path))
+			return file_path
+
+		if writer:
+			writer.submit(file_path, file_data, query_time=time.time() - t)
+		else:
+			io.write_file(file_path, file_data)
 
 	elif mod.file_type in ["mayaBinary"]:
+		data_hash = None
 		io.save_maya_file(file_path, data)
 
+	if report is not None:
+		report.setdefault("written", []).append(file_path)
+
+	if isinstance(data, dict):
+		entry = manifest.get_data_entry(file_data)
+		entry["data_hash"] = data_hash
+	else:
+		entry = {"deformer_type": deformer_type, "name": deformer_node, "required_nodes": [], "geometry": []}
+
+	if manifest_entries is not None:
+		manifest_entries[file_path] = entry
+	elif os.path.isfile(file_path):
+		manifest.get_manifest(os.path.dirname(file_path)).update(file_path, entry)
+
 	utils.delete_export_data_nodes()
 	deformer_node = deformer_node if deformer_node else "all"
 	log.info("Exported {} '{}' to: {}".format(deformer_type, deformer_node, file_path))
@@ -51,10 +112,15 @@ def export_deformer(deformer_node=None, deformer_type=None, file_path=None, vers
 	return file_path
 
 
-def export_deformers(deformer_nodes=None, deformer_type=None, dir_path=None, versioned=False, sub_dir=False, **kwargs):
+def export_deformers(deformer_nodes=None, deformer_type=None, dir_path=None, versioned=False, sub_dir=False,
+                     pipelined=False, workers=2, queue_size=8, compress=False, prune_meshes=True, **kwargs):
 	"""
 	Wrapper for exporting multiple deformers into individual files.
 
+	When pipelined the scene is queried on the main thread while a pool of
+	writer threads serializes, compresses and writes the previous files, see
+	:class:`io.AsyncWriter`. The queue is bounded by queue_size.
+
 	USAGE:
 		from armature.rig import deformerIO
 		reload_hierarchy(deformerIO)
@@ -66,19 +132,75 @@ def export_deformers(deformer_nodes=None, deformer_type=None, dir_path=None, ver
 	:param dir_path:
 	:param versioned:
 	:param sub_dir:
+	:param bool pipelined: write files from worker threads
+	:param int workers: number of writer threads when pipelined
+	:param int queue_size: max number of exported deformers waiting to be written when pipelined
+	:param bool compress: gzip json and pickle files
+	:param bool prune_meshes: remove meshes no longer referenced by any file from the mesh stores written to
+	:param bool incremental: only write files whose data changed
+	:param dict report: collects the "written", "skipped" and "failed" file paths and, when pipelined, the
+		per file "timings" (file_path, query_time, queue_time, write_time, size)
 	:param kwargs:
-	:return:
+	:return: file paths
+	:rtype: list
+	:raise IOError: When pipelined and files failed to write, the other files are still recorded.
 	"""
 	results = []
+	manifest_entries = {}
+	manifests = {}
+	report = kwargs.pop("report", {})
 	deformer_nodes = deformer_nodes if deformer_nodes else [None]
 
 	dir_path = get_dir_path(dir_path)
 	if not dir_path:
 		return
 
-	for deformer_node in utils.as_list(deformer_nodes):
-		file_path = export_deformer(deformer_node, deformer_type, None, versioned, sub_dir, dir_path, **kwargs)
-		results.append(file_path)
+	if not pipelined:
+		for deformer_node in utils.as_list(deformer_nodes):
+			file_path = export_deformer(deformer_node, deformer_type, None, versioned, sub_dir, dir_path,
+			                            compress=compress, manifest_entries=manifest_entries, report=report,
+			                            manifests=manifests, **kwargs)
+			results.append(file_path)
+
+		manifest.update_files(manifest_entries, manifests)
+		if prune_meshes and report.get("written"):
+			prune_mesh_stores(report.get("written"), manifests)
+
+		log_report(report)
+		return results
+
+	writer = io.AsyncWriter(workers=workers, queue_size=queue_size)
+	try:
+		for deformer_node in utils.as_list(deformer_nodes):
+			file_path = export_deformer(deformer_node, deformer_type, None, versioned, sub_dir, dir_path,
+			                            compress=compress, writer=writer, manifest_entries=manifest_entries,
+			                            report=report, manifests=manifests, **kwargs)
+			results.append(file_path)
+
+	finally:
+		writer.close(raise_errors=False)
+
+	# files that failed to write are not recorded as written
+	failed = writer.get_failed()
+	if failed:
+		report["failed"] = failed
+		report["written"] = [f for f in report.get("written", []) if f not in failed]
+		results = [f for f in results if f not in failed]
+
+		for file_path in failed:
+			manifest_entries.pop(file_path, None)
+
+	report["timings"] = writer.results
+
+	manifest.update_files(manifest_entries, manifests)
+	if prune_meshes and report.get("written"):
+		prune_mesh_stores(report.get("written"), manifests)
+
+	log_report(report)
+	log.info("Exported {} files, waited {:.3f} seconds on writers.".format(len(writer.results), writer.blocked_time))
+
+	if failed:
+		raise IOError("Failed to write {} file(s): {}".format(len(failed), ", ".join(failed)))
 
 	return results
 
@@ -95,16 +217,17 @@ def save_to_asset(deformer, node=None, dtype=None, *args, **kwargs):
 	"""
 
 	data_path = env.asset.get_data_path()
-	save(deformer, node=node, directory=data_path, sub_directory=True, *args, **kwargs)
-	# export_deformer(deformer_node=deformer, deformer_type=dty[e],  versioned=True, sub_dir=False, dir_path=data_path)
-	export_deformers(deformer_nodes=deformer, deformer_type=dtype, dir_path=data_path, versioned=False, sub_dir=False)
+	kwargs.setdefault("incremental", True)
+	export_deformers(deformer_nodes=deformer, deformer_type=dtype, dir_path=data_path, versioned=False, sub_dir=False,
+	                 **kwargs)
 
 
 def import_deformers(file_path=None, method="auto", remap=None, rebuild=True, data=None, **kwargs):
 	"""
-	Import deformers from files
+	Import deformers from files. All files are imported in one transfer
+	session, stored meshes and transfer maps are shared between them.
 
-	:param str file_path: file path
+	:param str/list file_path: file path(s)
 	:param str method: auto, vertex, uv, closest (auto will default vertex first then closest if vert count is off)
 	:param dict remap: dict for remaping node names- {"orig_node": "new_node"}
 	:param bool rebuild: recreate the deformer (if it exists in scene it deletes it and recreates it)
@@ -123,7 +246,9 @@ def import_deformers(file_path=None, method="auto", remap=None, rebuild=True, da
 	if not data:
 		file_path = file_path if file_path else io.browser(action="import")
 		if file_path:
-			import_deformer(file_path, method, remap, rebuild, data, **kwargs)
+			with tools.transfer_session():
+				for path in utils.as_list(file_path):
+					import_deformer(path, method, remap, rebuild, data, **kwargs)
 
 
 @utils.timer
@@ -132,30 +257,32 @@ def import_deformer(file_path=None, method="auto", remap=None, rebuild=True, dat
 
 	:return:
 	"""
-	utils.delete_export_data_nodes()
-	data = data if data else io.read_file(file_path)
-	if file_path.endswith(".pose"):
-		data = {"deformer_type": "poseInterpolator", "name": "all", "nodes": []}
-
-	data = remap_data(data, remap) if remap else data
-	mod, deformer_type = get_module_from_deformer_type(deformer_type=data.get("deformer_type"))
-
-	if not mod:
-		log.warning("No exporter found for type: {}".format(deformer_type))
-		return
+	with tools.transfer_session():
+		utils.delete_export_data_nodes()
+		data = data if data else io.read_file(file_path)
+		data = meshstore.resolve_data(data, file_path)
+		if file_path.endswith(".pose"):
+			data = {"deformer_type": "poseInterpolator", "name": "all", "nodes": []}
+
+		data = remap_data(data, remap) if remap else data
+		mod, deformer_type = get_module_from_deformer_type(deformer_type=data.get("deformer_type"))
+
+		if not mod:
+			log.warning("No exporter found for type: {}".format(deformer_type))
+			return
 
-	if not check_required_nodes(file_path, data):
-		return
+		if not check_required_nodes(file_path, data):
+			return
 
-	# delete the deformer if it exists
-	if data.get("name") and rebuild and cmds.objExists(data.get("name")):
-		cmds.delete(data.get("name"))
+		# delete the deformer if it exists
+		if data.get("name") and rebuild and cmds.objExists(data.get("name")):
+			cmds.delete(data.get("name"))
 
-	result = mod.set_data(data, file_path=file_path, method=method, **kwargs)
-	log.info("Loaded {}: '{}' from: {}".format(deformer_type, data.get("name"), file_path))
-	utils.delete_export_data_nodes()
+		result = mod.set_data(data, file_path=file_path, method=method, **kwargs)
+		log.info("Loaded {}: '{}' from: {}".format(deformer_type, data.get("name"), file_path))
+		utils.delete_export_data_nodes()
 
-	return result
+		return result
 
 
 def load_type(deformer_types, *args, **kwargs):
@@ -187,50 +314,65 @@ def load_type(deformer_types, *args, **kwargs):
 # Helper functions --------------------------------------------------------------------
 
 
+def log_report(report):
+	"""
+	Log the number of written and skipped files of an export.
+
+	:param dict report: {"written": [file paths], "skipped": [file paths], "failed": [file paths]}
+	"""
+	log.info("Wrote {} files, skipped {} unchanged.".format(len(report.get("written", [])),
+	                                                       len(report.get("skipped", []))))
+
+	if report.get("failed"):
+		log.error("Failed to write {} files.".format(len(report.get("failed"))))
+
+
+def prune_mesh_stores(file_paths, manifests=None):
+	"""
+	Remove the meshes no longer referenced by any file from the mesh stores
+	the files were exported to.
+
+	:param list file_paths: exported files
+	:param dict manifests: {directory: manifest} of already loaded manifests
+	:return: removed blob paths
+	:rtype: list
+	"""
+	removed = []
+	for store_path in sorted(set(meshstore.get_store_path(f) for f in file_paths)):
+		removed.extend(meshstore.prune_store(store_path, manifests))
+
+	return removed
+
+
 def remap_data(data, remap):
 	"""
-	Remap nodes in data for import
+	Remap nodes in data for import. The remap rules are compiled once and all
+	node references are remapped in a single pass, the input data is not
+	modified. Pass a :class:`~smrig.lib.naminglib.remapping.Remapper` to reuse
+	the compiled rules across files and inspect which rules fired.
 
 	:param dict data: import data
-	:param remap: list of sets: [('search', 'replace'), ('search', 'replace')]
+	:param list/Remapper remap: list of sets: [('search', 'replace'), ('search', 'replace')]
 	:return dict : data
 	"""
-	new_data = dict(data)
-	geometry = new_data.get("geometry")
-	transforms = new_data.get("transforms")
-	joints = new_data.get("joints")
-	nodes = new_data.get("nodes")
-	drivers = new_data.get("drivers")
-	driven = new_data.get("driven")
-	wuo = new_data.get("wuo")
-	connections = new_data.get("connections")
-	assignments = new_data.get("assignments")
-	curves = new_data.get("curves")
-
-	if geometry:
-		new_data["geometry"] = utils.remap_dict(geometry, remap)
-	if transforms:
-		new_data["transforms"] = utils.remap_dict(transforms, remap)
-	if curves:
-		new_data["curves"] = utils.remap_dict(curves, remap, key="sdk_driver")
-	if joints:
-		new_data["joints"] = utils.remap_list(joints, remap)
-	if nodes:
-		new_data["nodes"] = utils.remap_list(nodes, remap)
-	if drivers:
-		new_data["drivers"] = utils.remap_list(drivers, remap)
-	if driven:
-		new_data["driven"] = utils.remap_list(driven, remap)
-	if wuo:
-		new_data["wuo"] = utils.remap_list(wuo, remap)
-	if connections:
-		new_data["connections"] = utils.remap_nested_list(connections, remap)
-	if assignments:
-		new_data["assignments"] = utils.remap_nested_list(assignments, remap)
+	remapper = remapping.get_remapper(remap)
+	new_data = remapper.remap_data(data, REMAP_FIELDS)
+	remapper.log_report()
 
 	return new_data
 
 
+def get_required_nodes(file_path):
+	"""
+	Get the nodes required to import a data file, read from the folder manifest.
+
+	:param str file_path:
+	:return: required nodes
+	:rtype: list
+	"""
+	return manifest.get_required_nodes(file_path)
+
+
 def check_required_nodes(file_path, data):
 	required = utils.get_required_nodes(data)
 	missing = utils.get_missing_nodes(required)
@@ -272,6 +414,8 @@ def get_dir_path(file_path=None):
 		if file_path:
 			return file_path[0]
 
+	return file_path
+
 
 def build_export_path(file_path, deformer, deformer_type, file_extension, sub_dir, versioned, dir_path=None):
 	"""
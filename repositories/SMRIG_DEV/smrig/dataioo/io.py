@@ -1,18 +1,24 @@
+import gzip
 import json
 import logging
 import os
 import string
+import threading
+import time
 
 import maya.cmds as cmds
+from smrig.dataioo import binary
 from smrig.dataioo import utils
 
 try:
 	# python 3
 	import _pickle as pickle
+	import queue
 
 except:
 	# python 2.7
 	import cPickle as pickle
+	import Queue as queue
 
 log = logging.getLogger("deformerIO.io")
 
@@ -26,7 +32,13 @@ def make_dirs(paths):
 		if os.path.exists(path):
 			continue
 
-		os.makedirs(path)
+		try:
+			os.makedirs(path)
+		except OSError:
+			# another writer thread may have created it in the meantime
+			if not os.path.isdir(path):
+				raise
+
 		log.debug("Created directory: {}.".format(path))
 
 
@@ -41,6 +53,12 @@ def read_json(file_path):
 		log.error(error_message)
 		raise OSError(error_message)
 
+	if file_path.endswith(".gz"):
+		with gzip.open(file_path, "rb") as f:
+			result = json.loads(f.read().decode("utf-8"))
+			log.debug("Read compressed json data from '{}'.".format(file_path))
+			return result
+
 	with open(file_path, "r") as f:
 		result = json.load(f)
 		log.debug("Read json data from '{}'.".format(file_path))
@@ -55,8 +73,13 @@ def write_json(file_path, data):
 	directory = os.path.dirname(file_path)
 	make_dirs(directory)
 
-	with open(file_path, "w") as f:
-		json.dump(data, f, indent=4, sort_keys=True)
+	if file_path.endswith(".gz"):
+		with gzip.open(file_path, "wb") as f:
+			f.write(json.dumps(data, indent=4, sort_keys=True, default=binary.default).encode("utf-8"))
+
+	else:
+		with open(file_path, "w") as f:
+			json.dump(data, f, indent=4, sort_keys=True, default=binary.default)
 
 	log.debug("Saved json data to '{}'.".format(file_path))
 
@@ -72,7 +95,8 @@ def read_pickle(file_path):
 		log.error(error_message)
 		raise OSError(error_message)
 
-	with open(file_path, "rb") as f:
+	opener = gzip.open if file_path.endswith(".gz") else open
+	with opener(file_path, "rb") as f:
 		result = pickle.load(f)
 		log.debug("Read pickle data from '{}'.".format(file_path))
 		return result
@@ -86,7 +110,8 @@ def write_pickle(file_path, data):
 	directory = os.path.dirname(file_path)
 	make_dirs(directory)
 
-	with open(file_path, "wb") as f:
+	opener = gzip.open if file_path.endswith(".gz") else open
+	with opener(file_path, "wb") as f:
 		try:
 			pickle.dump(data, f, protocol=2)
 		except:
@@ -95,6 +120,35 @@ def write_pickle(file_path, data):
 	log.debug("Saved pickled data to '{}'.".format(file_path))
 
 
+def read_binary(file_path, mmap_arrays=True):
+	"""
+	:param str file_path:
+	:param bool mmap_arrays: memory-map the weight, point and uv arrays
+	:return: deformerIO data
+	:raise OSError: When the provided file path doesn't exist.
+	"""
+	if not os.path.exists(file_path):
+		error_message = "File path '{}' doesn't exist on disk".format(file_path)
+		log.error(error_message)
+		raise OSError(error_message)
+
+	result = binary.read(file_path, mmap_arrays=mmap_arrays)
+	log.debug("Read binary data from '{}'.".format(file_path))
+	return result
+
+
+def write_binary(file_path, data):
+	"""
+	:param str file_path:
+	:param dict data:
+	"""
+	directory = os.path.dirname(file_path)
+	make_dirs(directory)
+
+	binary.write(file_path, data)
+	log.debug("Saved binary data to '{}'.".format(file_path))
+
+
 def save_maya_file(file_path, nodes):
 	"""
 
@@ -132,38 +186,216 @@ def load_maya_file(file_path):
 
 def write_file(file_path, data):
 	"""
-	Wrapper for writing either json or pickle based on file ext
+	Wrapper for writing either json, pickle or binary based on file ext, json
+	and pickle files ending in .gz are gzip compressed.
 
 	:param file_path:
 	:param data:
 	:return:
 	"""
-	if file_path.endswith(".pickle"):
+	if file_path.endswith((".pickle", ".pickle.gz")):
 		write_pickle(file_path, data)
+	elif file_path.endswith(".dbin"):
+		write_binary(file_path, data)
 	else:
 		write_json(file_path, data)
 
 
 def read_file(file_path):
 	"""
-	Wrapper for reading either json or pickle based on file ext
-
+	Wrapper for reading either json, pickle or binary based on file ext, json
+	and pickle files ending in .gz are read as gzip compressed.
 
 	:param file_path:
 	:return:
 	"""
 	utils.delete_export_data_nodes()
 
-	if file_path.endswith(".pickle"):
+	if file_path.endswith((".pickle", ".pickle.gz")):
 		return read_pickle(file_path)
 
-	elif file_path.endswith(".json"):
+	elif file_path.endswith((".json", ".json.gz")):
 		return read_json(file_path)
 
+	elif file_path.endswith(".dbin"):
+		return read_binary(file_path)
+
 	elif file_path.endswith(".mb"):
 		return load_maya_file(file_path)
 
 
+def convert_file(file_path, file_type="dbin", remove_source=False):
+	"""
+	Convert an exported json or pickle file to another file type, by default
+	the columnar binary format.
+
+	:param str file_path:
+	:param str file_type: json, pickle or dbin
+	:param bool remove_source: delete the source file after converting
+	:return: converted file path
+	:rtype: str
+	"""
+	if os.path.splitext(file_path)[-1] not in [".json", ".pickle", ".dbin"]:
+		log.warning("Cannot convert file: {}".format(file_path))
+		return
+
+	new_file_path = "{}.{}".format(os.path.splitext(file_path)[0], file_type)
+	if new_file_path == file_path:
+		return file_path
+
+	write_file(new_file_path, read_file(file_path))
+
+	if remove_source:
+		os.remove(file_path)
+
+	log.info("Converted {} to: {}".format(file_path, new_file_path))
+	return new_file_path
+
+
+def convert_files(file_paths, file_type="dbin", remove_source=False):
+	"""
+	Convert multiple exported files, directories are searched for json and
+	pickle files.
+
+	:param str/list file_paths: files or directories
+	:param str file_type: json, pickle or dbin
+	:param bool remove_source: delete the source files after converting
+	:return: converted file paths
+	:rtype: list
+	"""
+	results = []
+
+	for path in utils.as_list(file_paths):
+		if os.path.isdir(path):
+			for root, dirs, files in os.walk(path):
+				for file_name in sorted(files):
+					if os.path.splitext(file_name)[-1] in [".json", ".pickle"]:
+						results.append(convert_file(os.path.join(root, file_name), file_type, remove_source))
+		else:
+			results.append(convert_file(path, file_type, remove_source))
+
+	return [r for r in results if r]
+
+
+class AsyncWriter(object):
+	"""
+	Write data files from a pool of worker threads. Serialization, compression
+	and disk writes happen on the workers while the main thread keeps querying
+	the scene. The queue is bounded, submit blocks once it is full so memory use
+	stays capped when the disk can't keep up.
+
+	Workers never touch the scene, maya binary files have to be written on the
+	main thread.
+
+	USAGE:
+		with io.AsyncWriter(workers=2, queue_size=8) as writer:
+			writer.submit(file_path, data)
+
+		writer.results  # per file timings
+		writer.blocked_time  # time the main thread waited on a full queue
+
+	Leaving the with block raises an IOError when files failed to write.
+	"""
+
+	def __init__(self, workers=2, queue_size=8):
+		"""
+		:param int workers: number of writer threads
+		:param int queue_size: max number of files waiting to be written
+		"""
+		self.queue = queue.Queue(maxsize=queue_size)
+		self.results = []
+		self.errors = []
+		self.blocked_time = 0.0
+		self._lock = threading.Lock()
+		self._threads = []
+
+		for i in range(max(workers, 1)):
+			thread = threading.Thread(target=self._work, name="deformerIO.writer{}".format(i))
+			thread.daemon = True
+			thread.start()
+			self._threads.append(thread)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		# don't mask an error raised inside the with block
+		self.close(raise_errors=exc_type is None)
+
+	def submit(self, file_path, data, **timings):
+		"""
+		Queue data to be written, blocks while the queue is full.
+
+		:param str file_path:
+		:param dict data:
+		:param timings: extra timings to store with the result ie. query_time
+		"""
+		t = time.time()
+		self.queue.put((file_path, data, t, timings))
+		self.blocked_time += time.time() - t
+
+	def close(self, raise_errors=True):
+		"""
+		Wait for all queued files to be written and stop the workers.
+
+		:param bool raise_errors: raise when a file failed to write
+		:return: per file timings
+		:rtype: list
+		:raise IOError: When raise_errors is enabled and files failed to write.
+		"""
+		for _ in self._threads:
+			self.queue.put(None)
+
+		for thread in self._threads:
+			thread.join()
+
+		self._threads = []
+
+		for file_path, error in self.errors:
+			log.error("Failed to write {}: {}".format(file_path, error))
+
+		if raise_errors and self.errors:
+			raise IOError("Failed to write {} file(s): {}".format(len(self.errors),
+			                                                      ", ".join(e[0] for e in self.errors)))
+
+		return self.results
+
+	def get_failed(self):
+		"""
+		:return: file paths that failed to write
+		:rtype: list
+		"""
+		with self._lock:
+			return [e[0] for e in self.errors]
+
+	def _work(self):
+		while True:
+			item = self.queue.get()
+			if item is None:
+				break
+
+			file_path, data, queued, timings = item
+			start = time.time()
+
+			try:
+				write_file(file_path, data)
+				size = os.path.getsize(file_path)
+
+			except Exception as e:
+				with self._lock:
+					self.errors.append((file_path, e))
+				continue
+
+			result = {"file_path": file_path,
+			          "queue_time": start - queued,
+			          "write_time": time.time() - start,
+			          "size": size}
+			result.update(timings)
+
+			with self._lock:
+				self.results.append(result)
+
+
 def browser(action="import", extension=None, start_dir=None):
 	"""
 	:param action: Options are import, export
@@ -172,7 +404,7 @@ def browser(action="import", extension=None, start_dir=None):
 	:return:
 	"""
 	extension = utils.as_list(extension)
-	extension = extension if extension else ["json", "pickle", "mb", "pose"]
+	extension = extension if extension else ["json", "pickle", "dbin", "mb", "pose"]
 
 	fp = " ".join(["*.{}"] * len(extension))
 	file_filter = "Weights Data ({})".format(fp).format(*extension)
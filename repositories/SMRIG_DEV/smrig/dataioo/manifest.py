@@ -0,0 +1,230 @@
+import logging
+import os
+
+from smrig import env
+from smrig.dataioo import binary
+from smrig.dataioo import io
+from smrig.dataioo import topology
+from smrig.dataioo import utils
+from smrig.lib import iolib
+from smrig.lib.naminglib import remapping
+
+log = logging.getLogger("deformerIO.manifest")
+
+DATA_EXTENSIONS = (".json", ".pickle", ".dbin", ".json.gz", ".pickle.gz")
+EXTENSIONS = DATA_EXTENSIONS + (".mb", ".pose")
+
+
+def get_manifest(directory):
+	"""
+	Get the manifest of a data folder.
+
+	:param str directory:
+	:return: manifest
+	:rtype: iolib.manifest.Manifest
+	"""
+	return iolib.manifest.Manifest(directory, describe=describe_file, extensions=EXTENSIONS)
+
+
+def get_folder_manifest(file_path, manifests=None):
+	"""
+	Get the manifest of the folder of a file, loaded once per folder when a
+	manifests dict is shared between calls.
+
+	:param str file_path:
+	:param dict manifests: {directory: manifest} of the manifests loaded so far
+	:return: manifest
+	:rtype: iolib.manifest.Manifest
+	"""
+	directory = os.path.dirname(file_path)
+	if manifests is None:
+		return get_manifest(directory)
+
+	if directory not in manifests:
+		manifests[directory] = get_manifest(directory)
+
+	return manifests.get(directory)
+
+
+def get_recorded_data_hash(file_path, manifests=None):
+	"""
+	Get the data hash recorded in the manifest for a file without reading the
+	file's data. When the size or modification time of the file changed the
+	recorded hash is only used if the content hash still matches.
+
+	:param str file_path:
+	:param dict manifests: see :func:`get_folder_manifest`
+	:return: data hash, None when the file or its entry is missing or changed
+	:rtype: str/None
+	"""
+	folder_manifest = get_folder_manifest(file_path, manifests)
+	file_name = os.path.basename(file_path)
+	entry = folder_manifest.get_entry(file_name, refresh=False)
+
+	if not entry or not os.path.isfile(file_path):
+		return
+
+	if folder_manifest.is_stale(file_name) and entry.get("content_hash") != iolib.manifest.get_content_hash(file_path):
+		return
+
+	return entry.get("data_hash")
+
+
+def get_data_entry(data):
+	"""
+	Describe exported data for the manifest: deformer type, name, required
+	nodes, vertex count, topology hash and mesh store reference per geometry.
+
+	:param dict data:
+	:return: entry
+	:rtype: dict
+	"""
+	geometry = []
+	for g_data in data.get("geometry") or []:
+		m_data = g_data.get("mesh_data") or {}
+		points = m_data.get("points")
+		vertex_count = len(points) if points is not None else m_data.get("vertex_count")
+
+		geometry.append({"name": g_data.get("name"),
+		                 "vertex_count": vertex_count,
+		                 "topology_hash": topology.get_topology_hash(m_data),
+		                 "mesh_ref": m_data.get("mesh_ref")})
+
+	return {"deformer_type": data.get("deformer_type"),
+	        "name": data.get("name"),
+	        "required_nodes": sorted(n for n in utils.get_required_nodes(data) if n),
+	        "geometry": geometry}
+
+
+def describe_file(file_path):
+	"""
+	Describe a data file on disk including the hash of its data, maya binary
+	and pose files are not opened.
+
+	:param str file_path:
+	:return: entry
+	:rtype: dict
+	"""
+	if file_path.endswith(DATA_EXTENSIONS):
+		data = io.read_file(file_path)
+		entry = get_data_entry(data)
+		entry["data_hash"] = iolib.manifest.get_data_hash(data, default=binary.default)
+		return entry
+
+	name = os.path.basename(file_path).split(".")[0]
+	deformer_type = "poseInterpolator" if file_path.endswith(".pose") else None
+
+	return {"deformer_type": deformer_type, "name": name, "required_nodes": [], "geometry": []}
+
+
+def update_file(file_path, data=None):
+	"""
+	Update the manifest entry of a single exported file.
+
+	:param str file_path:
+	:param dict data: exported data, the file is read back when None
+	:return: entry
+	:rtype: dict
+	"""
+	entry = get_data_entry(data) if isinstance(data, dict) else None
+	return get_manifest(os.path.dirname(file_path)).update(file_path, entry)
+
+
+def update_files(entries, manifests=None):
+	"""
+	Update the manifest entries of many exported files, every manifest is
+	written once.
+
+	:param dict entries: {file path: entry}
+	:param dict manifests: see :func:`get_folder_manifest`
+	"""
+	directories = {}
+	for file_path, entry in entries.items():
+		directories.setdefault(os.path.dirname(file_path), []).append((file_path, entry))
+
+	for directory, items in directories.items():
+		manifest = get_folder_manifest(items[0][0], manifests)
+
+		for file_path, entry in items:
+			if os.path.isfile(file_path):
+				manifest.update(file_path, entry, save=False)
+
+		manifest.save()
+
+
+def list_data(directory=None, recursive=True):
+	"""
+	List the data files in a folder from the manifests only, manifests are
+	rebuilt for files that changed on disk.
+
+	:param str directory: defaults to the asset data path
+	:param bool recursive: include sub folders
+	:return: {file path: entry}
+	:rtype: dict
+	"""
+	directory = directory if directory else env.asset.get_data_path()
+	directories = [directory]
+
+	if recursive:
+		directories = []
+		for root, dirs, _ in os.walk(directory):
+			# skip hidden folders (ie. the mesh store)
+			dirs[:] = [d for d in dirs if not d.startswith(".")]
+			directories.append(root)
+
+	results = {}
+	for directory in directories:
+		for file_name, entry in get_manifest(directory).get_entries().items():
+			results[os.path.join(directory, file_name)] = entry
+
+	return results
+
+
+def get_entry(file_path):
+	"""
+	:param str file_path:
+	:return: manifest entry of a data file
+	:rtype: dict
+	"""
+	return get_manifest(os.path.dirname(file_path)).get_entry(os.path.basename(file_path)) or {}
+
+
+def get_required_nodes(file_path):
+	"""
+	:param str file_path:
+	:return: required nodes of a data file read from its manifest
+	:rtype: list
+	"""
+	return list(get_entry(file_path).get("required_nodes") or [])
+
+
+def get_missing_nodes(file_path, remap=None):
+	"""
+	:param str file_path:
+	:param list remap: optional remap applied to the required nodes first
+	:return: missing nodes
+	:rtype: list
+	"""
+	nodes = get_required_nodes(file_path)
+	nodes = remapping.get_remapper(remap).remap_list(nodes) if remap else nodes
+
+	return utils.get_missing_nodes(nodes)
+
+
+def preview_remap(file_path, remap):
+	"""
+	Preview a remap on the required nodes of a data file without opening it.
+
+	:param str file_path:
+	:param list/Remapper remap:
+	:return: [(node, remapped node, exists in scene)]
+	:rtype: list
+	"""
+	remapper = remapping.get_remapper(remap)
+	results = []
+
+	for node in get_required_nodes(file_path):
+		remapped = remapper.remap_name(node)
+		results.append((node, remapped, not utils.get_missing_nodes([remapped])))
+
+	return results
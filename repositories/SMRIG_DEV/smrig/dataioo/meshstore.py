@@ -0,0 +1,312 @@
+"""
+Content-addressed store for the mesh data embedded in exported deformer files.
+
+Instead of embedding a full copy of the orig shape in every file, the mesh data
+is written once to a blob named after its content hash and the file only keeps
+a small reference::
+
+	{"mesh_ref": "<hash>", "path": "../.meshes/<hash>.dbin",
+	 "vertex_count": 1024, "topology_hash": "<hash>", "uv_hash": "<hash>"}
+
+The store lives in the ".meshes" folder of the asset data folder (or next to
+the exported file when it is saved elsewhere). Blobs are read once per import
+session and cached in memory until the session ends. Blobs no longer
+referenced by any file of the folder the store serves are removed by
+:func:`prune_store` after an export.
+"""
+import array
+import hashlib
+import itertools
+import json
+import logging
+import os
+
+from smrig import env
+from smrig.dataioo import binary
+from smrig.dataioo import io
+from smrig.dataioo import manifest
+from smrig.dataioo import topology
+from smrig.lib import weightslib
+
+log = logging.getLogger("deformerIO.meshstore")
+
+STORE_DIR_NAME = ".meshes"
+MESH_CACHE = {}
+
+
+def get_mesh_hash(mesh_data):
+	"""
+	Get the content hash of mesh data: topology, uv layout, points, uvs and
+	matrix. The name of the mesh is not part of the hash.
+
+	:param dict mesh_data:
+	:return: sha1 hex digest
+	:rtype: str
+	"""
+	sha = hashlib.sha1()
+	sha.update(str(topology.get_topology_hash(mesh_data)).encode("utf-8"))
+	sha.update(str(topology.get_uv_hash(mesh_data)).encode("utf-8"))
+
+	for key in ["points", "uvs"]:
+		values = weightslib.as_list(mesh_data.get(key) or [])
+		if values and isinstance(values[0], (list, tuple)):
+			values = list(itertools.chain.from_iterable(values))
+
+		values = array.array("d", values)
+		sha.update(values.tobytes() if hasattr(values, "tobytes") else values.tostring())
+		sha.update(b"|")
+
+	sha.update(json.dumps(mesh_data.get("matrix"), sort_keys=True, default=binary.default).encode("utf-8"))
+	return sha.hexdigest()
+
+
+def is_reference(mesh_data):
+	"""
+	:param dict mesh_data:
+	:return: True if the mesh data is a reference into the mesh store
+	:rtype: bool
+	"""
+	return isinstance(mesh_data, dict) and "mesh_ref" in mesh_data
+
+
+def get_store_path(file_path):
+	"""
+	Get the mesh store folder for an exported file. Files inside the asset data
+	folder share the store at its root, other files use a store next to them.
+
+	:param str file_path:
+	:return: store folder
+	:rtype: str
+	"""
+	directory = os.path.dirname(os.path.abspath(file_path))
+	data_path = env.asset.get_data_path()
+
+	if data_path:
+		data_path = os.path.abspath(data_path)
+		if directory == data_path or directory.startswith(data_path + os.sep):
+			return os.path.join(data_path, STORE_DIR_NAME)
+
+	return os.path.join(directory, STORE_DIR_NAME)
+
+
+def store_mesh(mesh_data, file_path):
+	"""
+	Write mesh data to the store unless a blob with the same content exists.
+
+	:param dict mesh_data:
+	:param str file_path: exported file referencing the mesh
+	:return: reference
+	:rtype: dict
+	"""
+	mesh_hash = get_mesh_hash(mesh_data)
+	store_path = get_store_path(file_path)
+	blob_path = os.path.join(store_path, mesh_hash + ".dbin")
+
+	if not os.path.isfile(blob_path):
+		if not os.path.isdir(store_path):
+			try:
+				os.makedirs(store_path)
+			except OSError:
+				if not os.path.isdir(store_path):
+					raise
+
+		# write to a temp file first so an interrupted export never leaves a broken blob
+		temp_path = "{}.{}.tmp".format(blob_path, os.getpid())
+		binary.write(temp_path, mesh_data)
+
+		try:
+			os.rename(temp_path, blob_path)
+		except OSError:
+			# windows does not allow renaming over an existing file, written by another export
+			os.remove(temp_path)
+
+		log.debug("Stored mesh {}".format(mesh_hash))
+
+	points = mesh_data.get("points")
+	relative_path = os.path.relpath(blob_path, os.path.dirname(os.path.abspath(file_path)))
+
+	return {"mesh_ref": mesh_hash,
+	        "path": relative_path.replace(os.sep, "/"),
+	        "vertex_count": len(points) if points is not None else None,
+	        "topology_hash": topology.get_topology_hash(mesh_data),
+	        "uv_hash": topology.get_uv_hash(mesh_data)}
+
+
+def load_mesh(reference, file_path):
+	"""
+	Get the mesh data of a reference, blobs are read once and cached until the
+	import session ends (see :func:`smrig.dataioo.tools.transfer_session`).
+
+	:param dict reference:
+	:param str file_path: exported file holding the reference
+	:return: mesh data
+	:rtype: dict
+	:raise IOError: When the blob cannot be found.
+	"""
+	mesh_hash = reference.get("mesh_ref")
+	if mesh_hash in MESH_CACHE:
+		return MESH_CACHE.get(mesh_hash)
+
+	directory = os.path.dirname(os.path.abspath(file_path))
+	paths = [os.path.normpath(os.path.join(directory, reference.get("path") or "")),
+	         os.path.join(get_store_path(file_path), mesh_hash + ".dbin")]
+
+	for blob_path in paths:
+		if os.path.isfile(blob_path):
+			MESH_CACHE[mesh_hash] = binary.read(blob_path)
+			return MESH_CACHE.get(mesh_hash)
+
+	raise IOError("Mesh {} referenced by '{}' not found in the mesh store.".format(mesh_hash, file_path))
+
+
+def externalize_data(data, file_path):
+	"""
+	Move the mesh data of every geometry into the store. A new data dict is
+	returned, the input is not modified.
+
+	:param dict data:
+	:param str file_path: file the data will be written to
+	:return: data
+	:rtype: dict
+	"""
+	if not isinstance(data, dict) or not data.get("geometry"):
+		return data
+
+	geometry = []
+	for g_data in data.get("geometry"):
+		m_data = g_data.get("mesh_data")
+
+		if m_data and not is_reference(m_data):
+			g_data = dict(g_data, mesh_data=store_mesh(m_data, file_path))
+
+		geometry.append(g_data)
+
+	return dict(data, geometry=geometry)
+
+
+def resolve_data(data, file_path):
+	"""
+	Replace mesh references in the data with the stored mesh data. A new data
+	dict is returned, the input is not modified. The resolved mesh data is
+	shared between files and should be treated as read only.
+
+	:param dict data:
+	:param str file_path: file the data was read from
+	:return: data
+	:rtype: dict
+	"""
+	if not isinstance(data, dict) or not data.get("geometry"):
+		return data
+
+	if not any(is_reference(g.get("mesh_data")) for g in data.get("geometry")):
+		return data
+
+	geometry = []
+	for g_data in data.get("geometry"):
+		m_data = g_data.get("mesh_data")
+
+		if is_reference(m_data):
+			m_data = dict(load_mesh(m_data, file_path), mesh_ref=m_data.get("mesh_ref"))
+			g_data = dict(g_data, mesh_data=m_data)
+
+		geometry.append(g_data)
+
+	return dict(data, geometry=geometry)
+
+
+def get_referenced_meshes(directory, manifests=None):
+	"""
+	Collect the mesh hashes referenced by the data files of a folder and its
+	sub folders. The references are read from the folder manifests, files
+	indexed before the manifests recorded references are read from disk.
+
+	:param str directory:
+	:param dict manifests: {directory: manifest} of already loaded manifests
+	:return: mesh hashes, None when a data file could not be read
+	:rtype: set/None
+	"""
+	manifests = manifests if manifests is not None else {}
+	hashes = set()
+
+	for root, dirs, _ in os.walk(directory):
+		# skip hidden folders (ie. the mesh store)
+		dirs[:] = [d for d in dirs if not d.startswith(".")]
+
+		if root not in manifests:
+			manifests[root] = manifest.get_manifest(root)
+
+		folder_manifest = manifests.get(root)
+		entries = folder_manifest.get_entries()
+
+		for file_name in folder_manifest.get_files():
+			geometry = (entries.get(file_name) or {}).get("geometry")
+
+			if geometry is not None and all("mesh_ref" in g for g in geometry):
+				hashes.update(g.get("mesh_ref") for g in geometry if g.get("mesh_ref"))
+				continue
+
+			if not file_name.endswith(manifest.DATA_EXTENSIONS):
+				continue
+
+			try:
+				data = io.read_file(os.path.join(root, file_name))
+			except Exception as e:
+				log.warning("Unable to read mesh references of '{}': {}".format(file_name, e))
+				return
+
+			if not isinstance(data, dict):
+				continue
+
+			for g_data in data.get("geometry") or []:
+				if is_reference(g_data.get("mesh_data")):
+					hashes.add(g_data.get("mesh_data").get("mesh_ref"))
+
+	return hashes
+
+
+def prune_store(store_path, manifests=None):
+	"""
+	Remove the blobs of a mesh store that are no longer referenced by any data
+	file of the folder it serves, ie. meshes replaced by a later export.
+	Nothing is removed when the references of a data file cannot be read.
+
+	:param str store_path:
+	:param dict manifests: {directory: manifest} of already loaded manifests
+	:return: removed blob paths
+	:rtype: list
+	"""
+	if not os.path.isdir(store_path):
+		return []
+
+	hashes = get_referenced_meshes(os.path.dirname(store_path), manifests)
+	if hashes is None:
+		log.warning("Skipped pruning mesh store '{}'.".format(store_path))
+		return []
+
+	removed = []
+	for file_name in os.listdir(store_path):
+		mesh_hash, extension = os.path.splitext(file_name)
+		if extension != ".dbin" or mesh_hash in hashes:
+			continue
+
+		blob_path = os.path.join(store_path, file_name)
+		try:
+			os.remove(blob_path)
+		except OSError as e:
+			log.warning("Unable to remove mesh '{}': {}".format(blob_path, e))
+			continue
+
+		MESH_CACHE.pop(mesh_hash, None)
+		removed.append(blob_path)
+
+	if removed:
+		log.info("Removed {} unused meshes from '{}'.".format(len(removed), store_path))
+
+	return removed
+
+
+def clear_cache():
+	"""
+	Clear the in memory mesh cache.
+	"""
+	MESH_CACHE.clear()
@@ -1,12 +1,18 @@
+import contextlib
 import logging
 
 from maya import cmds as cmds
 from smrig.dataioo import api
+from smrig.dataioo import meshstore
 from smrig.dataioo import topology
 from smrig.dataioo import utils
+from smrig.lib import transferlib
+from smrig.lib import weightslib
 
 log = logging.getLogger("deformerIO.tools")
 
+TRANSFER_SESSION = {"active": False, "maps": {}}
+
 
 # Functions for setting data on import ---------------------------------------------------
 
@@ -128,6 +134,147 @@ def build_transfer_geos(geo_data):
 	return transfer_geos
 
 
+@contextlib.contextmanager
+def transfer_session():
+	"""
+	Share data between imports: transfer maps are cached per stored mesh,
+	target and method, mesh hashes per shape and shared mesh blobs are read
+	once. All caches are cleared when the session ends.
+
+	USAGE:
+		with tools.transfer_session():
+			for file_path in file_paths:
+				import_deformer(file_path)
+	"""
+	if TRANSFER_SESSION.get("active"):
+		yield
+		return
+
+	TRANSFER_SESSION["active"] = True
+	topology.clear_hash_cache()
+	try:
+		yield
+
+	finally:
+		TRANSFER_SESSION["active"] = False
+		TRANSFER_SESSION.get("maps").clear()
+		topology.clear_hash_cache()
+		meshstore.clear_cache()
+
+
+def get_transfer_map(g_data, method="closest"):
+	"""
+	Map the vertices of the deformed geometry onto the stored mesh data in
+	world space, like the transfer geometry the weights used to be copied
+	from. Inside a transfer session maps are cached per stored mesh, target,
+	target matrix and method.
+
+	:param dict g_data: geometry data
+	:param str method: closest or uvs
+	:return: transfer map, None when the geometry is not a mesh or has no mesh data
+	:rtype: list/None
+	"""
+	geo = g_data.get("name")
+	m_data = g_data.get("mesh_data")
+	shapes = utils.get_shapes(geo) if geo and cmds.objExists(geo) else None
+
+	if not m_data or not shapes or cmds.nodeType(shapes[0]) != "mesh":
+		log.warning("Cannot transfer weights in memory: no mesh data for {}".format(geo))
+		return
+
+	orig_shape = utils.get_orig_shape(geo)
+	key = None
+
+	if TRANSFER_SESSION.get("active"):
+		mesh_hash = m_data.get("mesh_ref") or meshstore.get_mesh_hash(m_data)
+		matrix = tuple(cmds.xform(utils.get_transform(orig_shape), query=True, worldSpace=True, matrix=True))
+		key = (mesh_hash, cmds.ls(orig_shape, long=True)[0], topology.get_shape_hashes(orig_shape)[0], matrix, method)
+
+		if key in TRANSFER_SESSION.get("maps"):
+			return TRANSFER_SESSION.get("maps").get(key)
+
+	target = topology.get_mesh_data(orig_shape, get_name=False)
+	transfer_map = transferlib.get_transfer_map(dict(m_data, points=topology.get_world_points(m_data)),
+	                                            dict(target, points=topology.get_world_points(target)),
+	                                            method=method)
+
+	if key:
+		TRANSFER_SESSION.get("maps")[key] = transfer_map
+
+	return transfer_map
+
+
+def transfer_weights(deformer, geo_data, method="closest"):
+	"""
+	Transfer the stored weights onto the deformed geometry by closest point or
+	uv space. The weights are interpolated in memory from the stored mesh data
+	and set with a single call per geometry, no transfer geometry is created.
+	The deformer must deform the full shapes.
+
+	:param str deformer:
+	:param list geo_data:
+	:param str method: closest or uvs
+	"""
+	results = []
+	for g_data in geo_data:
+		weights = g_data.get("weights")
+		transfer_map = get_transfer_map(g_data, method) if weights else None
+
+		if transfer_map is None:
+			results.append(dict(g_data, weights=None))
+			continue
+
+		vertex_count = len(g_data.get("mesh_data").get("points"))
+		indices = utils.get_cmpt_indices(g_data.get("cmpts"))
+		indices = indices if indices is not None else range(vertex_count)
+
+		if len(indices) != len(weights):
+			log.warning("Cannot transfer weights in memory: components of {} don't match the weights".format(
+				g_data.get("name")))
+			results.append(dict(g_data, weights=None))
+			continue
+
+		values = [0.0] * vertex_count
+		for i, weight in zip(indices, weights):
+			values[i] = weight
+
+		results.append(dict(g_data, weights=transferlib.interpolate(values, transfer_map)))
+
+	set_weights(deformer, geo_data=results)
+
+
+def transfer_skin_weights(deformer, geo_data, method="closest"):
+	"""
+	Transfer the stored skin and blend weights onto the skinned geometry by
+	closest point or uv space. The weights are interpolated in memory from the
+	stored mesh data and set with a single call.
+
+	:param str deformer:
+	:param list geo_data:
+	:param str method: closest or uvs
+	"""
+	g_data = geo_data[0]
+	transfer_map = get_transfer_map(g_data, method)
+
+	if transfer_map is None:
+		return
+
+	weights, blend_weights = g_data.get("weights")
+	vertex_count = len(g_data.get("mesh_data").get("points"))
+
+	if weightslib.is_sparse(weights):
+		weights = transferlib.interpolate_sparse(weights, transfer_map)
+	else:
+		weights = transferlib.interpolate(weights, transfer_map, width=len(weights) // vertex_count)
+
+	if blend_weights is not None and len(blend_weights) == vertex_count:
+		blend_weights = transferlib.interpolate(blend_weights, transfer_map)
+	else:
+		blend_weights = [0.0] * len(transfer_map)
+
+	set_skin_weights(deformer, [dict(g_data, weights=[weights, blend_weights])])
+
+
 def set_weights(deformer, value=1.0, geo_data=None):
 	"""
 	Set deformer weights using either geo_data or explicit value
@@ -162,12 +309,19 @@ def set_weights(deformer, value=1.0, geo_data=None):
 
 def set_skin_weights(deformer, geo_data):
 	"""
-	Get skin weights and blend weights arrays
+	Set skin weights and blend weights arrays, weights can be either dense or
+	sparse.
 
 	:param str deformer:
-	:return list: (weights, blend weights)
+	:param list geo_data:
 	"""
-	weights = api.convert_to_array(geo_data[0].get("weights")[0], double_array=True)
+	weights = geo_data[0].get("weights")[0]
+
+	if weightslib.is_sparse(weights):
+		weights = api.convert_sparse_to_array(weights)
+	else:
+		weights = api.convert_to_array(weights, double_array=True)
+
 	blend_weights = api.convert_to_array(geo_data[0].get("weights")[1], double_array=True)
 
 	fn_skin = api.get_fn_deformer(deformer)
@@ -213,18 +367,19 @@ def generate_deform_cmpts_list(geo_data, transfer_geos=None, full_shape=False):
 # Functions for getting data to export ---------------------------------------------------
 
 
-def get_geometry_data(deformer, get_weights=True):
+def get_geometry_data(deformer, get_weights=True, sparse=False):
 	"""
 	Generate a dict of geometry weights, cmpts, and mesh creation data
 	:param deformer:
 	:param get_weights:
+	:param bool sparse: store skin weights in the sparse (csr) format
 	:return:
 	"""
 	result = []
 
 	geos, cmpts = get_deformed_cmpts(deformer)
 	if get_weights:
-		weights = api.get_weights(deformer)
+		weights = api.get_weights(deformer, sparse=sparse)
 		mesh_data = topology.get_transfer_geo_data(geos)
 
 		for geo, cmpt, weight, m_data in zip(geos, cmpts, weights, mesh_data):
@@ -330,13 +485,16 @@ def evaluate_method(geo_data, method):
 
 		# if method is auto then check topology and switch to closest if
 		if m_data and method == "auto":
-			if topology.compare_topology(geo, shape2_data=m_data):
+			topology_match, uvs_exist = topology.compare_hashes(geo, m_data)
+
+			if topology_match:
 				return "vertex"
 
-			elif topology.compare_topology(geo, shape2_data=m_data, uv_exists=True):
+			elif uvs_exist:
 				return "uvs"
 
 			else:
+				log.warning("{} topology does NOT match".format(geo))
 				return "closest"
 
 	# catch all for defaulting to vert oder
@@ -1,11 +1,17 @@
+import array
+import hashlib
 import logging
+import math
 
 import maya.api.OpenMaya as OpenMaya
 import maya.cmds as cmds
 from smrig.dataioo import utils
+from smrig.lib import weightslib
 
 log = logging.getLogger("deformerIO.topology")
 
+HASH_CACHE = {}
+
 
 def get_transfer_geo_data(geos):
 	"""
@@ -18,7 +24,7 @@ def get_transfer_geo_data(geos):
 	return [get_mesh_data(s, get_name=False) for s in shapes]
 
 
-def create_mesh(name, matrix, points, poly_connects, poly_count, uvs, uv_ids, uv_counts):
+def create_mesh(name, matrix, points, poly_connects, poly_count, uvs, uv_ids, uv_counts, **kwargs):
 	"""
 	Create a new mesh and position it using its matrix, points and triangles.
 	This function can be used in unison with the
@@ -29,6 +35,7 @@ def create_mesh(name, matrix, points, poly_connects, poly_count, uvs, uv_ids, uv
 	:param list matrix:
 	:param list points:
 	:param list triangles:
+	:param kwargs: other mesh data (ie. hashes), ignored
 	:return: Mesh transform and shape
 	:rtype: tuple
 	"""
@@ -115,7 +122,9 @@ def get_mesh_data(shape, get_name=True):
 	        "poly_count": poly_count,
 	        "uvs": uvs,
 	        "uv_ids": uv_ids,
-	        "uv_counts": uv_counts}
+	        "uv_counts": uv_counts,
+	        "topology_hash": hash_int_arrays(poly_count, poly_connects),
+	        "uv_hash": hash_int_arrays(uv_counts, uv_ids) if uv_ids else None}
 
 	if get_name:
 		data["name"] = shape
@@ -123,9 +132,128 @@ def get_mesh_data(shape, get_name=True):
 	return data
 
 
+def get_world_points(mesh_data):
+	"""
+	Get the points of mesh data in world space, the points are moved by the
+	decomposed matrix of the data the same way :func:`create_mesh` positions
+	the mesh.
+
+	:param dict mesh_data:
+	:return: world space points
+	:rtype: list
+	"""
+	points = mesh_data.get("points") or []
+	matrix = mesh_data.get("matrix")
+
+	if not matrix:
+		return points
+
+	translate, rotate, scale, rotate_order = matrix
+
+	transformation = OpenMaya.MTransformationMatrix()
+	transformation.setScale(scale, OpenMaya.MSpace.kTransform)
+	transformation.setRotation(OpenMaya.MEulerRotation([math.radians(r) for r in rotate], rotate_order))
+	transformation.setTranslation(OpenMaya.MVector(translate), OpenMaya.MSpace.kTransform)
+	world_matrix = transformation.asMatrix()
+
+	return [list(OpenMaya.MPoint(point) * world_matrix)[:3] for point in points]
+
+
 # Other mesh utilites ---------------------------------------------------------------------
 
 
+def hash_int_arrays(*int_arrays):
+	"""
+	Hash sequences of integers as int32 buffers.
+
+	:param int_arrays: lists of ints
+	:return: sha1 hex digest
+	:rtype: str
+	"""
+	sha = hashlib.sha1()
+	for values in int_arrays:
+		values = array.array("i", weightslib.as_list(values or []))
+		sha.update(values.tobytes() if hasattr(values, "tobytes") else values.tostring())
+		sha.update(b"|")
+
+	return sha.hexdigest()
+
+
+def get_topology_hash(mesh_data):
+	"""
+	Get a hash of the mesh topology (poly counts and poly connects) from mesh
+	data, the hash stored in the data is used when available.
+
+	:param dict mesh_data:
+	:return: topology hash or None when there is no mesh data
+	:rtype: str/None
+	"""
+	if not mesh_data:
+		return
+
+	if mesh_data.get("topology_hash"):
+		return mesh_data.get("topology_hash")
+
+	if mesh_data.get("poly_connects") is None:
+		return
+
+	return hash_int_arrays(mesh_data.get("poly_count"), mesh_data.get("poly_connects"))
+
+
+def get_uv_hash(mesh_data):
+	"""
+	Get a hash of the uv layout (uv counts and uv ids) from mesh data, the hash
+	stored in the data is used when available.
+
+	:param dict mesh_data:
+	:return: uv hash or None when the mesh has no uvs
+	:rtype: str/None
+	"""
+	if not mesh_data:
+		return
+
+	if "uv_hash" in mesh_data:
+		return mesh_data.get("uv_hash")
+
+	if not mesh_data.get("uv_ids"):
+		return
+
+	return hash_int_arrays(mesh_data.get("uv_counts"), mesh_data.get("uv_ids"))
+
+
+def get_shape_hashes(shape):
+	"""
+	Get the topology and uv hash of a mesh in the scene. The hashes are cached
+	for an import session (see :func:`smrig.dataioo.tools.transfer_session`),
+	which clears the cache when it starts and ends. Inside a session the cache
+	is keyed by the shape path and its vertex, face and uv counts.
+
+	:param str shape:
+	:return: topology hash, uv hash
+	:rtype: tuple
+	"""
+	mesh_fn = OpenMaya.MFnMesh(utils.get_dag_path(utils.get_dep(shape)))
+	key = (mesh_fn.fullPathName(), mesh_fn.numVertices, mesh_fn.numPolygons, mesh_fn.numFaceVertices, mesh_fn.numUVs())
+
+	hashes = HASH_CACHE.get(key)
+	if hashes is None:
+		poly_count, poly_connects = mesh_fn.getVertices()
+		uv_counts, uv_ids = mesh_fn.getAssignedUVs()
+
+		hashes = (hash_int_arrays(poly_count, poly_connects),
+		          hash_int_arrays(uv_counts, uv_ids) if len(uv_ids) else None)
+		HASH_CACHE[key] = hashes
+
+	return hashes
+
+
+def clear_hash_cache():
+	"""
+	Clear the import session cache of mesh hashes.
+	"""
+	HASH_CACHE.clear()
+
+
 def compare_topology(shape1, shape2=None, shape2_data=None, key="poly_connects", uv_exists=False):
 	"""
 	Comapre the topology of two meshes
@@ -150,3 +278,22 @@ def compare_topology(shape1, shape2=None, shape2_data=None, key="poly_connects",
 		log.warning("{} & {} do NOT match".format(shape1, shape2))
 
 	return result
+
+
+def compare_hashes(shape, mesh_data):
+	"""
+	Compare a mesh in the scene with exported mesh data using the topology and
+	uv hashes, the mesh is never extracted.
+
+	:param str shape:
+	:param dict mesh_data:
+	:return: topology matches, both meshes have uvs
+	:rtype: tuple
+	"""
+	shape = utils.get_shapes(shape)[0]
+	if cmds.nodeType(shape) != "mesh":
+		return False, False
+
+	topology_hash, uv_hash = get_shape_hashes(shape)
+
+	return topology_hash == get_topology_hash(mesh_data), bool(uv_hash and get_uv_hash(mesh_data))
@@ -74,15 +74,7 @@ class Cluster(object):
 			tools.set_weights(deformer, geo_data=geo_data)
 
 		else:
-			transfer_geos = tools.build_transfer_geos(geo_data)
-			t_deformed_cmpts = tools.generate_deform_cmpts_list(geo_data, transfer_geos)
-
-			t_deformer, t_handle = create_cluster(t_deformed_cmpts, deformer + "_TRANSFER",
-			                                      bs=attrs_data.get("bindState"))
-			tools.set_weights(t_deformer, value=1, geo_data=geo_data)
-
-			tools.transfer_deformer_weights(t_deformer, deformer, transfer_geos, geo_data, method)
-			cmds.delete(t_deformer, t_handle, [t[0] for t in transfer_geos])
+			tools.transfer_weights(deformer, geo_data, method)
 
 		# set attrs data
 		tools.set_attributes_data(deformer, attrs_data)
@@ -70,14 +70,7 @@ def set_data(data, method="auto", **kwargs):
 		tools.set_weights(deformer, geo_data=geo_data)
 
 	else:
-		transfer_geos = tools.build_transfer_geos(geo_data)
-		t_deformed_cmpts = tools.generate_deform_cmpts_list(geo_data, transfer_geos, full_shape=True)
-
-		t_deformer = cmds.nonLinear(t_deformed_cmpts, type=n_type, n=deformer + "_TRANSFER")[0]
-		tools.set_weights(t_deformer, geo_data=geo_data)
-
-		tools.transfer_deformer_weights(t_deformer, deformer, transfer_geos, geo_data, method)
-		cmds.delete(t_deformer, [t[0] for t in transfer_geos])
+		tools.transfer_weights(deformer, geo_data, method)
 
 	# set attrs data
 	tools.set_transforms_data(xforms_data)
@@ -81,14 +81,7 @@ def set_data(data, method="auto", **kwargs):
 		tools.set_weights(deformer, geo_data=geo_data)
 
 	else:
-		transfer_geos = tools.build_transfer_geos(geo_data)
-		t_deformed_cmpts = tools.generate_deform_cmpts_list(geo_data, transfer_geos, full_shape=True)
-
-		t_deformer = cmds.deformer(t_deformed_cmpts, type="proximityWrap", name=deformer)[0]
-		tools.set_weights(t_deformer, geo_data=geo_data)
-
-		tools.transfer_deformer_weights(t_deformer, deformer, transfer_geos, geo_data, method)
-		cmds.delete(t_deformer, [t[0] for t in transfer_geos])
+		tools.transfer_weights(deformer, geo_data, method)
 
 	# set attrs data
 	tools.set_attributes_data(deformer, attrs_data)
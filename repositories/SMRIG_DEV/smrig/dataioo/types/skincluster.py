@@ -3,14 +3,15 @@ from maya import cmds
 from smrig.dataioo import tools
 
 deformer_type = "skinCluster"
-file_type = "pickle"
+file_type = "dbin"
 
 
-def get_data(deformer, **kwargs):
+def get_data(deformer, sparse=True, **kwargs):
 	"""
 	Get deformer creation data.
 
 	:param str deformer: deformer
+	:param bool sparse: store weights in the sparse (csr) format
 	:return dict: creation data to export
 	"""
 
@@ -27,7 +28,7 @@ def get_data(deformer, **kwargs):
 	         "maintainMaxInfluences",
 	         "maxInfluences"]
 
-	geo_data = tools.get_geometry_data(deformer)
+	geo_data = tools.get_geometry_data(deformer, sparse=sparse)
 	joints = cmds.skinCluster(deformer, q=True, inf=True)
 	attrs_data = tools.get_attributes_data(deformer, attrs)
 
@@ -67,14 +68,7 @@ def set_data(data, method="auto", **kwargs):
 		tools.set_skin_weights(deformer, geo_data=geo_data)
 
 	else:
-		transfer_geos = tools.build_transfer_geos(geo_data)
-		t_deformed_cmpts = tools.generate_deform_cmpts_list(geo_data, transfer_geos, full_shape=True)
-
-		t_deformer = cmds.skinCluster(t_deformed_cmpts, joints, n=deformer + "_TRANSFER", tsb=True)[0]
-		tools.set_skin_weights(t_deformer, geo_data=geo_data)
-
-		tools.transfer_deformer_weights(t_deformer, deformer, transfer_geos, geo_data, method)
-		cmds.delete(t_deformer, [t[0] for t in transfer_geos])
+		tools.transfer_skin_weights(deformer, geo_data, method)
 
 	# set attrs data
 	tools.set_attributes_data(deformer, attrs_data)
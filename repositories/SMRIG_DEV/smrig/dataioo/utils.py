@@ -3,6 +3,7 @@ import sys
 import logging
 import math
 import os
+import re
 import time
 
 import maya.api.OpenMaya as OpenMaya
@@ -76,6 +77,31 @@ def get_mesh_cmpts_from_set(deformer):
 	return results
 
 
+def get_cmpt_indices(cmpts):
+	"""
+	Get the sorted vertex indices of a list of vertex components, ie.
+	["vtx[0:3]", "vtx[7]"] returns [0, 1, 2, 3, 7].
+
+	:param list cmpts:
+	:return: vertex indices, None when there are no or other than vertex components
+	:rtype: list/None
+	"""
+	if not cmpts:
+		return
+
+	indices = set()
+	for cmpt in as_list(cmpts):
+		match = re.match(r"^(?:.*\.)?vtx\[(\d+)(?::(\d+))?\]$", cmpt)
+		if not match:
+			return
+
+		start = int(match.group(1))
+		end = int(match.group(2)) if match.group(2) else start
+		indices.update(range(start, end + 1))
+
+	return sorted(indices)
+
+
 def get_required_nodes(data):
 	"""
 	Get required nodes this is a blanket function to catch all deformer and constraint types
@@ -21,6 +21,8 @@ CAPITALIZE_SIDE = True
 CAPITALIZE_SUFFIX = True
 CACHE_DIRECTORY = utils.normpath(cmds.internalVar(utd=True))
 CACHE = False
+CACHE_BUDGET = 10240
+PROFILE_SCENE_COUNTS = False
 DEBUG_MODE = False
 USE_NUMERICAL_INDEX = True
 DEFAULT_FILE_TYPE = DEFAULT_FILE_TYPE
@@ -57,6 +59,8 @@ class Prefs():
 			"sandbox_path_template": self._sandbox_path_template,
 			"cache_directory": self._cache_directory,
 			"cache": self._cache,
+			"cache_budget": self._cache_budget,
+			"profile_scene_counts": self._profile_scene_counts,
 			"debug_mode": self._debug_mode,
 			"capitalize_side": self._capitalize_side,
 			"capitalize_suffix": self._capitalize_suffix,
@@ -272,6 +276,36 @@ class Prefs():
 
 	# ------------------------------------------------------------------------
 
+	def get_cache_budget(self):
+		"""
+		:return: Max disk space used by build step cache files in MB
+		:rtype: int
+		"""
+		return self._cache_budget
+
+	def set_cache_budget(self, size):
+		"""
+		:param int size: Max disk space used by build step cache files in MB
+		"""
+		self._cache_budget = size
+
+	# ------------------------------------------------------------------------
+
+	def get_profile_scene_counts(self):
+		"""
+		:return: Measure node and connection count deltas of build steps
+		:rtype: bool
+		"""
+		return self._profile_scene_counts
+
+	def set_profile_scene_counts(self, state):
+		"""
+		:param bool state: Measure node and connection count deltas of build steps
+		"""
+		self._profile_scene_counts = state
+
+	# ------------------------------------------------------------------------
+
 	def get_cache_directory(self):
 		"""
 		:return: Path template
@@ -329,6 +363,8 @@ class Prefs():
 			self._sandbox_path_template = data.get("sandbox_path_template", self._sandbox_path_template)
 			self._cache_directory = data.get("cache_directory", self._cache_directory)
 			self._cache = data.get("cache", self._cache)
+			self._cache_budget = data.get("cache_budget", self._cache_budget)
+			self._profile_scene_counts = data.get("profile_scene_counts", self._profile_scene_counts)
 			self._side_tokens = data.get("side_tokens", self._side_tokens)
 			self._capitalize_side = data.get("capitalize_side", self._capitalize_side)
 			self._capitalize_suffix = data.get("capitalize_suffix", self._capitalize_suffix)
@@ -354,6 +390,8 @@ class Prefs():
 		self._sandbox_path_template = SANDBOX_TEMPLATE
 		self._cache_directory = CACHE_DIRECTORY
 		self._cache = CACHE
+		self._cache_budget = CACHE_BUDGET
+		self._profile_scene_counts = PROFILE_SCENE_COUNTS
 		self._debug_mode = DEBUG_MODE
 		self._type_suffix = TYPE_SUFFIX
 		self._use_numerical_index = USE_NUMERICAL_INDEX
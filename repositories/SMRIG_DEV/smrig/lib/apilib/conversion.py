@@ -1,5 +1,7 @@
 import maya.OpenMaya as OpenMaya
 
+from smrig.lib import weightslib
+
 
 def get_dep(node):
 	"""
@@ -43,3 +45,56 @@ def get_plug(node):
 	sel.getPlug(0, plug)
 
 	return plug
+
+
+def to_double_array(values):
+	"""
+	Convert a sequence of numbers into an MDoubleArray in one call. The values
+	are copied into a C buffer using MScriptUtil instead of setting each index
+	from python.
+
+	:param list/tuple/array values:
+	:return: Maya double array
+	:rtype: OpenMaya.MDoubleArray
+	"""
+	values = weightslib.as_list(values)
+	if not values:
+		return OpenMaya.MDoubleArray()
+
+	util = OpenMaya.MScriptUtil()
+	util.createFromList(values, len(values))
+	return OpenMaya.MDoubleArray(util.asDoublePtr(), len(values))
+
+
+def to_float_array(values):
+	"""
+	Convert a sequence of numbers into an MFloatArray in one call.
+
+	:param list/tuple/array values:
+	:return: Maya float array
+	:rtype: OpenMaya.MFloatArray
+	"""
+	values = weightslib.as_list(values)
+	if not values:
+		return OpenMaya.MFloatArray()
+
+	util = OpenMaya.MScriptUtil()
+	util.createFromList(values, len(values))
+	return OpenMaya.MFloatArray(util.asFloatPtr(), len(values))
+
+
+def to_int_array(values):
+	"""
+	Convert a sequence of integers into an MIntArray in one call.
+
+	:param list/tuple/array values:
+	:return: Maya int array
+	:rtype: OpenMaya.MIntArray
+	"""
+	values = weightslib.as_list(values)
+	if not values:
+		return OpenMaya.MIntArray()
+
+	util = OpenMaya.MScriptUtil()
+	util.createIntArrayFromList(values, len(values))
+	return OpenMaya.MIntArray(util.asIntPtr(), len(values))
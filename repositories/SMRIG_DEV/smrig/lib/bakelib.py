@@ -1,6 +1,11 @@
+import logging
+import time
+
 import maya.cmds as cmds
 
-from smrig.lib import utilslib, animationlib, decoratorslib
+from smrig.lib import utilslib, animationlib, decoratorslib, keyslib
+
+log = logging.getLogger("smrig.lib.bakelib")
 
 
 @decoratorslib.null_viewport
@@ -68,46 +73,148 @@ def bake_animation(nodes,
 		delete_redundant_keys(curves, remove_static_flat_keys, remove_static_linear_keys, precision)
 
 
-def delete_redundant_keys(curves, flat_keys=True, linear_keys=True, precision=3):
+def delete_redundant_keys(curves, flat_keys=True, linear_keys=True, precision=3, analytic=True, reset_tangents=True):
 	"""
-	Remove flat or linear redundant keys
+	Remove flat or linear redundant keys. The keys of every curve are queried
+	once and analysed without editing the curve, the redundant keys are then
+	removed with one cut per curve. Curves with tangents that cannot be
+	evaluated analytically (ie. spline) use the per key scene test.
+
+	The scene test gives every tested key linear tangents. With reset_tangents
+	the analytic path does the same to the kept inner keys and evaluates the
+	keys the way the scene test does, so both paths remove the same keys.
 
 	:param curves:
 	:param flat_keys:
 	:param linear_keys:
 	:param precision:
-	:return:
+	:param bool analytic: analyse the key arrays, False always uses the per key scene test
+	:param bool reset_tangents: set the tangents of kept inner keys to linear, the scene test always does
+	:return: {curve: number of removed keys}
+	:rtype: dict
 	"""
 	curves = utilslib.conversion.as_list(curves)
+	results = {}
 
 	for crv in curves:
-		values = cmds.keyframe(crv, valueChange=1, query=1)
-		frames = cmds.keyframe(crv, timeChange=1, query=1)
-		redundant = []
+		values = cmds.keyframe(crv, valueChange=1, query=1) or []
+		frames = cmds.keyframe(crv, timeChange=1, query=1) or []
 
-		for i in range(1, len(values[1:])):
-			v = values[i]
-			t = frames[i]
-			pv = values[i - 1]
-			nv = values[i + 1]
+		out_types, in_types = [], []
+		if linear_keys and analytic:
+			out_types = cmds.keyTangent(crv, query=1, outTangentType=1) or []
+			in_types = cmds.keyTangent(crv, query=1, inTangentType=1) or []
 
-			if flat_keys and nv == v and v == pv:
-				redundant.append(t)
+			if reset_tangents:
+				out_types = keyslib.get_tested_out_types(out_types)
+
+		if analytic and keyslib.is_analytic(out_types, in_types):
+			indices = keyslib.get_redundant_keys(frames, values, flat_keys, linear_keys, precision, out_types)
+			redundant = [frames[i] for i in indices]
+
+			if linear_keys and reset_tangents:
+				removed = set(indices)
+				kept = [(frames[i], frames[i]) for i in range(1, len(frames) - 1) if i not in removed]
+				if kept:
+					cmds.keyTangent(crv, time=kept, inTangentType="linear", outTangentType="linear")
+		else:
+			redundant = get_redundant_keys_from_scene(crv, frames, values, flat_keys, linear_keys, precision)
+
+		if redundant:
+			cmds.cutKey(crv, time=[(t, t) for t in redundant], clear=True)
+
+		results[crv] = len(redundant)
+
+	return results
+
+
+def get_redundant_keys_from_scene(crv, frames, values, flat_keys=True, linear_keys=True, precision=3):
+	"""
+	Find redundant keys by removing every key and letting maya evaluate the
+	curve at its time. Tested keys get linear tangents.
+
+	:param str crv:
+	:param list frames:
+	:param list values:
+	:param flat_keys:
+	:param linear_keys:
+	:param precision:
+	:return: times of the redundant keys
+	:rtype: list
+	"""
+	redundant = []
+
+	for i in range(1, len(values[1:])):
+		v = values[i]
+		t = frames[i]
+		pv = values[i - 1]
+		nv = values[i + 1]
+
+		if flat_keys and nv == v and v == pv:
+			redundant.append(t)
 
 			if linear_keys:
-				cmds.cutKey(crv, t=(t, t))
-				cmds.setKeyframe(crv, t=t, itt="linear", ott="linear")
+				cmds.keyTangent(crv, time=(t, t), inTangentType="linear", outTangentType="linear")
 
-				lv = cmds.keyframe(crv, t=(t, t), valueChange=1, query=1)[0]
+			continue
 
-				cmds.cutKey(crv, t=(t, t))
-				cmds.setKeyframe(crv, t=t, v=v, itt="linear", ott="linear")
+		if linear_keys:
+			cmds.cutKey(crv, t=(t, t))
+			cmds.setKeyframe(crv, t=t, itt="linear", ott="linear")
 
-				if round(v, precision) == round(lv, precision):
-					redundant.append(t)
+			lv = cmds.keyframe(crv, t=(t, t), valueChange=1, query=1)[0]
 
-		for t in redundant:
 			cmds.cutKey(crv, t=(t, t))
+			cmds.setKeyframe(crv, t=t, v=v, itt="linear", ott="linear")
+
+			if round(v, precision) == round(lv, precision):
+				redundant.append(t)
+
+	return redundant
+
+
+def benchmark_redundant_keys(curves, flat_keys=True, linear_keys=True, precision=3):
+	"""
+	Compare the analytic and the per key scene test of delete_redundant_keys
+	on duplicates of the curves, curves whose kept keys or tangent types
+	differ are mismatches. The curves themselves are not changed.
+
+	:param curves:
+	:param flat_keys:
+	:param linear_keys:
+	:param precision:
+	:return: {"analytic": seconds, "scene": seconds, "mismatches": [curve]}
+	:rtype: dict
+	"""
+	curves = utilslib.conversion.as_list(curves)
+	analytic_curves = cmds.duplicate(curves)
+	scene_curves = cmds.duplicate(curves)
+
+	try:
+		start = time.time()
+		delete_redundant_keys(analytic_curves, flat_keys, linear_keys, precision, analytic=True)
+		analytic_time = time.time() - start
+
+		start = time.time()
+		delete_redundant_keys(scene_curves, flat_keys, linear_keys, precision, analytic=False)
+		scene_time = time.time() - start
+
+		mismatches = []
+		for crv, analytic_crv, scene_crv in zip(curves, analytic_curves, scene_curves):
+			if cmds.keyframe(analytic_crv, timeChange=1, query=1) != cmds.keyframe(scene_crv, timeChange=1, query=1):
+				mismatches.append(crv)
+
+			elif cmds.keyTangent(analytic_crv, query=1, outTangentType=1) != \
+					cmds.keyTangent(scene_crv, query=1, outTangentType=1):
+				mismatches.append(crv)
+
+	finally:
+		cmds.delete(analytic_curves + scene_curves)
+
+	log.info("Redundant keys on {} curves: analytic {:.3f}s, scene {:.3f}s, {} mismatches.".format(
+		len(curves), analytic_time, scene_time, len(mismatches)))
+
+	return {"analytic": analytic_time, "scene": scene_time, "mismatches": mismatches}
 
 
 def delete_static_channels(nodes):
@@ -120,66 +227,61 @@ def delete_static_channels(nodes):
 	cmds.delete(nodes, staticChannels=True, unitlessAnimationCurves=False, controlPoints=0, shape=0)
 
 
-def unroll_gimbal_rotations(nodes):
+def unroll_gimbal_rotations(nodes, batch=True):
 	"""
 	Takes transforms and fixes gimbal issues one frame at a time using some conditional math.
+	The rotation keys are queried once per channel and written back with one
+	edit per channel.
 
 	:param nodes:
+	:param bool batch: unroll transforms with the same number of keys together
 	:return:
 	"""
 	nodes = utilslib.conversion.as_list(nodes)
+	groups = {}
 
 	for transform in nodes:
-		t0 = float(cmds.playbackOptions(q=1, ast=1))
-		t1 = float(cmds.playbackOptions(q=1, aet=1))
-		k = 0
+		attrs = ["{}.rotate{}".format(transform, axis) for axis in "XYZ"]
+		counts = [int(cmds.keyframe(attr, query=1, keyframeCount=1) or 0) for attr in attrs]
 
 		# get keys - should be same for all channels since we baked them in that range
-		nKeys = int(cmds.keyframe(transform + ".rotateX", query=1, keyframeCount=1))
-		rotX = cmds.keyframe(transform + ".rotateX", valueChange=1, query=1)
-		rotY = cmds.keyframe(transform + ".rotateY", valueChange=1, query=1)
-		rotZ = cmds.keyframe(transform + ".rotateZ", valueChange=1, query=1)
-
-		for k in range(1, nKeys):
-			x_diff = 0.0
-			y_diff = 0.0
-			z_diff = 0.0
-			x_diff = rotX[k] - rotX[k - 1]
-
-			if x_diff < -90:
-				rotX[k] += float(float((((int((x_diff + 90)) / -360) + 1) * 360)))
-			x_diff = rotX[k] - rotX[k - 1]
-
-			if x_diff > 270:
-				rotX[k] -= float(float((((int((x_diff - 270)) / 360) + 1) * 360)))
-			z_diff = rotZ[k] - rotZ[k - 1]
-
-			if z_diff < -90:
-				rotZ[k] += float(float((((int((z_diff + 90)) / -360) + 1) * 360)))
-			z_diff = rotZ[k] - rotZ[k - 1]
-
-			if z_diff > 270:
-				rotZ[k] -= float(float((((int((z_diff - 270)) / 360) + 1) * 360)))
-			x_diff = rotX[k] - rotX[k - 1]
-
-			if (x_diff > 90) and (x_diff < 270):
-				rotX[k] = rotX[k] - 180
-				rotY[k] = float(180 - rotY[k])
-				rotZ[k] = rotZ[k] - 180
-			y_diff = rotY[k] - rotY[k - 1]
-
-			if y_diff > 180:
-				rotY[k] -= float(float((((int((y_diff - 180)) / 360) + 1) * 360)))
-			y_diff = rotY[k] - rotY[k - 1]
-
-			if y_diff < -180:
-				rotY[k] += float(float((((int((y_diff + 180)) / -360) + 1) * 360)))
-
-		# set keyframes
-		for k in range(0, nKeys):
-			cmds.keyframe((transform + ".rotateX"), edit=1, index=(k, k), valueChange=rotX[k])
-			cmds.keyframe((transform + ".rotateY"), edit=1, index=(k, k), valueChange=rotY[k])
-			cmds.keyframe((transform + ".rotateZ"), edit=1, index=(k, k), valueChange=rotZ[k])
+		if not counts[0] or len(set(counts)) != 1:
+			log.debug("Skipped unrolling {}, rotate channels keys don't match.".format(transform))
+			continue
+
+		values = [cmds.keyframe(attr, valueChange=1, query=1) for attr in attrs]
+		key = counts[0] if batch else transform
+		groups.setdefault(key, []).append((attrs, values))
+
+	for items in groups.values():
+		rot_x, rot_y, rot_z = keyslib.unroll_rotations([i[1][0] for i in items],
+		                                               [i[1][1] for i in items],
+		                                               [i[1][2] for i in items])
+
+		for i, (attrs, _) in enumerate(items):
+			for attr, values in zip(attrs, [rot_x[i], rot_y[i], rot_z[i]]):
+				set_key_values(attr, values)
+
+
+def set_key_values(attr, values):
+	"""
+	Set the values of all keys on the anim curve of an attribute with a
+	single setAttr on its key time value array, falls back to editing key by
+	key when the attribute is not driven by a single anim curve.
+
+	:param str attr:
+	:param list values: value per key
+	"""
+	curves = cmds.keyframe(attr, query=1, name=1) or []
+	times = cmds.keyframe(attr, query=1, timeChange=1) or []
+
+	if len(curves) == 1 and len(times) == len(values):
+		time_values = [x for pair in zip(times, values) for x in pair]
+		cmds.setAttr("{}.ktv[0:{}]".format(curves[0], len(values) - 1), *time_values)
+		return
+
+	for k, value in enumerate(values):
+		cmds.keyframe(attr, edit=1, index=(k, k), valueChange=value)
 
 
 def remove_flip(joints):
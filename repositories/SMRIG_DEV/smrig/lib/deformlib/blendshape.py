@@ -1,11 +1,18 @@
+import logging
+
+import maya.api.OpenMaya as OpenMaya
 import maya.cmds as cmds
 import maya.mel as mel
 from smrig.dataio.types import skin_cluster
 from smrig.lib import attributeslib
 from smrig.lib import naminglib
+from smrig.lib import transferlib
 from smrig.lib.deformlib import wrap
 
+log = logging.getLogger("smrig.lib.deformlib.blendshape")
+
 suffix = naminglib.get_suffix("blendShape")
+CORRESPONDENCE_CACHE = {}
 
 
 def get_shape_targets(blendshape):
@@ -132,18 +139,144 @@ def get_dag_name(name):
 	:param name:
 	:return:
 	"""
-	sel_list = MSelectionList()
-	MGlobal.getSelectionListByName(name, sel_list)
+	sel_list = OpenMaya.MSelectionList()
+
+	try:
+		sel_list.add(name)
+	except RuntimeError:
+		return
+
+	return sel_list.getDagPath(0)
+
+
+def get_mesh_fingerprint(mesh_fn, dag_path):
+	"""
+	Get a fingerprint of the world space state of a mesh, it changes when the
+	mesh moves, deforms or its component counts change.
+
+	:param OpenMaya.MFnMesh mesh_fn:
+	:param OpenMaya.MDagPath dag_path:
+	:return: fingerprint
+	:rtype: tuple
+	"""
+	points = mesh_fn.getPoints(OpenMaya.MSpace.kObject)
+	counts = (mesh_fn.numVertices, mesh_fn.numPolygons, mesh_fn.numFaceVertices)
+	return counts, tuple(dag_path.inclusiveMatrix()), hash(tuple(tuple(p) for p in points))
+
+
+def get_correspondence(src_mesh, dest_mesh, mirror=False):
+	"""
+	Map every destination vertex to the closest point on the source mesh, the
+	triangle vertices and barycentric weights are cached per mesh pair and
+	reused for every target. When mirroring, the vertices on the positive x
+	side are skipped and the others sample the source at their mirrored
+	position.
+
+	The cache is keyed by the mesh names and stores a fingerprint of their
+	world matrix and points, a mesh that moved or changed shape is mapped
+	again and replaces the cached entry.
+
+	:param str src_mesh:
+	:param str dest_mesh:
+	:param bool mirror:
+	:return: {"vertices": destination vertex indices, "map": transfer map, "vertex_count": destination vertex count}
+	:rtype: dict
+	"""
+	src_path = get_dag_name(src_mesh).extendToShape()
+	dest_path = get_dag_name(dest_mesh).extendToShape()
+
+	src_mesh_fn = OpenMaya.MFnMesh(src_path)
+	dest_mesh_fn = OpenMaya.MFnMesh(dest_path)
+
+	key = (src_path.fullPathName(), dest_path.fullPathName(), bool(mirror))
+	fingerprint = (get_mesh_fingerprint(src_mesh_fn, src_path), get_mesh_fingerprint(dest_mesh_fn, dest_path))
+
+	cached = CORRESPONDENCE_CACHE.get(key)
+	if cached and cached[0] == fingerprint:
+		return cached[1]
+
+	mesh_intersector = OpenMaya.MMeshIntersector()
+	mesh_intersector.create(src_path.node(), src_path.inclusiveMatrix())
+
+	vertices = []
+	transfer_map = []
+
+	for i, point in enumerate(dest_mesh_fn.getPoints(OpenMaya.MSpace.kWorld)):
+		if mirror:
+			if point.x > 0:
+				continue
+
+			point = OpenMaya.MPoint(-point.x, point.y, point.z)
+
+		point_on_mesh = mesh_intersector.getClosestPoint(point)
+		u, v = point_on_mesh.barycentricCoords
+		triangle = src_mesh_fn.getPolygonTriangleVertices(point_on_mesh.face, point_on_mesh.triangle)
+
+		vertices.append(i)
+		transfer_map.append((tuple(triangle), (u, v, 1 - u - v)))
+
+	result = {"vertices": vertices, "map": transfer_map, "vertex_count": dest_mesh_fn.numVertices}
+	CORRESPONDENCE_CACHE[key] = (fingerprint, result)
+
+	log.debug("Mapped {} vertices of {} onto {}.".format(len(vertices), dest_mesh, src_mesh))
+	return result
+
+
+def clear_correspondence_cache():
+	"""
+	Clear the cached closest point correspondences.
+	"""
+	CORRESPONDENCE_CACHE.clear()
+
+
+def get_target_weights(deformer, index, vertex_count):
+	"""
+	Get the paintable weights of a target in a single query, vertices without
+	a weight entry use the default weight of 1.0.
+
+	:param str deformer:
+	:param int index: target index
+	:param int vertex_count:
+	:return: weight per vertex
+	:rtype: list
+	"""
+	attr = "{}.it[0].itg[{}].tw".format(deformer, index)
+	weights = [1.0] * vertex_count
+
+	indices = cmds.getAttr(attr, multiIndices=True) or []
+	if not indices:
+		return weights
+
+	values = cmds.getAttr(attr)
+	values = values if isinstance(values, (list, tuple)) else [values]
 
-	if sel_list.length() > 0:
-		obj = MDagPath()
-		sel_list.getDagPath(0, obj)
+	for i, value in zip(indices, values):
+		if i < vertex_count:
+			weights[i] = value
+
+	return weights
+
+
+def set_target_weights(deformer, index, weights):
+	"""
+	Set the paintable weights of a target in a single setAttr.
+
+	:param str deformer:
+	:param int index: target index
+	:param list weights: weight per vertex
+	"""
+	if not len(weights):
+		return
 
-		return obj
+	attr = "{}.it[0].itg[{}].tw[0:{}]".format(deformer, index, len(weights) - 1)
+	cmds.setAttr(attr, *weights, size=len(weights))
 
 
 def copy_target_weights(src_mesh, dest_mesh, src_deformer, dest_deformer, src_target, dest_target, mirror=False):
 	"""
+	Copy or mirror the paintable weights of a target by closest point. The
+	closest point correspondence is cached per mesh pair so copying many
+	targets between the same meshes only maps the vertices once.
 
 	:param src_mesh: source mesh
 	:param dest_mesh: destination mesh
@@ -157,7 +290,7 @@ def copy_target_weights(src_mesh, dest_mesh, src_deformer, dest_deformer, src_ta
 	sidx = get_target_index(src_deformer, src_target)
 	src_attr = "it[0].itg[{}].tw".format(sidx)
 
-	didx = get_target_index(src_deformer, dest_target)
+	didx = get_target_index(dest_deformer, dest_target)
 	dest_attr = "it[0].itg[{}].tw".format(didx)
 
 	if src_deformer == dest_deformer and src_mesh == dest_mesh and not mirror:  # do nothing when copy to itself
@@ -166,62 +299,22 @@ def copy_target_weights(src_mesh, dest_mesh, src_deformer, dest_deformer, src_ta
 	print("{} from '{}.{}' to '{}.{}'".format("Mirror" if mirror else "Copy", src_deformer, src_attr, dest_deformer,
 	                                          dest_attr))
 
-	dest_points = MPointArray()
-	dest_mesh_fn = MFnMesh(get_dag_name(dest_mesh))
-	dest_mesh_fn.getPoints(dest_points, MSpace.kWorld)
-
-	src_mesh_fn = MFnMesh(get_dag_name(src_mesh))
-	mesh_intersector = MMeshIntersector()
-
-	src_mesh_path = get_dag_name(src_mesh)
-	src_mesh_path.extendToShape()
-
-	mesh_intersector.create(src_mesh_path.node(), src_mesh_path.inclusiveMatrix())
-
-	src_attr_py = core.PyNode("{}.{}".format(src_deformer, src_attr))
-	src_attr_values = [0] * src_mesh_fn.numVertices()
-	for i, k in zip(src_attr_py.getArrayIndices(), src_attr_py.get()):
-		src_attr_values[i] = k
-
-	script_util = MScriptUtil()
-
-	weights = [0] * dest_points.length()
-	for i in range(dest_points.length()):
-		mirror_point = MPoint(dest_points[i])
-
-		if mirror:
-			if dest_points[i].x > 0:
-				continue
-
-			mirror_point.x *= -1
-
-		pm = MPointOnMesh()
-		mesh_intersector.getClosestPoint(mirror_point, pm)
-
-		script_util.createFromInt(0, 0, 0, 0)
-		vertices3 = script_util.asIntPtr()
-
-		src_mesh_fn.getPolygonTriangleVertices(pm.faceIndex(), pm.triangleIndex(), vertices3)
-
-		u = floatPtr()
-		v = floatPtr()
-		pm.getBarycentricCoords(u, v)
-		u = u.value()
-		v = v.value()
+	correspondence = get_correspondence(src_mesh, dest_mesh, mirror)
+	vertex_count = correspondence.get("vertex_count")
 
-		w = 1 - u - v
-		# -----------
-		v1 = script_util.getIntArrayItem(vertices3, 0)
-		v2 = script_util.getIntArrayItem(vertices3, 1)
-		v3 = script_util.getIntArrayItem(vertices3, 2)
+	src_weights = get_target_weights(src_deformer, sidx, cmds.polyEvaluate(src_mesh, vertex=True))
+	values = transferlib.interpolate(src_weights, correspondence.get("map"))
 
-		weights[i] = src_attr_values[v1] * u + src_attr_values[v2] * v + src_attr_values[v3] * w
+	# mirrored into the same deformer keeps the weights of the skipped side
+	if mirror and src_deformer == dest_deformer:
+		weights = get_target_weights(dest_deformer, didx, vertex_count)
+	else:
+		weights = [0.0] * vertex_count
 
-	for i in range(dest_points.length()):
-		if mirror and src_deformer == dest_deformer and dest_points[i].x > 0:
-			continue
+	for i, value in zip(correspondence.get("vertices"), values):
+		weights[i] = value
 
-		cmds.setAttr("{}.{}[{}]".format(dest_deformer, dest_attr, i), weights[i])
+	set_target_weights(dest_deformer, didx, weights)
 
 
 class SplitShapes(object):
@@ -1,2 +1,3 @@
 from . import json_ as json
+from . import manifest
 from . import pickle_ as pickle
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+
+log = logging.getLogger("smrig.lib.iolib.manifest")
+
+MANIFEST_FILE_NAME = ".manifest.json"
+MANIFEST_VERSION = 1
+
+
+def get_content_hash(file_path, block_size=1 << 20):
+	"""
+	:param str file_path:
+	:param int block_size:
+	:return: sha1 hex digest of the file content
+	:rtype: str
+	"""
+	sha = hashlib.sha1()
+	with open(file_path, "rb") as f:
+		for block in iter(lambda: f.read(block_size), b""):
+			sha.update(block)
+
+	return sha.hexdigest()
+
+
+def get_data_hash(data, default=None):
+	"""
+	Get a canonical hash of a data dict, dicts are hashed with sorted keys so
+	the hash only changes when the content changes.
+
+	:param data: json serializable data
+	:param func default: json default handler for other objects
+	:return: sha1 hex digest
+	:rtype: str
+	"""
+	try:
+		content = json.dumps(data, sort_keys=True, separators=(",", ":"), default=default).encode("utf-8")
+
+	except TypeError:
+		# keys of mixed types cannot be sorted
+		content = pickle.dumps(data, 2)
+
+	return hashlib.sha1(content).hexdigest()
+
+
+def replace_file(source, destination):
+	"""
+	Move a file over another one, falls back to removing the destination first
+	on windows.
+
+	:param str source:
+	:param str destination:
+	"""
+	try:
+		os.rename(source, destination)
+
+	except OSError:
+		# windows does not allow renaming over an existing file
+		os.remove(destination)
+		os.rename(source, destination)
+
+
+class Manifest(object):
+	"""
+	Sidecar index of the data files in a single folder. Every entry stores the
+	description of a file (deformer type, name, required nodes, ...) together
+	with its size, modification time and content hash. Tools can list a folder,
+	check for missing nodes or preview remaps without opening the data files.
+
+	The manifest refreshes itself, files that were added or changed on disk
+	are described again using the describe callback and deleted files are
+	dropped.
+
+	USAGE:
+		manifest = Manifest(directory, describe=describe_file, extensions=[".pickle", ".json"])
+		manifest.update(file_path, {"name": "cluster1"})
+		manifest.get_entries()
+	"""
+
+	def __init__(self, directory, describe=None, extensions=None, file_name=MANIFEST_FILE_NAME):
+		"""
+		:param str directory:
+		:param func describe: callback returning an entry dict for a file path
+		:param list extensions: only index files ending with these extensions, all files when None
+		:param str file_name: manifest file name
+		"""
+		self.directory = directory
+		self.describe = describe
+		self.extensions = tuple(extensions) if extensions else None
+		self.file_path = os.path.join(directory, file_name)
+		self.entries = {}
+		self.load()
+
+	def __contains__(self, file_name):
+		return file_name in self.entries
+
+	def load(self):
+		"""
+		Load manifest from disk, a missing or corrupt manifest starts empty.
+		"""
+		self.entries = {}
+
+		if not os.path.isfile(self.file_path):
+			return
+
+		try:
+			with open(self.file_path, "r") as f:
+				data = json.load(f)
+
+		except (IOError, OSError, ValueError):
+			log.warning("Unable to read manifest '{}', rebuilding.".format(self.file_path))
+			return
+
+		if data.get("version") == MANIFEST_VERSION:
+			self.entries = data.get("entries", {})
+
+	def save(self):
+		"""
+		Write manifest to disk, the file is replaced in one go so readers never
+		see a partially written manifest.
+		"""
+		if not os.path.isdir(self.directory):
+			os.makedirs(self.directory)
+
+		temp_path = "{}.{}.tmp".format(self.file_path, os.getpid())
+		with open(temp_path, "w") as f:
+			json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f, indent=4, sort_keys=True)
+
+		replace_file(temp_path, self.file_path)
+		log.debug("Saved manifest '{}'.".format(self.file_path))
+
+	def get_files(self):
+		"""
+		:return: Names of the files in the directory that should be indexed
+		:rtype: list
+		"""
+		if not os.path.isdir(self.directory):
+			return []
+
+		files = []
+		for file_name in os.listdir(self.directory):
+			if file_name.startswith(".") or not os.path.isfile(os.path.join(self.directory, file_name)):
+				continue
+
+			if self.extensions and not file_name.endswith(self.extensions):
+				continue
+
+			files.append(file_name)
+
+		return sorted(files)
+
+	def is_stale(self, file_name):
+		"""
+		:param str file_name:
+		:return: True if the file changed on disk since it was indexed
+		:rtype: bool
+		"""
+		entry = self.entries.get(file_name)
+		if not entry:
+			return True
+
+		try:
+			stat = os.stat(os.path.join(self.directory, file_name))
+		except OSError:
+			return True
+
+		return entry.get("size") != stat.st_size or entry.get("mtime") != stat.st_mtime
+
+	def update(self, file_path, entry=None, save=True):
+		"""
+		Add or update the entry of a file, its size, modification time and
+		content hash are read from disk.
+
+		:param str file_path:
+		:param dict entry: description, uses the describe callback when None
+		:param bool save: write the manifest
+		:return: entry
+		:rtype: dict
+		"""
+		if entry is None:
+			entry = self.describe(file_path) if self.describe else {}
+
+		stat = os.stat(file_path)
+		entry = dict(entry or {})
+		entry["size"] = stat.st_size
+		entry["mtime"] = stat.st_mtime
+		entry["content_hash"] = get_content_hash(file_path)
+
+		self.entries[os.path.basename(file_path)] = entry
+
+		if save:
+			self.save()
+
+		return entry
+
+	def remove(self, file_name, save=True):
+		"""
+		:param str file_name:
+		:param bool save: write the manifest
+		"""
+		if self.entries.pop(file_name, None) is not None and save:
+			self.save()
+
+	def refresh(self):
+		"""
+		Re-index files that were added or changed on disk and drop entries of
+		deleted files.
+
+		:return: names of the files that were (re)indexed or removed
+		:rtype: list
+		"""
+		files = self.get_files()
+		changed = [f for f in self.entries.keys() if f not in files]
+
+		for file_name in changed:
+			self.entries.pop(file_name)
+
+		for file_name in files:
+			if self.is_stale(file_name):
+				try:
+					self.update(os.path.join(self.directory, file_name), save=False)
+				except Exception as e:
+					log.warning("Unable to index '{}': {}".format(file_name, e))
+					continue
+
+				changed.append(file_name)
+
+		if changed:
+			self.save()
+
+		return changed
+
+	def get_entry(self, file_name, refresh=True):
+		"""
+		:param str file_name:
+		:param bool refresh: re-index the file when it changed on disk
+		:return: entry
+		:rtype: dict/None
+		"""
+		if refresh and self.is_stale(file_name) and os.path.isfile(os.path.join(self.directory, file_name)):
+			self.update(os.path.join(self.directory, file_name))
+
+		return self.entries.get(file_name)
+
+	def get_entries(self, refresh=True):
+		"""
+		:param bool refresh: re-index changed files first
+		:return: {file name: entry}
+		:rtype: dict
+		"""
+		if refresh:
+			self.refresh()
+
+		return dict(self.entries)
@@ -0,0 +1,286 @@
+"""
+Pure python helpers for keyframe arrays. Nothing in here touches the scene,
+the keys of a curve are queried once and analysed as (time, value, tangent
+type) arrays. numpy is used when available.
+"""
+import logging
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+log = logging.getLogger("smrig.lib.keyslib")
+
+ANALYTIC_OUT_TANGENTS = ["linear", "step", "stepnext"]
+
+
+def is_analytic(out_types, in_types):
+	"""
+	Check if the redundant key test can be evaluated without the scene. A key
+	is tested by removing it, the curve then runs from the previous to the next
+	key. The value of that segment only depends on the keys when the out
+	tangent of the previous key is step or step next, or both tangents are
+	linear.
+
+	:param list out_types: out tangent type per key
+	:param list in_types: in tangent type per key
+	:return: analytic state
+	:rtype: bool
+	"""
+	if not out_types or not in_types:
+		return True
+
+	for i in range(1, len(out_types) - 1):
+		if out_types[i - 1] in ["step", "stepnext"]:
+			continue
+
+		if out_types[i - 1] != "linear" or in_types[i + 1] != "linear":
+			return False
+
+	return True
+
+
+def get_tested_out_types(out_types):
+	"""
+	Get the out tangent types the scene test evaluates with. The keys are
+	tested in order and every tested key gets linear tangents, so the previous
+	key of every key but the second one is linear by the time it is tested.
+
+	:param list out_types: out tangent type per key
+	:return: out tangent types
+	:rtype: list
+	"""
+	if len(out_types) < 3:
+		return list(out_types)
+
+	return out_types[:1] + ["linear"] * (len(out_types) - 2) + out_types[-1:]
+
+
+def get_interpolated_values(times, values, out_types=None):
+	"""
+	Get the value of every inner key interpolated from its neighbours, as if
+	the key was removed from the curve. The first and last key keep their
+	value.
+
+	:param list times:
+	:param list values:
+	:param list out_types: out tangent type per key, linear when None
+	:return: interpolated values
+	:rtype: list
+	"""
+	count = len(values)
+	if count < 3:
+		return list(values)
+
+	if numpy is not None:
+		t = numpy.asarray(times, dtype=numpy.float64)
+		v = numpy.asarray(values, dtype=numpy.float64)
+
+		weight = (t[1:-1] - t[:-2]) / (t[2:] - t[:-2])
+		result = v.copy()
+		result[1:-1] = v[:-2] + (v[2:] - v[:-2]) * weight
+
+		if out_types:
+			types = numpy.asarray(out_types[:-2])
+			result[1:-1] = numpy.where(types == "step", v[:-2], result[1:-1])
+			result[1:-1] = numpy.where(types == "stepnext", v[2:], result[1:-1])
+
+		return result.tolist()
+
+	result = list(values)
+	for i in range(1, count - 1):
+		out_type = out_types[i - 1] if out_types else "linear"
+
+		if out_type == "step":
+			result[i] = values[i - 1]
+		elif out_type == "stepnext":
+			result[i] = values[i + 1]
+		else:
+			weight = (times[i] - times[i - 1]) / float(times[i + 1] - times[i - 1])
+			result[i] = values[i - 1] + (values[i + 1] - values[i - 1]) * weight
+
+	return result
+
+
+def get_redundant_keys(times, values, flat_keys=True, linear_keys=True, precision=3, out_types=None):
+	"""
+	Get the inner keys that can be removed without changing the curve. Every
+	key is tested against its original neighbours:
+
+		- flat: the key and both neighbours have the same value
+		- linear: the key value matches the value interpolated from its
+		  neighbours when rounded to precision
+
+	:param list times:
+	:param list values:
+	:param bool flat_keys:
+	:param bool linear_keys:
+	:param int precision: decimal places compared for linear keys
+	:param list out_types: out tangent type per key, linear when None
+	:return: indices of the redundant keys
+	:rtype: list
+	"""
+	count = len(values)
+	if count < 3 or not (flat_keys or linear_keys):
+		return []
+
+	interpolated = get_interpolated_values(times, values, out_types) if linear_keys else None
+	candidates = range(1, count - 1)
+	redundant = []
+
+	if numpy is not None:
+		v = numpy.asarray(values, dtype=numpy.float64)
+		flat = numpy.zeros(count, dtype=bool)
+		close = numpy.zeros(count, dtype=bool)
+
+		if flat_keys:
+			flat[1:-1] = (v[:-2] == v[1:-1]) & (v[1:-1] == v[2:])
+
+		# values that round to the same decimals are less than one decimal step apart
+		if linear_keys:
+			close[1:-1] = numpy.abs(v[1:-1] - numpy.asarray(interpolated[1:-1])) <= 10.0 ** -precision
+
+		candidates = numpy.flatnonzero(flat | close).tolist()
+
+	for i in candidates:
+		value = values[i]
+
+		if flat_keys and values[i - 1] == value and value == values[i + 1]:
+			redundant.append(i)
+
+		elif linear_keys and round(value, precision) == round(interpolated[i], precision):
+			redundant.append(i)
+
+	return redundant
+
+
+def unroll_rotations(rot_x, rot_y, rot_z):
+	"""
+	Fix gimbal flips in baked euler rotations one key at a time. Every key is
+	compared to the previous, already fixed, key: x and z are wrapped by full
+	turns, a half turn flip in x is converted to the equivalent rotation and y
+	is kept within half a turn of the previous key.
+
+	The channels can hold the keys of a single transform or be lists of key
+	lists (transforms x keys) of equal length, with numpy the transforms are
+	processed together.
+
+	:param list rot_x:
+	:param list rot_y:
+	:param list rot_z:
+	:return: unrolled x, y and z rotations
+	:rtype: tuple(list, list, list)
+	"""
+	if not len(rot_x):
+		return list(rot_x), list(rot_y), list(rot_z)
+
+	nested = isinstance(rot_x[0], (list, tuple)) or (numpy is not None and numpy.ndim(rot_x) == 2)
+
+	if numpy is None:
+		if not nested:
+			return unroll_rotation_keys(list(rot_x), list(rot_y), list(rot_z))
+
+		results = [unroll_rotation_keys(list(x), list(y), list(z)) for x, y, z in zip(rot_x, rot_y, rot_z)]
+		return [r[0] for r in results], [r[1] for r in results], [r[2] for r in results]
+
+	x = numpy.array(rot_x, dtype=numpy.float64, ndmin=2)
+	y = numpy.array(rot_y, dtype=numpy.float64, ndmin=2)
+	z = numpy.array(rot_z, dtype=numpy.float64, ndmin=2)
+
+	for k in range(1, x.shape[1]):
+		x[:, k] = wrap_lower(x[:, k], x[:, k - 1], -90)
+		x[:, k] = wrap_upper(x[:, k], x[:, k - 1], 270)
+		z[:, k] = wrap_lower(z[:, k], z[:, k - 1], -90)
+		z[:, k] = wrap_upper(z[:, k], z[:, k - 1], 270)
+
+		diff = x[:, k] - x[:, k - 1]
+		flip = (diff > 90) & (diff < 270)
+		x[:, k] = numpy.where(flip, x[:, k] - 180, x[:, k])
+		y[:, k] = numpy.where(flip, 180 - y[:, k], y[:, k])
+		z[:, k] = numpy.where(flip, z[:, k] - 180, z[:, k])
+
+		y[:, k] = wrap_upper(y[:, k], y[:, k - 1], 180)
+		y[:, k] = wrap_lower(y[:, k], y[:, k - 1], -180)
+
+	if nested:
+		return x.tolist(), y.tolist(), z.tolist()
+
+	return x[0].tolist(), y[0].tolist(), z[0].tolist()
+
+
+def wrap_lower(values, previous, limit):
+	"""
+	Add full turns to values that are more than limit below the previous
+	values.
+
+	:param numpy.ndarray values:
+	:param numpy.ndarray previous:
+	:param float limit: negative limit
+	:return: values
+	:rtype: numpy.ndarray
+	"""
+	diff = values - previous
+	turns = numpy.floor_divide(numpy.trunc(diff - limit), -360) + 1
+	return numpy.where(diff < limit, values + turns * 360, values)
+
+
+def wrap_upper(values, previous, limit):
+	"""
+	Subtract full turns from values that are more than limit above the
+	previous values.
+
+	:param numpy.ndarray values:
+	:param numpy.ndarray previous:
+	:param float limit: positive limit
+	:return: values
+	:rtype: numpy.ndarray
+	"""
+	diff = values - previous
+	turns = numpy.floor_divide(numpy.trunc(diff - limit), 360) + 1
+	return numpy.where(diff > limit, values - turns * 360, values)
+
+
+def unroll_rotation_keys(rot_x, rot_y, rot_z):
+	"""
+	Pure python version of :func:`unroll_rotations` for a single transform,
+	the lists are modified in place.
+
+	:param list rot_x:
+	:param list rot_y:
+	:param list rot_z:
+	:return: unrolled x, y and z rotations
+	:rtype: tuple(list, list, list)
+	"""
+	for k in range(1, len(rot_x)):
+		x_diff = rot_x[k] - rot_x[k - 1]
+		if x_diff < -90:
+			rot_x[k] += float(((int(x_diff + 90) // -360) + 1) * 360)
+
+		x_diff = rot_x[k] - rot_x[k - 1]
+		if x_diff > 270:
+			rot_x[k] -= float(((int(x_diff - 270) // 360) + 1) * 360)
+
+		z_diff = rot_z[k] - rot_z[k - 1]
+		if z_diff < -90:
+			rot_z[k] += float(((int(z_diff + 90) // -360) + 1) * 360)
+
+		z_diff = rot_z[k] - rot_z[k - 1]
+		if z_diff > 270:
+			rot_z[k] -= float(((int(z_diff - 270) // 360) + 1) * 360)
+
+		x_diff = rot_x[k] - rot_x[k - 1]
+		if 90 < x_diff < 270:
+			rot_x[k] = rot_x[k] - 180
+			rot_y[k] = float(180 - rot_y[k])
+			rot_z[k] = rot_z[k] - 180
+
+		y_diff = rot_y[k] - rot_y[k - 1]
+		if y_diff > 180:
+			rot_y[k] -= float(((int(y_diff - 180) // 360) + 1) * 360)
+
+		y_diff = rot_y[k] - rot_y[k - 1]
+		if y_diff < -180:
+			rot_y[k] += float(((int(y_diff + 180) // -360) + 1) * 360)
+
+	return rot_x, rot_y, rot_z
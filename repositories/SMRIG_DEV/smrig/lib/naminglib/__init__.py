@@ -1,2 +1,3 @@
 from . import conversion
+from . import remapping
 from .common import *
@@ -0,0 +1,173 @@
+import logging
+import re
+import sys
+
+if sys.version_info[0] < 3:
+	string_types = (str, unicode)  # Python 2
+else:
+	string_types = (str,)  # Python 3
+
+log = logging.getLogger("smrig.lib.naminglib.remapping")
+
+
+class Remapper(object):
+	"""
+	Search and replace rules for remapping node names. The rules are applied
+	one after the other in the order they are given, like chained str.replace
+	calls, so a later rule sees the result of the earlier ones. All searches
+	are compiled into a single regular expression that skips names no rule
+	matches. Results are cached per name and the number of times each rule
+	fired is tracked.
+
+	USAGE:
+		remapper = Remapper([("L_", "R_"), ("_JNT", "_BND")])
+		remapper.remap_name("L_arm_JNT")  # "R_arm_BND"
+		remapper.fired  # {"L_": 1, "_JNT": 1}
+
+		# sequential, not simultaneous: swapping sides needs a placeholder
+		Remapper([("L_", "R_"), ("R_", "L_")]).remap_name("L_arm")  # "L_arm"
+	"""
+
+	def __init__(self, remap):
+		"""
+		:param list/dict remap: list of (search, replace) pairs or {search: replace}
+		"""
+		remap = remap.items() if isinstance(remap, dict) else remap or []
+
+		self.rules = [(search, replace) for search, replace in remap if search]
+		self.fired = {}
+		self._cache = {}
+
+		searches = sorted(set(r[0] for r in self.rules), key=len, reverse=True)
+		self.pattern = re.compile("|".join(re.escape(s) for s in searches)) if searches else None
+
+	def __bool__(self):
+		return bool(self.rules)
+
+	__nonzero__ = __bool__
+
+	def remap_name(self, name):
+		"""
+		:param str name:
+		:return: Remapped name
+		:rtype: str
+		"""
+		if not self.pattern or not isinstance(name, string_types):
+			return name
+
+		result = self._cache.get(name)
+		if result is None:
+			matches = []
+			new_name = name
+
+			# a name none of the searches match is never changed by the rules
+			if self.pattern.search(name):
+				for search, replace in self.rules:
+					if search in new_name:
+						matches.append(search)
+						new_name = new_name.replace(search, replace)
+
+			result = (new_name, matches)
+			self._cache[name] = result
+
+		for search in result[1]:
+			self.fired[search] = self.fired.get(search, 0) + 1
+
+		return result[0]
+
+	def remap_list(self, nodes):
+		"""
+		Remap a list of names, nested lists (ie. connections) are remapped
+		recursively.
+
+		:param list nodes:
+		:return: Remapped nodes
+		:rtype: list
+		"""
+		return [self.remap_list(n) if isinstance(n, (list, tuple)) else self.remap_name(n) for n in nodes]
+
+	def remap_dicts(self, dict_list, key="name"):
+		"""
+		Remap the name stored under key in a list of dicts. The dicts are
+		copied, the input is never modified.
+
+		:param list dict_list:
+		:param str key:
+		:return: Remapped dicts
+		:rtype: list
+		"""
+		results = []
+		for item in dict_list:
+			item = dict(item)
+			if key in item:
+				item[key] = self.remap_name(item.get(key))
+
+			results.append(item)
+
+		return results
+
+	def remap_keys(self, data):
+		"""
+		Remap the keys of a dict keyed by node name.
+
+		:param dict data:
+		:return: Remapped dict
+		:rtype: dict
+		"""
+		return {self.remap_name(k): v for k, v in data.items()}
+
+	def remap_data(self, data, fields):
+		"""
+		Remap all node references in a data dict in a single pass and return a
+		new dict. Fields map a data key to the key holding the node name when the
+		value is a list of dicts, or None when the value is a (nested) list of
+		names or a single name.
+
+		:param dict data:
+		:param dict fields: {data_key: dict_key/None}
+		:return: Remapped data
+		:rtype: dict
+		"""
+		new_data = dict(data)
+
+		for field, key in fields.items():
+			value = new_data.get(field)
+			if not value:
+				continue
+
+			if isinstance(value, string_types):
+				new_data[field] = self.remap_name(value)
+			elif key:
+				new_data[field] = self.remap_dicts(value, key=key)
+			else:
+				new_data[field] = self.remap_list(value)
+
+		return new_data
+
+	def get_report(self):
+		"""
+		:return: (search, replace, count) of every rule that fired
+		:rtype: list
+		"""
+		report = []
+		for search, replace in self.rules:
+			if self.fired.get(search) and search not in [r[0] for r in report]:
+				report.append((search, replace, self.fired.get(search)))
+
+		return report
+
+	def log_report(self):
+		"""
+		Log the rules that fired.
+		"""
+		for search, replace, count in self.get_report():
+			log.info("Remapped '{}' -> '{}' {} time(s)".format(search, replace, count))
+
+
+def get_remapper(remap):
+	"""
+	:param list/dict/Remapper remap:
+	:return: Compiled remapper, the input when it already is one
+	:rtype: Remapper
+	"""
+	return remap if isinstance(remap, Remapper) else Remapper(remap)
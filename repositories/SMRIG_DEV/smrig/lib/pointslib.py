@@ -0,0 +1,68 @@
+"""
+Pure python helpers for point buffers. Nothing in here touches the scene.
+
+Points can be passed as a flat sequence of floats (x0, y0, z0, x1, ...) or as
+a sequence of [x, y, z] points. numpy is used when available.
+"""
+import array
+import itertools
+import logging
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+log = logging.getLogger("smrig.lib.pointslib")
+
+
+def as_flat_array(points):
+	"""
+	:param list/tuple/array points: flat or nested points
+	:return: flat float array
+	:rtype: array.array/numpy.ndarray
+	"""
+	if numpy is not None:
+		return numpy.asarray(points, dtype=numpy.float64).reshape(-1)
+
+	if len(points) and isinstance(points[0], (list, tuple)):
+		points = itertools.chain.from_iterable(points)
+
+	return array.array("d", points)
+
+
+def get_deltas(old_points, new_points, epsilon=0.0):
+	"""
+	Get the per vertex difference between two point buffers. Deltas whose
+	components are all within epsilon are set to zero. When the buffers differ
+	in length the extra points are ignored.
+
+	:param list/tuple/array old_points: flat or nested points
+	:param list/tuple/array new_points: flat or nested points
+	:param float epsilon: largest component of a delta that is considered unchanged
+	:return: [[x, y, z]] deltas, indices of the changed vertices
+	:rtype: tuple(list, list)
+	"""
+	old_points = as_flat_array(old_points)
+	new_points = as_flat_array(new_points)
+	count = min(len(old_points), len(new_points)) // 3
+
+	if numpy is not None:
+		deltas = new_points[:count * 3].reshape(-1, 3) - old_points[:count * 3].reshape(-1, 3)
+		changed = (numpy.abs(deltas) > epsilon).any(axis=1)
+		deltas[~changed] = 0.0
+		return deltas.tolist(), numpy.flatnonzero(changed).tolist()
+
+	deltas = []
+	changed = []
+	for i in range(count):
+		delta = [new_points[i * 3 + j] - old_points[i * 3 + j] for j in range(3)]
+
+		if abs(delta[0]) > epsilon or abs(delta[1]) > epsilon or abs(delta[2]) > epsilon:
+			changed.append(i)
+		else:
+			delta = [0.0, 0.0, 0.0]
+
+		deltas.append(delta)
+
+	return deltas, changed
@@ -1,3 +1,4 @@
+import contextlib
 import logging
 
 import maya.OpenMaya as om
@@ -9,6 +10,9 @@ from smrig.lib import utilslib
 
 log = logging.getLogger("smrig.lib.selectionlib")
 
+HIERARCHY_SESSION = {"active": False, "index": None}
+COMPONENT_ORDERS = {}
+
 
 def extend_with_shapes(selection, ignore_intermediate=True, full_path=True):
 	"""
@@ -87,18 +91,190 @@ def exclude_type(selection, types=None):
 # ----------------------------------------------------------------------------
 
 
+class HierarchyIndex(object):
+	"""
+	Index of the dag nodes below a set of roots. Every sub-hierarchy is listed
+	with two ls queries and every long name is mapped to its root, depth first
+	order, depth, node type and whether it is a transform. Sorting or filtering
+	nodes afterwards only does dictionary lookups.
+
+	USAGE:
+		index = HierarchyIndex()
+		index.add(["|root_GRP|joints_GRP"])
+		index.get("|root_GRP|joints_GRP|C_hip_JNT").get("depth")
+	"""
+
+	def __init__(self):
+		self.roots = []
+		self.nodes = {}
+		self.assemblies = []
+
+	@staticmethod
+	def get_root(long_name, assemblies=False):
+		"""
+		:param str long_name:
+		:param bool assemblies: return the top node of the long name
+		:return: root of a long name
+		:rtype: str
+		"""
+		return "|" + long_name.split("|")[1] if assemblies else long_name
+
+	def get_covering_root(self, long_name):
+		"""
+		:param str long_name:
+		:return: indexed root the long name is part of, None if not indexed
+		:rtype: str/None
+		"""
+		for root in self.roots:
+			if long_name == root or long_name.startswith(root + "|"):
+				return root
+
+	def list_root(self, root):
+		"""
+		List the sub-hierarchy of a root, indexed roots below it are replaced.
+
+		:param str root: long name
+		"""
+		for sub_root in [r for r in self.roots if r == root or r.startswith(root + "|")]:
+			self.roots.remove(sub_root)
+			for long_name in [n for n, e in self.nodes.items() if e.get("root") == sub_root]:
+				self.nodes.pop(long_name)
+
+		names_and_types = cmds.ls(root, dag=True, long=True, showType=True) or []
+		transforms = set(cmds.ls(root, dag=True, long=True, type="transform") or [])
+
+		for order, i in enumerate(range(0, len(names_and_types), 2)):
+			long_name = names_and_types[i]
+			self.nodes[long_name] = {
+				"root": root,
+				"order": order,
+				"depth": long_name.count("|"),
+				"type": names_and_types[i + 1],
+				"transform": long_name in transforms
+			}
+
+		self.roots.append(root)
+
+	def add(self, long_names, assemblies=False):
+		"""
+		Index the sub-hierarchies of the long names, names that are not dag
+		paths are ignored. Roots that are already indexed are only listed again
+		when one of the long names is missing.
+
+		:param list long_names:
+		:param bool assemblies: index the entire hierarchy of the top nodes
+		"""
+		for long_name in long_names:
+			if not long_name.startswith("|"):
+				continue
+
+			entry = self.nodes.get(long_name)
+			if entry and (not assemblies or entry.get("root").count("|") == 1):
+				continue
+
+			root = self.get_covering_root(long_name)
+			if assemblies or root is None:
+				root = self.get_root(long_name, assemblies)
+
+			self.list_root(root)
+
+		if assemblies and [r for r in self.roots if r.count("|") == 1 and r not in self.assemblies]:
+			self.assemblies = cmds.ls(assemblies=True, long=True) or []
+
+	def get(self, long_name):
+		"""
+		:param str long_name:
+		:return: index entry, None if the node is not indexed
+		:rtype: dict/None
+		"""
+		return self.nodes.get(long_name)
+
+	def get_sort_key(self, long_name):
+		"""
+		The sort key of a node indexed with its top node, nodes are ordered by
+		top node and then depth first. Nodes that are not indexed are sorted
+		last.
+
+		:param str long_name:
+		:return: sort key
+		:rtype: tuple
+		"""
+		entry = self.nodes.get(long_name)
+		root = entry.get("root") if entry else None
+
+		if root not in self.assemblies:
+			return len(self.assemblies), 0
+
+		return self.assemblies.index(root), entry.get("order")
+
+
+def get_hierarchy_index(long_names, assemblies=False):
+	"""
+	Get a hierarchy index of the long names. Inside a hierarchy session the
+	index is shared between calls, outside a session a new index is built.
+
+	:param list long_names:
+	:param bool assemblies: index the entire hierarchy of the top nodes
+	:return: hierarchy index
+	:rtype: HierarchyIndex
+	"""
+	index = HIERARCHY_SESSION.get("index") if HIERARCHY_SESSION.get("active") else None
+
+	if index is None:
+		index = HierarchyIndex()
+		if HIERARCHY_SESSION.get("active"):
+			HIERARCHY_SESSION["index"] = index
+
+	index.add(long_names, assemblies=assemblies)
+	return index
+
+
+def invalidate_hierarchy_index():
+	"""
+	Drop the hierarchy index of the session, call this after reparenting or
+	deleting nodes inside a hierarchy session. New nodes are picked up
+	without invalidating.
+	"""
+	HIERARCHY_SESSION["index"] = None
+
+
+@contextlib.contextmanager
+def hierarchy_session():
+	"""
+	Share a hierarchy index between the hierarchy queries, every involved
+	sub-hierarchy is listed once for the whole session.
+
+	USAGE:
+		with selectionlib.hierarchy_session():
+			for file_path in file_paths:
+				import_skin(file_path)
+	"""
+	if HIERARCHY_SESSION.get("active"):
+		yield
+		return
+
+	HIERARCHY_SESSION["active"] = True
+	try:
+		yield
+
+	finally:
+		HIERARCHY_SESSION["active"] = False
+		HIERARCHY_SESSION["index"] = None
+
+
 def sort_by_hierarchy(selection):
 	"""
+	Sort the selection in scene order, parents before their children.
+
 	:param selection:
 	:return: Ordered selection
 	:rtype: list
 	"""
-	# TODO: find quicker way to sort?
-	nodes = cmds.ls(l=True)
-	selection = selection[:]
-	selection.sort(key=lambda x: nodes.index(nodepathlib.get_long_name(x)))
+	long_names = [nodepathlib.get_long_name(node) for node in selection]
+	index = get_hierarchy_index(long_names, assemblies=True)
+	keys = dict((long_name, index.get_sort_key(long_name)) for long_name in long_names)
 
-	return selection
+	return [node for _, node in sorted(zip(long_names, selection), key=lambda x: keys.get(x[0]))]
 
 
 # ----------------------------------------------------------------------------
@@ -108,7 +284,8 @@ def get_parents(node, num=-1, full_path=False):
 	"""
 	Get the number of parent provided from the node returned as a list.
 	If the number is higher than the amount of parents it will return
-	all parents and not error.
+	all parents and not error. The parents are read from the long names, the
+	scene is only queried to get the long and partial names.
 
 	:param str node:
 	:param int num: number of parents, if num is -1 all parents will be returned.
@@ -116,19 +293,27 @@ def get_parents(node, num=-1, full_path=False):
 	:return: Parents
 	:rtype: list
 	"""
-	num = num if num > 0 else len(nodepathlib.get_long_name(node).split('|'))
+	long_names = cmds.ls(node, long=True) or []
+	num = num if num > 0 else max([n.count("|") for n in long_names] or [0])
 
-	parent = node
 	parents = []
-
 	for i in range(num):
-		parent = cmds.listRelatives(parent, parent=True, fullPath=full_path)
-		if not parent:
-			return parents
+		level = []
+		for long_name in long_names:
+			parent = long_name.rsplit("|", 1)[0]
+			if parent and parent not in level:
+				level.append(parent)
+
+		if not level:
+			break
 
-		parents.extend(parent)
+		parents.extend(level)
+		long_names = level
 
-	return parents
+	if full_path or not parents:
+		return parents
+
+	return cmds.ls(parents)
 
 
 def get_parent(node, full_path=False):
@@ -219,14 +404,34 @@ def get_children(
 		fullPath=full_path
 	) or []
 
-	if ignore_shapes:
-		shapes = get_shapes(children, ignore_intermediate=ignore_intermediate, full_path=full_path)
-		children = [child for child in children if child not in shapes]
+	if not children or not (ignore_shapes or types):
+		return children
 
-	if types:
-		children = filter_by_type(children, types=types)
+	# filter children using the hierarchy index of the selection
+	long_children = children if full_path else cmds.listRelatives(
+		selection,
+		children=True,
+		allDescendents=all_descendents,
+		noIntermediate=ignore_intermediate,
+		fullPath=True
+	) or []
+
+	index = get_hierarchy_index(cmds.ls(selection, long=True) + long_children)
+	types = set(nodepathlib.get_derived_node_types(types)) if types else None
+
+	filtered = []
+	for child, long_child in zip(children, long_children):
+		entry = index.get(long_child) or {}
+
+		if ignore_shapes and not entry.get("transform"):
+			continue
 
-	return children
+		if types and entry.get("type") not in types:
+			continue
+
+		filtered.append(child)
+
+	return filtered
 
 
 # ----------------------------------------------------------------------------
@@ -361,13 +566,152 @@ def select_mirrored_nodes(selection=None, add=False):
 	cmds.select(cmds.ls([naminglib.conversion.mirror_name(n) or '' for n in selection]), add=add)
 
 
+def get_component_dimensions(dag_path):
+	"""
+	Get the component dimensions of a shape: the vertex or cv count of meshes
+	and curves, the cvs in u and v of surfaces and the s, t and u divisions of
+	lattices.
+
+	:param om.MDagPath dag_path: shape
+	:return: dimensions, None for unsupported shapes
+	:rtype: tuple/None
+	"""
+	name = dag_path.fullPathName()
+	node_type = cmds.nodeType(name)
+
+	if node_type == "mesh":
+		return (om.MFnMesh(dag_path).numVertices(),)
+
+	elif node_type == "nurbsCurve":
+		return (om.MFnNurbsCurve(dag_path).numCVs(),)
+
+	elif node_type == "nurbsSurface":
+		fn_surface = om.MFnNurbsSurface(dag_path)
+		return (fn_surface.numCVsInU(), fn_surface.numCVsInV())
+
+	elif node_type == "lattice":
+		return tuple(cmds.getAttr("{}.{}Divisions".format(name, a)) for a in "stu")
+
+
+def get_component_fn(component, node_type):
+	"""
+	:param om.MObject component:
+	:param str node_type: mesh, nurbsCurve, nurbsSurface or lattice
+	:return: single, double or triple indexed component function set
+	:rtype: om.MFnComponent
+	"""
+	if node_type == "nurbsSurface":
+		return om.MFnDoubleIndexedComponent(component)
+
+	elif node_type == "lattice":
+		return om.MFnTripleIndexedComponent(component)
+
+	return om.MFnSingleIndexedComponent(component)
+
+
+def get_component_elements(component, node_type):
+	"""
+	Get the indices of the elements of a component in a single query, in the
+	order maya iterates them.
+
+	:param om.MObject component:
+	:param str node_type: mesh, nurbsCurve, nurbsSurface or lattice
+	:return: index tuple per element
+	:rtype: list
+	"""
+	elements = [om.MIntArray() for _ in range({"nurbsSurface": 2, "lattice": 3}.get(node_type, 1))]
+	get_component_fn(component, node_type).getElements(*elements)
+
+	return list(zip(*elements))
+
+
+def get_complete_component(node_type, dimensions):
+	"""
+	:param str node_type: mesh, nurbsCurve, nurbsSurface or lattice
+	:param tuple dimensions: see :func:`get_component_dimensions`
+	:return: component holding every element of a shape
+	:rtype: om.MObject
+	"""
+	if node_type == "nurbsSurface":
+		comp_fn = om.MFnDoubleIndexedComponent()
+		component = comp_fn.create(om.MFn.kSurfaceCVComponent)
+
+	elif node_type == "lattice":
+		comp_fn = om.MFnTripleIndexedComponent()
+		component = comp_fn.create(om.MFn.kLatticeComponent)
+
+	else:
+		comp_fn = om.MFnSingleIndexedComponent()
+		component = comp_fn.create(om.MFn.kMeshVertComponent if node_type == "mesh" else om.MFn.kCurveCVComponent)
+
+	comp_fn.setCompleteData(*dimensions)
+	return component
+
+
+def get_component_order(dag_path):
+	"""
+	Get the position of every element in the flattened component list of a
+	surface or lattice. The order is read from a complete component so it
+	matches the order maya iterates the components in. Orders are cached per
+	shape and rebuilt when the dimensions of the shape changed.
+
+	:param om.MDagPath dag_path: shape
+	:return: {index tuple: flat index}, None for single indexed or unsupported shapes
+	:rtype: dict/None
+	"""
+	name = dag_path.fullPathName()
+	dimensions = get_component_dimensions(dag_path)
+
+	if not dimensions or len(dimensions) == 1:
+		return
+
+	cached = COMPONENT_ORDERS.get(name)
+	if cached and cached[0] == dimensions:
+		return cached[1]
+
+	node_type = cmds.nodeType(name)
+	elements = get_component_elements(get_complete_component(node_type, dimensions), node_type)
+	order = dict((element, i) for i, element in enumerate(elements))
+
+	COMPONENT_ORDERS[name] = (dimensions, order)
+	return order
+
+
+def clear_component_orders():
+	"""
+	Clear the cached component orders.
+	"""
+	COMPONENT_ORDERS.clear()
+
+
+def get_flat_indices(elements, order=None):
+	"""
+	Convert single, double or triple component indices to the index of the
+	component in the flattened component list.
+
+	:param list elements: index tuple per element, see :func:`get_component_elements`
+	:param dict order: see :func:`get_component_order`, single indices are used as they are when None
+	:return: flat indices, None for elements outside of the order
+	:rtype: list
+	"""
+	if order is None:
+		return [element[0] for element in elements]
+
+	return [order.get(element) for element in elements]
+
+
 def get_soft_selection_weights():
 	"""
-	Get the weight value for the current soft selection.
+	Get the weight value for the current soft selection. The component
+	indices are converted to flat indices in the order maya iterates the
+	components, see :func:`get_component_order`. The weights are returned per
+	shape as a dense list and as a sparse list of the soft selected
+	components.
 
-	:return:
+	:return: {"weights": {shape: weights}, "sparse": {shape: (indices, weights)}, "counts": {shape: count}}
+	:rtype: dict
 	"""
-	soft_weights = {"weights": {}}
+	soft_weights = {"weights": {}, "sparse": {}, "counts": {}}
 
 	try:
 		rich_sel = om.MRichSelection()
@@ -388,46 +732,19 @@ def get_soft_selection_weights():
 		name = cmds.ls(shape_dag_path.fullPathName())[0]
 		ntype = cmds.nodeType(name)
 
-		weight_array = None
-
-		if ntype in ["nurbsCurve", "mesh"]:
-			cmpt_count = cmds.polyEvaluate(name, v=1) if ntype == "mesh" else len(cmds.ls(name + ".cv[*]", fl=1))
-			weight_array = om.MFloatArray(cmpt_count, 0.0)
-			comp_fn = om.MFnSingleIndexedComponent(shape_comp)
-
-			# get weight value from each soft selected cmpt
-			for i in range(comp_fn.elementCount()):
-				vert_id = comp_fn.element(i)
-				weight = comp_fn.weight(i).influence()
-				weight_array[int(vert_id)] = weight
-
-		elif ntype == "nurbsSurface":
-			cmpt_sel = [c.split(".")[-1] for c in cmds.ls(name + ".cv[*]", fl=1)]
-			weight_array = om.MFloatArray(len(cmpt_sel), 0.0)
+		indices = []
+		weights = []
+		cmpt_count = 0
 
-			u_list = om.MIntArray()
-			v_list = om.MIntArray()
-			comp_fn = om.MFnDoubleIndexedComponent(shape_comp)
-			comp_fn.getElements(u_list, v_list)
+		if ntype in ["nurbsCurve", "mesh", "nurbsSurface", "lattice"]:
+			cmpt_count = 1
+			for dimension in get_component_dimensions(shape_dag_path):
+				cmpt_count *= dimension
 
-			# get weight value from each soft selected cmpt
-			for i in range(comp_fn.elementCount()):
-				weight = comp_fn.weight(i).influence()
-				weight_array[cmpt_sel.index("cv[{0}][{1}]".format(u_list[i], v_list[i]))] = weight
-
-		elif ntype == "lattice":
-			cmpt_sel = [c.split(".")[-1] for c in cmds.ls(name + ".pt[*]", fl=1)]
-			weight_array = om.MFloatArray(len(cmpt_sel), 0.0)
-
-			u_list = om.MIntArray()
-			v_list = om.MIntArray()
-			w_list = om.MIntArray()
-			comp_fn = om.MFnTripleIndexedComponent(shape_comp)
-			comp_fn.getElements(u_list, v_list, w_list)
-
-			for i in range(comp_fn.elementCount()):
-				weight = comp_fn.weight(i).influence()
-				weight_array[cmpt_sel.index("pt[{0}][{1}][{2}]".format(u_list[i], v_list[i], w_list[i]))] = weight
+			comp_fn = get_component_fn(shape_comp, ntype)
+			elements = get_component_elements(shape_comp, ntype)
+			indices = get_flat_indices(elements, get_component_order(shape_dag_path))
+			weights = [comp_fn.weight(i).influence() for i in range(comp_fn.elementCount())]
 
 		elif ntype == "transform":
 			shape = get_shapes(name)
@@ -436,14 +753,29 @@ def get_soft_selection_weights():
 			if not shape:
 				continue
 
-			cmpt_count = cmds.polyEvaluate(name, v=1) if cmds.nodeType(shape) == "mesh" \
-				else len(cmds.ls("{}.cv[*]".format(name), "{}.pt[*]".format(name), fl=1))
+			shape_dag_path = om.MDagPath()
+			shape_list = om.MSelectionList()
+			shape_list.add(shape)
+			shape_list.getDagPath(0, shape_dag_path)
 
-			if cmpt_count:
-				weight_array = om.MFloatArray(cmpt_count, 1.0)
+			cmpt_count = 1
+			for dimension in get_component_dimensions(shape_dag_path) or [0]:
+				cmpt_count *= dimension
+
+			indices = list(range(cmpt_count))
+			weights = [1.0] * cmpt_count
 
 		name = get_shapes(name, full_path=False)
-		if name and weight_array:
-			soft_weights["weights"][name[0]] = weight_array
+		if not name or not cmpt_count:
+			continue
+
+		sparse = [(i, w) for i, w in zip(indices, weights) if i is not None and w]
+		weight_array = [0.0] * cmpt_count
+		for i, weight in sparse:
+			weight_array[i] = weight
+
+		soft_weights["weights"][name[0]] = weight_array
+		soft_weights["sparse"][name[0]] = ([i for i, _ in sparse], [w for _, w in sparse])
+		soft_weights["counts"][name[0]] = cmpt_count
 
 	return soft_weights
@@ -0,0 +1,568 @@
+"""
+Pure python weight transfer between meshes. Nothing in here touches the scene,
+the source and target meshes are described by the mesh data dicts exported by
+:func:`smrig.dataioo.topology.get_mesh_data`::
+
+	{
+		"points": [[x, y, z], ...],
+		"poly_count": [4, 4, ...],
+		"poly_connects": [0, 1, 2, 3, ...],
+		"uvs": [[u, ...], [v, ...]],
+		"uv_counts": [4, 4, ...],
+		"uv_ids": [0, 1, 2, 3, ...]
+	}
+
+A transfer map stores for every target vertex the source vertices it samples
+from and their barycentric weights. The map is built once and can then be used
+to interpolate any per vertex values (skin weights, deformer weights, ...).
+
+USAGE:
+	transfer_map = get_transfer_map(source_mesh_data, target_mesh_data, method="closest")
+	weights = interpolate(source_weights, transfer_map, width=influence_count)
+"""
+import array
+import heapq
+import logging
+import operator
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+log = logging.getLogger("smrig.lib.transferlib")
+
+
+class KDTree(object):
+	"""
+	k-d tree for nearest neighbour queries on points of any dimension.
+
+	USAGE:
+		tree = KDTree([(0, 0, 0), (1, 0, 0), (0, 1, 0)])
+		tree.query((0.9, 0.1, 0.0), k=1)  # [(0.02, 1)]
+	"""
+
+	def __init__(self, points, leaf_size=8):
+		"""
+		:param list points: points of equal dimension
+		:param int leaf_size: maximum number of points stored in a leaf
+		"""
+		self.points = [tuple(p) for p in points]
+		self.dimension = len(self.points[0]) if self.points else 0
+		self.leaf_size = max(1, leaf_size)
+		self.root = self._build(list(range(len(self.points)))) if self.points else None
+
+	def __len__(self):
+		return len(self.points)
+
+	def _build(self, indices):
+		"""
+		Split the points on the axis with the largest extent until the leaves
+		hold no more than leaf size points.
+
+		:param list indices:
+		:return: node, (None, indices) for leaves or (axis, split, left, right)
+		:rtype: tuple
+		"""
+		if len(indices) <= self.leaf_size:
+			return None, indices
+
+		points = self.points
+		extents = []
+		for axis in range(self.dimension):
+			values = [points[i][axis] for i in indices]
+			extents.append(max(values) - min(values))
+
+		axis = extents.index(max(extents))
+		if not extents[axis]:
+			return None, indices
+
+		indices = sorted(indices, key=lambda i: points[i][axis])
+		median = len(indices) // 2
+
+		return axis, points[indices[median]][axis], self._build(indices[:median]), self._build(indices[median:])
+
+	def query(self, point, k=1):
+		"""
+		Find the k points closest to a point.
+
+		:param list/tuple point:
+		:param int k:
+		:return: (squared distance, index) pairs sorted by distance
+		:rtype: list
+		"""
+		if self.root is None:
+			return []
+
+		points = self.points
+		heap = []
+		stack = [(self.root, 0.0)]
+
+		while stack:
+			node, min_distance = stack.pop()
+			if len(heap) == k and min_distance >= -heap[0][0]:
+				continue
+
+			if node[0] is None:
+				for i in node[1]:
+					distance = get_squared_distance(point, points[i])
+
+					if len(heap) < k:
+						heapq.heappush(heap, (-distance, i))
+					elif distance < -heap[0][0]:
+						heapq.heapreplace(heap, (-distance, i))
+
+				continue
+
+			axis, split, left, right = node
+			diff = point[axis] - split
+			near, far = (left, right) if diff < 0 else (right, left)
+
+			# visit the near side first, the far side only when it can hold closer points
+			stack.append((far, max(min_distance, diff * diff)))
+			stack.append((near, min_distance))
+
+		return sorted((-d, i) for d, i in heap)
+
+
+class TriangleMesh(object):
+	"""
+	Triangles with a bounding volume hierarchy for closest point queries. The
+	nodes of the hierarchy are visited closest bounding box first and a node is
+	skipped once its box is farther away than the closest triangle found, so
+	the result is the exact closest triangle.
+
+	USAGE:
+		mesh = TriangleMesh([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [(0, 1, 2)])
+		mesh.closest((0.2, 0.2, 1.0))  # ((0, 1, 2), (0.6, 0.2, 0.2))
+	"""
+
+	def __init__(self, points, triangles, leaf_size=8):
+		"""
+		:param list points: points of equal dimension
+		:param list triangles: (i0, i1, i2) vertex indices
+		:param int leaf_size: maximum number of triangles stored in a leaf
+		"""
+		self.points = [tuple(p) for p in points]
+		self.triangles = [tuple(t) for t in triangles]
+		self.leaf_size = max(1, leaf_size)
+
+		self.bounds = []
+		self.centers = []
+		for triangle in self.triangles:
+			corners = [self.points[i] for i in triangle]
+			lower = tuple(min(values) for values in zip(*corners))
+			upper = tuple(max(values) for values in zip(*corners))
+
+			self.bounds.append((lower, upper))
+			self.centers.append(tuple((a + b) * 0.5 for a, b in zip(lower, upper)))
+
+		self.root = self._build(list(range(len(self.triangles)))) if self.triangles else None
+
+	def __len__(self):
+		return len(self.triangles)
+
+	def _build(self, indices):
+		"""
+		Split the triangles by their bounding box centers on the axis with the
+		largest extent until the leaves hold no more than leaf size triangles.
+
+		:param list indices:
+		:return: node, (lower, upper, None, indices) for leaves or (lower, upper, left, right)
+		:rtype: tuple
+		"""
+		bounds = [self.bounds[i] for i in indices]
+		lower = tuple(min(values) for values in zip(*[b[0] for b in bounds]))
+		upper = tuple(max(values) for values in zip(*[b[1] for b in bounds]))
+
+		if len(indices) <= self.leaf_size:
+			return lower, upper, None, indices
+
+		centers = self.centers
+		extents = []
+		for axis in range(len(lower)):
+			values = [centers[i][axis] for i in indices]
+			extents.append(max(values) - min(values))
+
+		axis = extents.index(max(extents))
+		if not extents[axis]:
+			return lower, upper, None, indices
+
+		indices = sorted(indices, key=lambda i: centers[i][axis])
+		median = len(indices) // 2
+
+		return lower, upper, self._build(indices[:median]), self._build(indices[median:])
+
+	def closest(self, point):
+		"""
+		:param list/tuple point:
+		:return: vertex indices and barycentric weights of the closest point
+		:rtype: tuple
+		"""
+		if self.root is None:
+			return (), ()
+
+		points = self.points
+		result = None
+		count = 0
+		heap = [(get_box_distance(point, self.root[0], self.root[1]), count, self.root)]
+
+		while heap:
+			distance, _, node = heapq.heappop(heap)
+			if result is not None and distance >= result[0]:
+				break
+
+			if node[2] is None:
+				for t in node[3]:
+					i0, i1, i2 = self.triangles[t]
+					distance, weights = closest_point_on_triangle(point, points[i0], points[i1], points[i2])
+
+					if result is None or distance < result[0]:
+						result = (distance, (i0, i1, i2), weights)
+
+				continue
+
+			for child in node[2:]:
+				count += 1
+				heapq.heappush(heap, (get_box_distance(point, child[0], child[1]), count, child))
+
+		return result[1], result[2]
+
+
+def get_transfer_map(source, target, method="closest"):
+	"""
+	Map every target vertex onto the source mesh, either by closest point on
+	the source surface or by its position in uv space. Target vertices without
+	uvs fall back to closest point. The points of both meshes are used as they
+	are, they must be in the same space.
+
+	Every query walks the triangle hierarchy in python, expect a few seconds
+	per ten thousand target vertices on dense source meshes. Maps are meant to
+	be built once and reused for every deformer (see
+	:func:`smrig.dataioo.tools.transfer_session`).
+
+	:param dict source: source mesh data
+	:param dict target: target mesh data
+	:param str method: "closest" or "uvs"
+	:return: (vertex indices, barycentric weights) per target vertex
+	:rtype: list
+	"""
+	target_points = target.get("points")
+	triangles = triangulate(source.get("poly_count") or [], source.get("poly_connects") or [])
+
+	closest_mesh = None
+	transfer_map = [None] * len(target_points)
+
+	if method in ["uv", "uvs"]:
+		uv_points, uv_triangles, uv_vertices = get_uv_triangles(source)
+		target_uvs = get_vertex_uvs(target)
+
+		if uv_triangles and any(uv is not None for uv in target_uvs):
+			uv_mesh = TriangleMesh(uv_points, uv_triangles)
+
+			for t, uv in enumerate(target_uvs):
+				if uv is not None:
+					indices, weights = uv_mesh.closest(uv)
+					transfer_map[t] = (tuple(uv_vertices[i] for i in indices), weights)
+
+		else:
+			log.warning("Cannot map in uv space: uvs not found, using closest point.")
+
+	for t, point in enumerate(target_points):
+		if transfer_map[t] is None:
+			closest_mesh = closest_mesh or TriangleMesh(source.get("points"), triangles)
+			transfer_map[t] = closest_mesh.closest(point)
+
+	return transfer_map
+
+
+def interpolate(values, transfer_map, width=1):
+	"""
+	Interpolate per vertex values of the source onto the target.
+
+	:param list values: flat, vertex major source values
+	:param list transfer_map: see :func:`get_transfer_map`
+	:param int width: number of values per vertex (ie. influence count)
+	:return: flat, vertex major target values
+	:rtype: list
+	"""
+	numpy_values = as_numpy(values) if numpy else None
+	if numpy is not None and numpy_values is None:
+		numpy_values = numpy.asarray(as_list(values), dtype=float)
+
+	if numpy_values is not None and transfer_map:
+		indices = numpy.zeros((len(transfer_map), 3), dtype=int)
+		weights = numpy.zeros((len(transfer_map), 3), dtype=float)
+
+		for t, (i, w) in enumerate(transfer_map):
+			indices[t, :len(i)] = i
+			weights[t, :len(w)] = w
+
+		numpy_values = numpy_values.reshape(-1, width)
+		result = sum(numpy_values[indices[:, j]] * weights[:, j, None] for j in range(3))
+		return result.ravel().tolist()
+
+	values = as_list(values)
+	result = [0.0] * (len(transfer_map) * width)
+
+	for t, (indices, weights) in enumerate(transfer_map):
+		base = t * width
+
+		for i, w in zip(indices, weights):
+			if not w:
+				continue
+
+			source = values[i * width:(i + 1) * width]
+			for c in range(width):
+				result[base + c] += source[c] * w
+
+	return result
+
+
+def interpolate_sparse(sparse, transfer_map):
+	"""
+	Interpolate sparse (csr) weights onto the target, only the stored non zero
+	weights are visited.
+
+	:param dict sparse: see :mod:`smrig.lib.weightslib`
+	:param list transfer_map: see :func:`get_transfer_map`
+	:return: flat, vertex major target weights
+	:rtype: list
+	"""
+	width = sparse.get("influence_count")
+	offsets = sparse.get("offsets")
+	influences = sparse.get("indices")
+	values = sparse.get("values")
+
+	result = [0.0] * (len(transfer_map) * width)
+
+	for t, (indices, weights) in enumerate(transfer_map):
+		base = t * width
+
+		for i, w in zip(indices, weights):
+			if not w:
+				continue
+
+			for j in range(offsets[i], offsets[i + 1]):
+				result[base + influences[j]] += values[j] * w
+
+	return result
+
+
+# Helper functions --------------------------------------------------------------------
+
+
+def as_list(values):
+	"""
+	Convert a sequence of numbers into a python list, same as
+	:func:`smrig.lib.weightslib.as_list` which isn't imported so this module
+	can be used without maya.
+
+	:param list/tuple/array/memoryview values:
+	:return: values
+	:rtype: list
+	"""
+	if isinstance(values, list):
+		return values
+
+	tolist = getattr(values, "tolist", None)
+	return tolist() if tolist else list(values)
+
+
+def as_numpy(values):
+	"""
+	Wrap the values in a numpy array without copying when numpy is available
+	and the values support the buffer protocol, same as
+	:func:`smrig.lib.weightslib.as_numpy`.
+
+	:param values:
+	:return: numpy array or None
+	"""
+	if numpy is None:
+		return
+
+	if isinstance(values, numpy.ndarray):
+		return values
+
+	if isinstance(values, (array.array, memoryview)):
+		return numpy.frombuffer(values, dtype=values.typecode if isinstance(values, array.array) else values.format)
+
+
+def get_box_distance(point, lower, upper):
+	"""
+	:param list/tuple point:
+	:param tuple lower: minimum corner of the box
+	:param tuple upper: maximum corner of the box
+	:return: squared distance between a point and a box, 0 inside the box
+	:rtype: float
+	"""
+	distance = 0.0
+	for x, a, b in zip(point, lower, upper):
+		if x < a:
+			distance += (a - x) * (a - x)
+		elif x > b:
+			distance += (x - b) * (x - b)
+
+	return distance
+
+
+def get_squared_distance(a, b):
+	"""
+	:param list/tuple a:
+	:param list/tuple b:
+	:return: squared distance between two points
+	:rtype: float
+	"""
+	return sum((x - y) * (x - y) for x, y in zip(a, b))
+
+
+def closest_point_on_triangle(p, a, b, c):
+	"""
+	Get the closest point on a triangle as barycentric weights, works for 2D
+	and 3D points. Degenerate triangles return the closest of their corners.
+
+	:param list/tuple p:
+	:param list/tuple a:
+	:param list/tuple b:
+	:param list/tuple c:
+	:return: squared distance, barycentric weights of a, b and c
+	:rtype: tuple
+	"""
+	ab = list(map(operator.sub, b, a))
+	ac = list(map(operator.sub, c, a))
+	ap = list(map(operator.sub, p, a))
+	bp = list(map(operator.sub, p, b))
+	cp = list(map(operator.sub, p, c))
+
+	d1, d2 = sum(map(operator.mul, ab, ap)), sum(map(operator.mul, ac, ap))
+	d3, d4 = sum(map(operator.mul, ab, bp)), sum(map(operator.mul, ac, bp))
+	d5, d6 = sum(map(operator.mul, ab, cp)), sum(map(operator.mul, ac, cp))
+
+	va = d3 * d6 - d5 * d4
+	vb = d5 * d2 - d1 * d6
+	vc = d1 * d4 - d3 * d2
+
+	if d1 <= 0 and d2 <= 0:
+		weights = (1.0, 0.0, 0.0)
+
+	elif d3 >= 0 and d4 <= d3:
+		weights = (0.0, 1.0, 0.0)
+
+	elif vc <= 0 and d1 >= 0 and d3 <= 0 and d1 != d3:
+		v = d1 / float(d1 - d3)
+		weights = (1.0 - v, v, 0.0)
+
+	elif d6 >= 0 and d5 <= d6:
+		weights = (0.0, 0.0, 1.0)
+
+	elif vb <= 0 and d2 >= 0 and d6 <= 0 and d2 != d6:
+		w = d2 / float(d2 - d6)
+		weights = (1.0 - w, 0.0, w)
+
+	elif va <= 0 and d4 - d3 >= 0 and d5 - d6 >= 0 and (d4 - d3) + (d5 - d6):
+		w = (d4 - d3) / float((d4 - d3) + (d5 - d6))
+		weights = (0.0, 1.0 - w, w)
+
+	elif va + vb + vc:
+		v = vb / float(va + vb + vc)
+		w = vc / float(va + vb + vc)
+		weights = (1.0 - v - w, v, w)
+
+	else:
+		corners = [get_squared_distance(p, x) for x in [a, b, c]]
+		weights = tuple(1.0 if i == corners.index(min(corners)) else 0.0 for i in range(3))
+
+	point = [x * weights[0] + y * weights[1] + z * weights[2] for x, y, z in zip(a, b, c)]
+	return get_squared_distance(p, point), weights
+
+
+def triangulate(poly_count, poly_connects):
+	"""
+	Fan triangulate polygons.
+
+	:param list poly_count: vertex count per polygon
+	:param list poly_connects: flat polygon vertices
+	:return: (i0, i1, i2) vertex indices
+	:rtype: list
+	"""
+	triangles = []
+	start = 0
+
+	for count in poly_count:
+		first = poly_connects[start]
+		for i in range(start + 1, start + count - 1):
+			triangles.append((first, poly_connects[i], poly_connects[i + 1]))
+
+		start += count
+
+	return triangles
+
+
+def get_uv_triangles(mesh_data):
+	"""
+	Get the triangles of a mesh in uv space, only polygons that have uvs are
+	used.
+
+	:param dict mesh_data:
+	:return: uv points, (uv0, uv1, uv2) uv indices, vertex index of every uv
+	:rtype: tuple
+	"""
+	uvs = mesh_data.get("uvs") or [[], []]
+	uv_points = list(zip(as_list(uvs[0]), as_list(uvs[1])))
+	uv_vertices = [0] * len(uv_points)
+
+	poly_connects = mesh_data.get("poly_connects") or []
+	uv_ids = mesh_data.get("uv_ids") or []
+	uv_counts = mesh_data.get("uv_counts") or []
+
+	poly_count = []
+	uv_connects = []
+	start = 0
+	uv_start = 0
+
+	for count, uv_count in zip(mesh_data.get("poly_count") or [], uv_counts):
+		if uv_count == count:
+			face_uvs = [int(i) for i in uv_ids[uv_start:uv_start + count]]
+			for uv, vertex in zip(face_uvs, poly_connects[start:start + count]):
+				uv_vertices[uv] = vertex
+
+			poly_count.append(count)
+			uv_connects.extend(face_uvs)
+
+		start += count
+		uv_start += uv_count
+
+	return uv_points, triangulate(poly_count, uv_connects), uv_vertices
+
+
+def get_vertex_uvs(mesh_data):
+	"""
+	Get the uv of every vertex, vertices on uv seams use the uv of the first
+	polygon they are part of.
+
+	:param dict mesh_data:
+	:return: (u, v) or None per vertex
+	:rtype: list
+	"""
+	uvs = mesh_data.get("uvs") or [[], []]
+	u_values = as_list(uvs[0])
+	v_values = as_list(uvs[1])
+
+	poly_connects = mesh_data.get("poly_connects") or []
+	uv_ids = mesh_data.get("uv_ids") or []
+	uv_counts = mesh_data.get("uv_counts") or []
+
+	result = [None] * len(mesh_data.get("points") or [])
+	start = 0
+	uv_start = 0
+
+	for count, uv_count in zip(mesh_data.get("poly_count") or [], uv_counts):
+		if uv_count == count:
+			for uv, vertex in zip(uv_ids[uv_start:uv_start + count], poly_connects[start:start + count]):
+				if result[vertex] is None:
+					result[vertex] = (u_values[int(uv)], v_values[int(uv)])
+
+		start += count
+		uv_start += uv_count
+
+	return result
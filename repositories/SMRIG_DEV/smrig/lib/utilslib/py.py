@@ -24,6 +24,13 @@ try:
 except:
 	pass
 
+try:
+	from importlib import util as importlib_util
+except ImportError:
+	import imp
+
+	importlib_util = None
+
 log = logging.getLogger("smrig.lib.utilslib.py")
 
 
@@ -167,6 +174,32 @@ def get_function_file_path(func):
 	return file_path if os.path.isfile(file_path) else None
 
 
+def load_source(module_name, file_path):
+	"""
+	Load a python source file as a module and register it in sys.modules,
+	replaces the deprecated imp.load_source on python 3.
+
+	:param str module_name:
+	:param str file_path:
+	:return: module
+	:rtype: module
+	"""
+	if importlib_util is None:
+		return imp.load_source(module_name, file_path)
+
+	spec = importlib_util.spec_from_file_location(module_name, file_path)
+	module = importlib_util.module_from_spec(spec)
+	sys.modules[module_name] = module
+
+	try:
+		spec.loader.exec_module(module)
+	except Exception:
+		sys.modules.pop(module_name, None)
+		raise
+
+	return module
+
+
 def is_subclass(class_, class_info):
 	"""
 	This function determines if class_ is a subclass of class_info or of the
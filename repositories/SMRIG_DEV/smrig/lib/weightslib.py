@@ -0,0 +1,207 @@
+"""
+Pure python helpers for deformer weight data. Nothing in here touches the
+scene so it can be used on exported data outside of Maya.
+
+Sparse weights are stored CSR style, per vertex the indices of the influences
+that have a weight plus the weight values::
+
+	{
+		"format": "csr",
+		"vertex_count": 3,
+		"influence_count": 4,
+		"offsets": [0, 1, 3, 4],
+		"indices": [0, 1, 3, 2],
+		"values": [1.0, 0.25, 0.75, 1.0]
+	}
+
+The weights of vertex v are found at values[offsets[v]:offsets[v + 1]].
+"""
+import array
+import logging
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+log = logging.getLogger("smrig.lib.weightslib")
+
+SPARSE_FORMAT = "csr"
+
+
+def as_list(values):
+	"""
+	Convert a sequence of numbers into a python list using the fastest path
+	available (tolist on buffers and numpy arrays).
+
+	:param list/tuple/array/memoryview values:
+	:return: values
+	:rtype: list
+	"""
+	if isinstance(values, list):
+		return values
+
+	tolist = getattr(values, "tolist", None)
+	return tolist() if tolist else list(values)
+
+
+def as_numpy(values):
+	"""
+	Wrap the values in a numpy array without copying when numpy is available
+	and the values support the buffer protocol.
+
+	:param values:
+	:return: numpy array or None
+	"""
+	if numpy is None:
+		return
+
+	if isinstance(values, numpy.ndarray):
+		return values
+
+	if isinstance(values, (array.array, memoryview)):
+		return numpy.frombuffer(values, dtype=values.typecode if isinstance(values, array.array) else values.format)
+
+
+def to_influence_major(weights, influence_count):
+	"""
+	Transpose flat, vertex major weights into a list of per influence weights
+	lists. The transpose uses strided slices (or numpy when the weights are a
+	buffer) so there is no per element python loop.
+
+	:param list/array weights: flat vertex major weights
+	:param int influence_count:
+	:return: per influence weights
+	:rtype: list
+	"""
+	numpy_weights = as_numpy(weights)
+	if numpy_weights is not None:
+		return numpy_weights.reshape(-1, influence_count).T.tolist()
+
+	return [as_list(weights[i::influence_count]) for i in range(influence_count)]
+
+
+def to_vertex_major(influence_weights):
+	"""
+	Transpose a list of per influence weights lists into flat, vertex major
+	weights using strided slice assignment.
+
+	:param list influence_weights: per influence weights, all of equal length
+	:return: flat vertex major weights
+	:rtype: list
+	:raise ValueError: When the influence weights are not of equal length.
+	"""
+	influence_count = len(influence_weights)
+	if not influence_count:
+		return []
+
+	vertex_count = len(influence_weights[0])
+	weights = [0.0] * (vertex_count * influence_count)
+
+	for i, values in enumerate(influence_weights):
+		if len(values) != vertex_count:
+			raise ValueError("Influence {} has {} weights, expected {}.".format(i, len(values), vertex_count))
+
+		weights[i::influence_count] = as_list(values)
+
+	return weights
+
+
+def is_sparse(weights):
+	"""
+	:param weights:
+	:return: True if the weights are stored in the sparse (csr) format
+	:rtype: bool
+	"""
+	return isinstance(weights, dict) and weights.get("format") == SPARSE_FORMAT
+
+
+def to_sparse(weights, influence_count, tolerance=0.0):
+	"""
+	Convert flat, vertex major weights (as returned by MFnSkinCluster.getWeights)
+	into the sparse format. Weights with an absolute value smaller or equal to
+	the tolerance are dropped.
+
+	:param list weights: flat vertex major weights
+	:param int influence_count:
+	:param float tolerance:
+	:return: sparse weights
+	:rtype: dict
+	:raise ValueError: When the weights length is not a multiple of the influence count.
+	"""
+	if not influence_count or len(weights) % influence_count:
+		raise ValueError("Weights length {} doesn't match influence count {}.".format(len(weights), influence_count))
+
+	vertex_count = len(weights) // influence_count
+
+	if tolerance:
+		flat_indices = [i for i, w in enumerate(weights) if abs(w) > tolerance]
+	else:
+		flat_indices = [i for i, w in enumerate(weights) if w]
+
+	values = [weights[i] for i in flat_indices]
+	indices = [i % influence_count for i in flat_indices]
+
+	offsets = [0] * (vertex_count + 1)
+	for i in flat_indices:
+		offsets[i // influence_count + 1] += 1
+
+	for v in range(vertex_count):
+		offsets[v + 1] += offsets[v]
+
+	return {"format": SPARSE_FORMAT,
+	        "vertex_count": vertex_count,
+	        "influence_count": influence_count,
+	        "offsets": offsets,
+	        "indices": indices,
+	        "values": values}
+
+
+def get_flat_indices(sparse, influence_map=None, influence_count=None):
+	"""
+	Get the index of every sparse value in a flat, vertex major weights array.
+	An influence map can be provided to reorder the stored influences into the
+	influence order of a different skin cluster.
+
+	:param dict sparse:
+	:param list/dict influence_map: maps stored influence index to target influence index
+	:param int influence_count: influence count of the target, defaults to the stored count
+	:return: flat indices
+	:rtype: list
+	"""
+	offsets = sparse.get("offsets")
+	indices = sparse.get("indices")
+	influence_count = influence_count or sparse.get("influence_count")
+
+	if influence_map is not None:
+		indices = [influence_map[i] for i in indices]
+
+	result = []
+	for v in range(sparse.get("vertex_count")):
+		start = offsets[v]
+		end = offsets[v + 1]
+
+		if start != end:
+			base = v * influence_count
+			result.extend([base + i for i in indices[start:end]])
+
+	return result
+
+
+def to_dense(sparse, influence_map=None, influence_count=None):
+	"""
+	Expand sparse weights into flat, vertex major weights.
+
+	:param dict sparse:
+	:param list/dict influence_map: maps stored influence index to target influence index
+	:param int influence_count: influence count of the target, defaults to the stored count
+	:return: flat weights
+	:rtype: list
+	"""
+	influence_count = influence_count or sparse.get("influence_count")
+	weights = [0.0] * (sparse.get("vertex_count") * influence_count)
+
+	for i, value in zip(get_flat_indices(sparse, influence_map, influence_count), sparse.get("values")):
+		weights[i] = value
+
+	return weights
@@ -1,5 +1,6 @@
 import os
 import logging
+import time
 import maya.cmds as cmds
 
 # Compatibility for string types in both Python 2 and Python 3
@@ -17,6 +18,7 @@ from smrig.lib import decoratorslib
 from smrig.lib import transformslib
 from smrig.lib import utilslib
 from smrig.partslib.common import basepart
+from smrig.partslib.common import scheduler
 from smrig.partslib.common import utils
 from smrig.partslib.common.manager import *
 
@@ -513,11 +515,13 @@ def delete_guide(input=None):
 # rig functions ----------------------------------------------------------------------------------------
 
 @decoratorslib.undoable
-def build_rig(part_node):
+def build_rig(part_node, cleanup=True, verbose=True):
 	"""
 	Build rig part.
 
 	:param part_type:
+	:param bool cleanup: run the scene cleanup after building
+	:param bool verbose: print the build banners
 	:return:
 	"""
 
@@ -526,56 +530,97 @@ def build_rig(part_node):
 	if cmds.objExists(part_obj.guide_group + ".skipBuild") and cmds.getAttr(part_obj.guide_group + ".skipBuild"):
 		return part_obj
 
-	print("# ---------------------------------------------------------------------------")
-	print("# Building: {}".format(part_obj))
+	if verbose:
+		print("# ---------------------------------------------------------------------------")
+		print("# Building: {}".format(part_obj))
 
 	part_obj.start_rig()
 	part_obj.build_rig()
 	part_obj.finish_rig()
 
 	# post cleanup for build
-	hide_stuff()
+	if cleanup:
+		hide_stuff()
 
-	print("# Finished building: {}".format(part_obj))
-	print("# ---------------------------------------------------------------------------\n")
+	if verbose:
+		print("# Finished building: {}".format(part_obj))
+		print("# ---------------------------------------------------------------------------\n")
 
 	return part_obj
 
 
+def get_part_description(part_node):
+	"""
+	Describe a guide part for the build scheduler.
+
+	:param str part_node: guide group
+	:return: part description, see :mod:`smrig.partslib.common.scheduler`
+	:rtype: dict
+	"""
+	part_obj = part(part_node)
+	build_last = cmds.objExists(part_node + ".buildLast") and cmds.getAttr(part_node + ".buildLast")
+
+	return {"node": part_node,
+	        "part_type": cmds.getAttr(part_node + ".partType"),
+	        "prefix": part_obj.prefix,
+	        "build_last": bool(build_last),
+	        "nodes": part_obj.guide_nodes,
+	        "options": part_obj.options}
+
+
+def get_build_order(exclude_types=None, build_last=True):
+	"""
+	Get the build order of all rig parts in scene. Parts are sorted by the
+	dependencies of their driver, rig part and selection options.
+
+	:param exclude_types:
+	:param build_last: include parts tagged to build last
+	:return: sorted part descriptions, {part node: [(dependency, option name, option value)]}
+	:rtype: tuple(list, dict)
+	"""
+	parts = [get_part_description(p) for p in utils.get_guides_in_scene()]
+	dependencies = scheduler.get_dependencies(parts)
+
+	exclude_types = utilslib.conversion.as_list(exclude_types) if exclude_types else []
+	parts = [p for p in parts if p.get("part_type") == "root" or p.get("part_type") not in exclude_types]
+	parts = [p for p in parts if build_last or not p.get("build_last") or p.get("part_type") == "root"]
+
+	parts, _ = scheduler.sort_parts(parts, dependencies)
+	return parts, dependencies
+
+
 @decoratorslib.undoable
-def build_rigs(exclude_types=None, build_last=True):
+def build_rigs(exclude_types=None, build_last=True, verbose=False):
 	"""
-	Build all rig parts in scene.
+	Build all rig parts in scene in dependency order in a single undo chunk,
+	the scene cleanup runs once at the end.
 
 	:param exclude_types:
 	:param build_last:
-	:return:
+	:param bool verbose: print the build banners of every part
+	:return: per part build time and the dependencies that ordered it
+	:rtype: list
 	"""
-	parts = utils.get_guides_in_scene()
-	root_parts = [p for p in parts if cmds.getAttr(p + ".partType") == "root"]
-	remaining_parts = [p for p in parts if p not in root_parts]
+	parts, dependencies = get_build_order(exclude_types, build_last)
+	report = []
 
-	if exclude_types:
-		exclude_types = utilslib.conversion.as_list(exclude_types)
-		remaining_parts = [p for p in remaining_parts if cmds.getAttr(p + ".partType") not in exclude_types]
+	for part_data in parts:
+		part_node = part_data.get("node")
+		start = time.time()
 
-	last_parts = []
-	for part_node in root_parts:
-		build_rig(part_node)
+		build_rig(part_node, cleanup=False, verbose=verbose)
 
-	for part_node in remaining_parts:
-		if cmds.objExists(part_node + ".buildLast") and cmds.getAttr(part_node + ".buildLast"):
-			last_parts.append(part_node)
-		else:
-			build_rig(part_node)
-
-	if build_last:
-		for part_node in last_parts:
-			build_rig(part_node)
+		report.append({"node": part_node,
+		               "part_type": part_data.get("part_type"),
+		               "time": time.time() - start,
+		               "dependencies": dependencies.get(part_node)})
 
 	# post cleanup for build
 	hide_stuff()
 
+	log.info("Built rig parts:\n{}".format(scheduler.format_report(report)))
+	return report
+
 
 def hide_stuff():
 	"""
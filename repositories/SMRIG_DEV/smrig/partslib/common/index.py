@@ -0,0 +1,239 @@
+"""
+On disk index of a parts library path.
+
+The index stores the listing of every directory keyed by its modification
+time and whether every part module starts with the smrig marker keyed by the
+size and modification time of the file. A rescan of an unchanged tree only
+stats the directories and files, directories are only listed again when they
+changed and files are only opened when they are new or changed.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+
+log = logging.getLogger("smrig.partslib.index")
+
+INDEX_NAME_FORMAT = "partslib_index_{}.json"
+INDEX_VERSION = 1
+PART_MARKER = "#-*-smrig:"
+PART_EXTENSIONS = [".py", ".tmpl"]
+
+
+def is_part_module(file_path):
+	"""
+	:param str file_path:
+	:return: True if the first line of the file holds the smrig part marker
+	:rtype: bool
+	"""
+	try:
+		with open(file_path, "r") as f:
+			line = f.readline()
+
+	except (IOError, OSError, UnicodeDecodeError):
+		return False
+
+	return PART_MARKER in re.sub(" +", "", line)
+
+
+class PartsIndex(object):
+	"""
+	Index of the part modules and templates of a parts library path.
+
+	USAGE:
+		index = PartsIndex("/path/to/partslib", cache_directory)
+		for directory, modules in index.scan():
+			...
+		index.save()
+	"""
+
+	def __init__(self, path, cache_directory=None, recursive=True):
+		"""
+		:param str path: parts library path
+		:param str cache_directory: folder holding the index file, the index is not persisted when None
+		:param bool recursive: include sub folders
+		"""
+		self.path = os.path.normpath(path)
+		self.recursive = recursive
+		self.file_path = None
+		self.directories = {}
+		self.stats = {"directory_hits": 0, "directory_misses": 0, "file_hits": 0, "file_misses": 0}
+		self.dirty = False
+
+		if cache_directory:
+			key = hashlib.sha1("{}|{}".format(self.path, recursive).encode("utf-8")).hexdigest()[:16]
+			self.file_path = os.path.join(cache_directory, INDEX_NAME_FORMAT.format(key))
+
+		self.load()
+
+	def load(self):
+		"""
+		Read the index file, an outdated or corrupt index is ignored.
+		"""
+		self.directories = {}
+		if not self.file_path or not os.path.isfile(self.file_path):
+			return
+
+		try:
+			with open(self.file_path, "r") as f:
+				data = json.load(f)
+
+		except (IOError, OSError, ValueError):
+			log.debug("Ignored corrupt parts index: {}".format(self.file_path))
+			return
+
+		if data.get("version") == INDEX_VERSION and data.get("path") == self.path:
+			self.directories = data.get("directories") or {}
+
+	def save(self):
+		"""
+		Write the index file when it changed.
+		"""
+		if not self.file_path or not self.dirty:
+			return
+
+		data = {"version": INDEX_VERSION, "path": self.path, "directories": self.directories}
+		temp_path = "{}.{}.tmp".format(self.file_path, os.getpid())
+
+		try:
+			if not os.path.isdir(os.path.dirname(self.file_path)):
+				os.makedirs(os.path.dirname(self.file_path))
+
+			with open(temp_path, "w") as f:
+				json.dump(data, f, sort_keys=True)
+
+			if os.path.isfile(self.file_path):
+				os.remove(self.file_path)
+
+			os.rename(temp_path, self.file_path)
+			self.dirty = False
+
+		except (IOError, OSError) as e:
+			log.warning("Could not write parts index {}: {}".format(self.file_path, e))
+
+	def get_directory(self, directory):
+		"""
+		Get the index entry of a directory, the directory is only listed again
+		when its modification time changed.
+
+		:param str directory:
+		:return: {mtime, directories, files}, None if the directory doesn't exist
+		:rtype: dict/None
+		"""
+		try:
+			mtime = os.stat(directory).st_mtime
+		except OSError:
+			return None
+
+		entry = self.directories.get(directory)
+		if entry and entry.get("mtime") == mtime:
+			self.stats["directory_hits"] += 1
+			return entry
+
+		self.stats["directory_misses"] += 1
+		previous = entry.get("files") if entry else {}
+		directories = []
+		files = {}
+
+		for name in sorted(os.listdir(directory)):
+			path = os.path.join(directory, name)
+
+			if os.path.isdir(path):
+				directories.append([name, os.path.islink(path)])
+
+			elif "_" not in name and os.path.splitext(name)[1] in PART_EXTENSIONS:
+				files[name] = previous.get(name) or {}
+
+		entry = {"mtime": mtime, "directories": directories, "files": files}
+		self.directories[directory] = entry
+		self.dirty = True
+		return entry
+
+	def get_modules(self, directory, entry):
+		"""
+		Get the part modules and templates of a directory, files are only read
+		when their size or modification time changed.
+
+		:param str directory:
+		:param dict entry: directory entry
+		:return: [(file name, "part" or "template")]
+		:rtype: list
+		"""
+		results = []
+		for name in sorted(entry.get("files")):
+			if name.endswith(".tmpl"):
+				results.append((name, "template"))
+				continue
+
+			file_path = os.path.join(directory, name)
+			try:
+				stat = os.stat(file_path)
+			except OSError:
+				continue
+
+			file_entry = entry["files"].get(name)
+			stamp = [stat.st_size, stat.st_mtime]
+
+			if file_entry.get("stamp") == stamp:
+				self.stats["file_hits"] += 1
+			else:
+				self.stats["file_misses"] += 1
+				file_entry = {"stamp": stamp, "part": is_part_module(file_path)}
+				entry["files"][name] = file_entry
+				self.dirty = True
+
+			if file_entry.get("part"):
+				results.append((name, "part"))
+
+		return results
+
+	def walk(self):
+		"""
+		Get the directories of the path in the order os.walk discovers them, the
+		sub folders of a directory are listed together before their children.
+		Linked folders are listed but not walked.
+
+		:return: [(directory, directory entry)]
+		:rtype: list
+		"""
+		root_entry = self.get_directory(self.path)
+		if root_entry is None:
+			return []
+
+		results = [(self.path, root_entry)]
+		visited = set([self.path])
+		stack = [(self.path, root_entry)] if self.recursive else []
+
+		while stack:
+			directory, entry = stack.pop()
+			children = []
+
+			for name, is_link in entry.get("directories"):
+				sub_directory = os.path.join(directory, name)
+				sub_entry = self.get_directory(sub_directory)
+
+				if sub_entry is None or sub_directory in visited:
+					continue
+
+				visited.add(sub_directory)
+				results.append((sub_directory, sub_entry))
+
+				if not is_link:
+					children.append((sub_directory, sub_entry))
+
+			stack.extend(reversed(children))
+
+		# entries of removed directories
+		for directory in [d for d in self.directories if d not in visited]:
+			self.directories.pop(directory)
+			self.dirty = True
+
+		return results
+
+	def scan(self):
+		"""
+		:return: [(directory, [(file name, "part" or "template")])]
+		:rtype: list
+		"""
+		return [(d, self.get_modules(d, e)) for d, e in self.walk()]
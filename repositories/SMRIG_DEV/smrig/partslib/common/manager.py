@@ -1,4 +1,3 @@
-import imp
 import logging
 import os
 import re
@@ -13,9 +12,11 @@ from smrig.lib import decoratorslib
 from smrig.lib import iolib
 from smrig.lib import pathlib
 from smrig.lib import selectionlib
+from smrig.lib import utilslib
 from smrig.lib.constantlib import GUIDE_GRP
 from smrig.partslib.common import basepart
 from smrig.partslib.common import guidemixin
+from smrig.partslib.common import index
 from smrig.partslib.common import rigmixin
 from smrig.partslib.common import utils
 
@@ -27,6 +28,7 @@ except:
 log = logging.getLogger("smrig.partslib.manager")
 
 template_extention = "tmpl"
+PART_CLASS_CACHE = {}
 
 
 @decoratorslib.singleton
@@ -37,6 +39,7 @@ class Manager():
 
 	def __init__(self):
 		self._data = {}
+		self._index_stats = {}
 		self.reload_lib()
 
 	@property
@@ -164,69 +167,65 @@ class Manager():
 		reload(guidemixin)
 		reload(rigmixin)
 		reload(basepart)
+		clear_class_cache()
 
 		self._data = {}
+		self._index_stats = {}
 
 		asset = env.asset.get_asset() or "%None%"
+		asset_paths = env.asset.get_paths() or []
 		paths = [p for p in self.paths if os.path.isdir(p)]
+		cache_directory = env.prefs.get_cache_directory()
 
-		all_paths = []
-		discovered = []
+		scanned = []
+		visited = []
 		for part_path in paths:
-			if os.path.isdir(part_path):
-				all_paths.append(pathlib.normpath(part_path))
-
-				if part_path not in env.asset.get_paths():
-					for root, directories, filenames in os.walk(part_path):
-						for directory in directories:
-							sub_path = os.path.join(root, directory)
-							if sub_path not in all_paths:
-								all_paths.append(pathlib.normpath(sub_path))
-
-		for directory in all_paths:
-			modules = os.listdir(directory) or []
-			modules = [module for module in modules if module not in discovered]
-			modules = [f for f in modules if "_" not in f]
-			modules = [f for f in modules if os.path.splitext(f)[1] in [".py", "." + template_extention]]
-
-			if os.path.isdir(directory) and modules:
-				for module in modules:
-					module_path = os.path.join(directory, module)
-
-					# Read python part modules
-					if module.endswith(".py"):
-						if os.path.isfile(module_path):
-							with open(module_path, "r") as f:
-								lines = f.readlines()
-
-						if "#-*-smrig:" in re.sub(" +", "", lines[0]):
-							discovered.append(module)
-
-							if asset in module_path:
-								category = asset
-							else:
-								category = os.path.basename(directory)
-
-							part_name = module.split(".")[0]
-							self._data[part_name] = {
-								"type": "part",
-								"category": category,
-								"path": pathlib.normpath(module_path)
-							}
-
-					# read template jsons
-					elif module.endswith("." + template_extention):
-						discovered.append(module)
-						category = os.path.basename(directory)
-						part_name = module.split(".")[0]
-
-						self._data[part_name] = {
-							"type": "template",
-							"category": category,
-							"path": pathlib.normpath(module_path)
-						}
-
-		log.debug("Reloaded all parts.")
+			# asset paths hold the asset parts only, sub folders are not searched
+			parts_index = index.PartsIndex(part_path, cache_directory, recursive=part_path not in asset_paths)
+
+			for directory, modules in parts_index.scan():
+				directory = pathlib.normpath(directory)
+				if directory not in visited:
+					visited.append(directory)
+					scanned.append((directory, modules))
+
+			parts_index.save()
+
+			for key, value in parts_index.stats.items():
+				self._index_stats[key] = self._index_stats.get(key, 0) + value
+
+		discovered = set()
+		for directory, modules in scanned:
+			for module, module_type in modules:
+				if module in discovered:
+					continue
+
+				discovered.add(module)
+				module_path = os.path.join(directory, module)
+
+				if module_type == "part" and asset in module_path:
+					category = asset
+				else:
+					category = os.path.basename(directory)
+
+				part_name = module.split(".")[0]
+				self._data[part_name] = {
+					"type": module_type,
+					"category": category,
+					"path": pathlib.normpath(module_path)
+				}
+
+		log.debug("Reloaded all parts: {}".format(self.get_index_stats()))
+
+	def get_index_stats(self):
+		"""
+		Get the parts index statistics of the last reload. Hits are directories
+		and files that were unchanged on disk, misses had to be listed or read.
+
+		:return: {directory_hits, directory_misses, file_hits, file_misses}
+		:rtype: dict
+		"""
+		return dict(self._index_stats)
 
 	# ---------------------------------------------------------------------------------------------------------
 
@@ -330,18 +329,49 @@ class Manager():
 			return
 
 		part = os.path.splitext(part)[0]
-		class_name = part[0].upper() + part[1:]
 		module_path = self._data.get(part).get("path")
 
 		try:
-			module = imp.load_source(part, module_path)
-			module_class = getattr(module, class_name)
+			module_class = get_part_class(part, module_path)
 			return module_class()
 
 		except Exception:
 			raise Exception(traceback.format_exception(*sys.exc_info()))
 
 
+def get_part_class(part, module_path):
+	"""
+	Get the class of a part module. The module is only loaded again when the
+	file changed since it was last loaded or the class cache was cleared.
+
+	:param str part: part type
+	:param str module_path:
+	:return: part class
+	:rtype: type
+	"""
+	stat = os.stat(module_path)
+	stamp = (stat.st_size, stat.st_mtime)
+	cached = PART_CLASS_CACHE.get(module_path)
+
+	if cached and cached[0] == stamp:
+		return cached[1]
+
+	module = utilslib.py.load_source(part, module_path)
+	module_class = getattr(module, part[0].upper() + part[1:])
+	PART_CLASS_CACHE[module_path] = (stamp, module_class)
+
+	log.debug("Loaded part module: {}".format(module_path))
+	return module_class
+
+
+def clear_class_cache():
+	"""
+	Clear the part class cache, part modules are loaded again on their next
+	instance.
+	"""
+	PART_CLASS_CACHE.clear()
+
+
 def get_template_data():
 	"""
 	Get all parts guide build dataexporter.
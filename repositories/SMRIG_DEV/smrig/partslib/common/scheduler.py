@@ -0,0 +1,190 @@
+"""
+Build order of the rig parts in a scene.
+
+Parts reference nodes of other parts through their driver, rig part and
+selection options. Every reference becomes a dependency edge on the part
+owning the node, the parts are then built in topological order. Between parts
+without dependencies the old order is kept: the root part first, then the parts
+in scene order and the "build last" parts at the end.
+
+The functions in this module only work on plain part descriptions so the
+order can be computed and reported without building anything:
+
+	{"node": "C_arm_guide", "part_type": "arm", "prefix": "C_arm_", "build_last": False,
+	 "nodes": ["C_arm_shoulder_JNT", ...], "options": {"parent": {"data_type": "parent_driver", "value": "..."}}}
+"""
+import heapq
+import logging
+
+log = logging.getLogger("smrig.partslib.scheduler")
+
+DEPENDENCY_DATA_TYPES = ["parent_driver", "attribute_driver", "rig_part", "single_selection", "selection"]
+
+
+def as_list(value):
+	"""
+	:param value:
+	:return: value as a list without empty values
+	:rtype: list
+	"""
+	values = value if isinstance(value, (list, tuple)) else [value]
+	return [v for v in values if v]
+
+
+def strip_namespace(node):
+	"""
+	:param str node:
+	:return: node name without namespace and dag path
+	:rtype: str
+	"""
+	return node.split("|")[-1].split(":")[-1]
+
+
+def get_owners(parts):
+	"""
+	:param list parts: part descriptions
+	:return: {node name: part node} of every guide node
+	:rtype: dict
+	"""
+	owners = {}
+	for part in parts:
+		for node in [part.get("node")] + list(part.get("nodes") or []):
+			owners.setdefault(strip_namespace(node), part.get("node"))
+
+	return owners
+
+
+def find_owner(node, owners, prefixes):
+	"""
+	Find the part owning a node, guide nodes are matched by name, other nodes
+	(ie. controls created by a part) by the longest matching part prefix.
+
+	:param str node:
+	:param dict owners: see :func:`get_owners`
+	:param list prefixes: [(prefix, part node)] sorted longest first
+	:return: part node, None when no part owns the node
+	:rtype: str/None
+	"""
+	name = strip_namespace(node)
+	if name in owners:
+		return owners.get(name)
+
+	for prefix, part_node in prefixes:
+		if prefix and name.startswith(prefix):
+			return part_node
+
+
+def get_dependencies(parts):
+	"""
+	Get the dependency edges between parts.
+
+	:param list parts: part descriptions
+	:return: {part node: [(dependency part node, option name, option value)]}
+	:rtype: dict
+	"""
+	owners = get_owners(parts)
+	prefixes = sorted([(p.get("prefix"), p.get("node")) for p in parts], key=lambda x: -len(x[0] or ""))
+
+	results = {}
+	for part in parts:
+		edges = []
+		for option_name in sorted(part.get("options") or {}):
+			option = part.get("options").get(option_name)
+			if option.get("data_type") not in DEPENDENCY_DATA_TYPES:
+				continue
+
+			for value in as_list(option.get("value")):
+				owner = find_owner(value, owners, prefixes)
+
+				if owner and owner != part.get("node") and owner not in [e[0] for e in edges]:
+					edges.append((owner, option_name, value))
+
+		results[part.get("node")] = edges
+
+	return results
+
+
+def get_priority(part):
+	"""
+	:param dict part:
+	:return: 0 for the root part, 2 for build last parts, 1 for all others
+	:rtype: int
+	"""
+	if part.get("part_type") == "root":
+		return 0
+
+	return 2 if part.get("build_last") else 1
+
+
+def sort_parts(parts, dependencies=None):
+	"""
+	Sort parts in dependency order, parts without dependencies between them
+	keep their priority and scene order. Parts in a dependency cycle are added
+	in priority order.
+
+	:param list parts: part descriptions in scene order
+	:param dict dependencies: see :func:`get_dependencies`
+	:return: sorted part descriptions, cycles as lists of part nodes
+	:rtype: tuple(list, list)
+	"""
+	dependencies = dependencies if dependencies is not None else get_dependencies(parts)
+	parts_by_node = dict((p.get("node"), p) for p in parts)
+	keys = dict((p.get("node"), (get_priority(p), i)) for i, p in enumerate(parts))
+
+	dependents = dict((n, []) for n in parts_by_node)
+	counts = dict((n, 0) for n in parts_by_node)
+
+	for node, edges in dependencies.items():
+		for dependency in set(e[0] for e in edges):
+			if node in counts and dependency in dependents:
+				dependents[dependency].append(node)
+				counts[node] += 1
+
+	heap = [(keys.get(n), n) for n in parts_by_node if not counts.get(n)]
+	heapq.heapify(heap)
+
+	results = []
+	cycles = []
+	while len(results) < len(parts_by_node):
+		if not heap:
+			# break a cycle at the remaining part with the highest priority
+			remaining = sorted([n for n in parts_by_node if counts.get(n) > 0], key=lambda n: keys.get(n))
+			cycles.append(remaining)
+			log.warning("Dependency cycle, breaking it at {}: {}".format(remaining[0], ", ".join(remaining)))
+
+			counts[remaining[0]] = 0
+			heapq.heappush(heap, (keys.get(remaining[0]), remaining[0]))
+
+		_, node = heapq.heappop(heap)
+		results.append(parts_by_node.get(node))
+		counts[node] = -1
+
+		for dependent in dependents.get(node):
+			if counts.get(dependent) > 0:
+				counts[dependent] -= 1
+				if not counts.get(dependent):
+					heapq.heappush(heap, (keys.get(dependent), dependent))
+
+	return results, cycles
+
+
+def format_report(report):
+	"""
+	:param list report: [{node, part_type, time, dependencies}]
+	:return: table of build times and the options causing the dependencies
+	:rtype: str
+	"""
+	lines = ["{:>4}  {:<40} {:>9}  {}".format("#", "part", "time", "depends on")]
+
+	for i, item in enumerate(report):
+		dependencies = ", ".join("{} ({}: {})".format(*e) for e in item.get("dependencies") or [])
+		time_value = item.get("time")
+
+		lines.append("{:>4}  {:<40} {:>9}  {}".format(i,
+		                                             item.get("node")[:40],
+		                                             "{:.3f}s".format(time_value) if time_value is not None else "-",
+		                                             dependencies))
+
+	total = sum(i.get("time") or 0.0 for i in report)
+	lines.append("Built {} parts in {:.3f}s.".format(len([i for i in report if i.get("time") is not None]), total))
+	return "\n".join(lines)
@@ -0,0 +1,20 @@
+"""
+Load single smrig modules by file path. Importing the smrig package requires
+maya, the modules tested here are pure python and don't.
+"""
+import importlib.util
+import os
+
+SMRIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "smrig")
+
+
+def load_module(relative_path):
+	"""
+	:param str relative_path: module path relative to the smrig package, ie. "lib/pointslib.py"
+	:return: module
+	"""
+	name = "smrig_test_" + os.path.splitext(relative_path)[0].replace("/", "_")
+	spec = importlib.util.spec_from_file_location(name, os.path.join(SMRIG_PATH, relative_path))
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from helpers import load_module
+
+batch = load_module("build/batch.py")
+
+
+def get_stub_command(*args):
+	"""
+	:return: worker command running the stub worker of the batch module
+	"""
+	return [sys.executable, batch.__file__, "--stub-worker", "{job}", "{asset}", "{variant}"] + list(args)
+
+
+class TestBatchBuilder(unittest.TestCase):
+
+	def test_success(self):
+		builder = batch.BatchBuilder([("job", "asset", "base"), ("job", "asset", "anim")],
+		                             command=get_stub_command("--stub-steps", "2"))
+		results = builder.run()
+
+		self.assertEqual([r.get("variant") for r in results], ["base", "anim"])
+		for result in results:
+			self.assertEqual(result.get("status"), "success")
+			self.assertEqual(result.get("returncode"), 0)
+			self.assertEqual(result.get("step_count"), 2)
+			self.assertEqual([s.get("index") for s in result.get("steps")], [0, 1])
+			self.assertIsNone(result.get("failed_step"))
+			self.assertNotIn("process", result)
+
+	def test_pool_limit(self):
+		active = []
+		peak = []
+
+		def on_message(result, message):
+			if message.get("type") == "start":
+				active.append(result.get("asset"))
+			elif message.get("type") == "done":
+				active.remove(result.get("asset"))
+
+			peak.append(len(active))
+
+		builds = [("job", "asset{}".format(i), "base") for i in range(5)]
+		builder = batch.BatchBuilder(builds,
+		                             command=get_stub_command("--stub-steps", "2", "--stub-delay", "0.2"),
+		                             workers=2,
+		                             on_message=on_message)
+		results = builder.run()
+
+		self.assertTrue(all(r.get("status") == "success" for r in results))
+		self.assertEqual(max(peak), 2)
+
+	def test_timeout_kills_the_build(self):
+		builder = batch.BatchBuilder([("job", "asset", "base")],
+		                             command=get_stub_command("--stub-steps", "3", "--stub-delay", "10"),
+		                             timeout=0.5)
+
+		start = time.time()
+		result = builder.run()[0]
+
+		self.assertLess(time.time() - start, 5)
+		self.assertEqual(result.get("status"), "timeout")
+		self.assertIsNotNone(result.get("returncode"))
+		self.assertNotEqual(result.get("returncode"), 0)
+
+	def test_failed_step(self):
+		builder = batch.BatchBuilder([("job", "asset", "base")],
+		                             command=get_stub_command("--stub-steps", "4", "--stub-fail-step", "1"))
+		result = builder.run()[0]
+
+		self.assertEqual(result.get("status"), "failed")
+		self.assertEqual(result.get("returncode"), 1)
+		self.assertEqual(result.get("failed_step"), 1)
+		self.assertEqual(result.get("error"), "Step 1 failed")
+		self.assertEqual([s.get("status") for s in result.get("steps")], ["success", "failed"])
+		self.assertEqual(list(result.get("log")), ["Building job asset base step 0", "Building job asset base step 1"])
+
+	def test_unstartable_command(self):
+		builder = batch.BatchBuilder([("job", "asset", "base"), ("job", "asset", "anim")],
+		                             command=[os.path.join(tempfile.gettempdir(), "missing", "mayapy"), "{job}"])
+		results = builder.run()
+
+		self.assertEqual([r.get("status") for r in results], ["error", "error"])
+		self.assertTrue(all(r.get("error") for r in results))
+
+	def test_summary_file(self):
+		directory = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directory)
+
+		builds = [("job", "asset", "base"), ("job", "asset", "anim"), ("job", "asset", "face")]
+		builder = batch.BatchBuilder(builds, command=get_stub_command("--stub-steps", "2", "--stub-fail-step", "1"))
+		builder.run()
+
+		file_path = os.path.join(directory, "summary.json")
+		builder.write_summary(file_path)
+
+		with open(file_path, "r") as f:
+			summary = json.load(f)
+
+		self.assertEqual(summary.get("total"), 3)
+		self.assertEqual(summary.get("succeeded"), 0)
+		self.assertEqual(summary.get("failed"), 3)
+		self.assertEqual(summary.get("timed_out"), 0)
+		self.assertEqual(summary.get("errors"), 0)
+		self.assertEqual([b.get("variant") for b in summary.get("builds")], ["base", "anim", "face"])
+		self.assertEqual(summary.get("builds")[0].get("log")[-1], "Building job asset base step 1")
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,79 @@
+import copy
+import os
+import tempfile
+import unittest
+
+from helpers import load_module
+
+dnasession = load_module("build/dnasession.py")
+
+
+class TestDNASession(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.source = os.path.join(self.directory, "source.dna")
+		self.target = os.path.join(self.directory, "target.dna")
+
+		with open(self.source, "w") as f:
+			f.write("0 0 0")
+
+		self.saved = {}
+		self.session = dnasession.DNASession(self.read, copy.deepcopy, self.save)
+
+	def read(self, path):
+		with open(path, "r") as f:
+			return [float(v) for v in f.read().split()]
+
+	def save(self, reader, path):
+		self.saved[path] = list(reader)
+		with open(path, "w") as f:
+			f.write(" ".join(str(v) for v in reader))
+
+	def make_step(self, fail):
+		"""
+		Step adding a delta per value in place, fails half way when fail[0] is set.
+		"""
+
+		@self.session.release_on_error
+		def step():
+			calibrated = self.session.get_calibrated(self.source, reset=True)
+			for i in range(len(calibrated)):
+				calibrated[i] += 1.0
+				if fail[0] and i == 1:
+					raise RuntimeError("step failed")
+
+			self.session.save(calibrated, self.target)
+
+		return step
+
+	def test_rerun_after_failure(self):
+		fail = [True]
+		step = self.make_step(fail)
+
+		with self.assertRaises(RuntimeError):
+			step()
+
+		self.assertEqual(self.session.calibrated, {})
+
+		fail[0] = False
+		step()
+		self.assertEqual(self.saved.get(self.target), [1.0, 1.0, 1.0])
+
+	def test_rerun_without_release(self):
+		# a half modified calibrated reader left in the session is not reused by a resetting step
+		calibrated = self.session.get_calibrated(self.source)
+		calibrated[0] += 1.0
+
+		self.make_step([False])()
+		self.assertEqual(self.saved.get(self.target), [1.0, 1.0, 1.0])
+
+	def test_source_reader_cached(self):
+		self.session.get_reader(self.source)
+		self.session.get_calibrated(self.source)
+		self.session.get_calibrated(self.source, reset=True)
+		self.assertEqual(self.session.stats.get("reads"), 1)
+
+
+if __name__ == "__main__":
+	unittest.main()
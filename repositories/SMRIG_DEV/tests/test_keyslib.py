@@ -0,0 +1,241 @@
+import random
+import unittest
+
+from helpers import load_module
+
+keyslib = load_module("lib/keyslib.py")
+numpy = keyslib.numpy
+
+
+def evaluate(key_a, key_b, t):
+	"""
+	Evaluate the segment between two keys for the tangent types the analytic
+	path supports.
+	"""
+	if key_a[3] == "step":
+		return key_a[1]
+
+	if key_a[3] == "stepnext":
+		return key_b[1]
+
+	if key_a[3] != "linear" or key_b[2] != "linear":
+		raise ValueError("Segment cannot be evaluated without the scene.")
+
+	weight = (t - key_a[0]) / float(key_b[0] - key_a[0])
+	return key_a[1] + (key_b[1] - key_a[1]) * weight
+
+
+def get_redundant_keys_from_scene(times, values, in_types, out_types, flat_keys=True, linear_keys=True, precision=3):
+	"""
+	Python port of bakelib.get_redundant_keys_from_scene on a list of
+	[time, value, in type, out type] keys.
+
+	:return: indices of the redundant keys and the tangent types of the curve afterwards
+	"""
+	keys = [[t, v, it, ot] for t, v, it, ot in zip(times, values, in_types, out_types)]
+	redundant = []
+
+	for i in range(1, len(values[1:])):
+		v = values[i]
+
+		if flat_keys and values[i + 1] == v and v == values[i - 1]:
+			redundant.append(i)
+
+			if linear_keys:
+				keys[i][2:] = ["linear", "linear"]
+
+			continue
+
+		if linear_keys:
+			lv = evaluate(keys[i - 1], keys[i + 1], keys[i][0])
+			keys[i][2:] = ["linear", "linear"]
+
+			if round(v, precision) == round(lv, precision):
+				redundant.append(i)
+
+	return redundant, [k[2] for k in keys], [k[3] for k in keys]
+
+
+def get_corpus(count=200, seed=7):
+	"""
+	Random curves with flat runs, collinear runs, step keys and values close
+	to the rounding precision.
+	"""
+	rng = random.Random(seed)
+	corpus = []
+
+	for _ in range(count):
+		size = rng.randint(0, 12)
+		times = sorted(rng.sample(range(0, 100), size))
+		values = []
+
+		for i in range(size):
+			roll = rng.random()
+			if values and roll < 0.25:
+				values.append(values[-1])
+			elif len(values) > 1 and roll < 0.5:
+				weight = (times[i] - times[i - 2]) / float(times[i - 1] - times[i - 2])
+				values.append(values[-2] + (values[-1] - values[-2]) * weight + rng.choice([0, 0.0004, 0.002]))
+			else:
+				values.append(round(rng.uniform(-10, 10), rng.randint(0, 4)))
+
+		out_types = [rng.choice(["linear", "linear", "step", "stepnext"]) for _ in range(size)]
+		in_types = ["linear"] * size
+		corpus.append((times, values, in_types, out_types))
+
+	corpus.append(([0, 1, 2, 3], [0.0, 0.0, 0.0, 0.0], ["linear"] * 4, ["step"] * 4))
+	corpus.append(([0, 1, 2, 3], [0.0, 1.0, 2.0, 3.0], ["linear"] * 4, ["linear"] * 4))
+	corpus.append(([0, 1, 2, 3, 4], [0.0, 0.0, 5.0, 5.0, 5.0], ["linear"] * 5, ["step", "step", "linear", "step", "step"]))
+	corpus.append(([0, 2], [1.0, 3.0], ["linear"] * 2, ["linear"] * 2))
+
+	return corpus
+
+
+class RedundantKeysCases(object):
+	"""
+	Shared redundant key tests, run with and without numpy.
+	"""
+	use_numpy = False
+
+	def setUp(self):
+		keyslib.numpy = numpy if self.use_numpy else None
+
+	def tearDown(self):
+		keyslib.numpy = numpy
+
+	def test_matches_scene_test(self):
+		for flat_keys, linear_keys in [(True, True), (True, False), (False, True)]:
+			for times, values, in_types, out_types in get_corpus():
+				tested_types = keyslib.get_tested_out_types(out_types)
+				self.assertTrue(keyslib.is_analytic(tested_types, in_types))
+
+				expected, _, expected_out = get_redundant_keys_from_scene(
+					times, values, in_types, out_types, flat_keys, linear_keys)
+				result = keyslib.get_redundant_keys(times, values, flat_keys, linear_keys, 3, tested_types)
+				self.assertEqual(result, expected, (times, values, out_types, flat_keys, linear_keys))
+
+				# the analytic path resets the kept inner keys, the removed ones are gone
+				if linear_keys:
+					kept = [i for i in range(len(times)) if i not in expected]
+					self.assertEqual([expected_out[i] for i in kept], [tested_types[i] for i in kept])
+
+	def test_original_types_are_not_tested_types(self):
+		# the third key is tested after the second got linear tangents
+		times, values = [0, 1, 2, 3], [0.0, 0.0, 1.5, 3.0]
+		out_types = ["linear", "step", "linear", "linear"]
+
+		expected, _, _ = get_redundant_keys_from_scene(times, values, ["linear"] * 4, out_types)
+		tested = keyslib.get_redundant_keys(times, values, True, True, 3, keyslib.get_tested_out_types(out_types))
+		original = keyslib.get_redundant_keys(times, values, True, True, 3, out_types)
+
+		self.assertEqual(tested, expected)
+		self.assertNotEqual(original, expected)
+
+	def test_spline_is_not_analytic(self):
+		self.assertFalse(keyslib.is_analytic(["linear", "linear", "linear"], ["linear", "linear", "spline"]))
+		self.assertFalse(keyslib.is_analytic(["spline", "step", "linear"], ["linear", "linear", "linear"]))
+		self.assertTrue(keyslib.is_analytic(["step", "spline", "linear"], ["linear", "spline", "spline"]))
+
+
+class TestRedundantKeysPython(RedundantKeysCases, unittest.TestCase):
+	use_numpy = False
+
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class TestRedundantKeysNumpy(RedundantKeysCases, unittest.TestCase):
+	use_numpy = True
+
+
+def get_rotations(count, size, seed=11):
+	"""
+	Random baked rotations with small steps, gimbal flips and jumps of
+	several turns.
+	"""
+	rng = random.Random(seed)
+	rotations = []
+
+	for _ in range(count):
+		channels = [[0.0], [0.0], [0.0]]
+
+		for _ in range(size - 1):
+			for channel in channels:
+				roll = rng.random()
+				if roll < 0.15:
+					step = rng.choice([-1, 1]) * rng.uniform(180, 1100)
+				elif roll < 0.3:
+					step = rng.choice([-180, 180]) + rng.uniform(-5, 5)
+				else:
+					step = rng.uniform(-20, 20)
+
+				channel.append(round(channel[-1] + step, 3))
+
+		rotations.append(channels)
+
+	return rotations
+
+
+class UnrollCases(object):
+	"""
+	Shared unroll tests, run with and without numpy.
+	"""
+	use_numpy = False
+
+	def setUp(self):
+		keyslib.numpy = numpy if self.use_numpy else None
+
+	def tearDown(self):
+		keyslib.numpy = numpy
+
+	def test_empty(self):
+		self.assertEqual(keyslib.unroll_rotations([], [], []), ([], [], []))
+		self.assertEqual(keyslib.unroll_rotations([[]], [[]], [[]]), ([[]], [[]], [[]]))
+
+	def test_single_transform(self):
+		result = keyslib.unroll_rotations((0.0, 10.0, 190.0), (0.0, 5.0, 10.0), (0.0, -370.0, 0.0))
+		self.assertEqual(result, ([0.0, 10.0, 10.0], [0.0, 5.0, 170.0], [0.0, -10.0, -180.0]))
+
+	def test_batched_matches_single(self):
+		rotations = get_rotations(20, 15)
+		batched = keyslib.unroll_rotations(*[[r[axis] for r in rotations] for axis in range(3)])
+
+		for i, (rot_x, rot_y, rot_z) in enumerate(rotations):
+			single = keyslib.unroll_rotations(rot_x, rot_y, rot_z)
+			for axis in range(3):
+				self.assertEqual(batched[axis][i], single[axis])
+
+	def test_multiple_turns(self):
+		# the old loop used '/' and added fractional turns on python 3
+		result = keyslib.unroll_rotations([0.0, -725.0, 720.0], [0.0, 725.0, -10.0], [0.0, 725.0, 0.0])
+		self.assertEqual(result, ([0.0, -5.0, 0.0], [0.0, 5.0, -10.0], [0.0, 5.0, 0.0]))
+
+		rotations = get_rotations(50, 10, seed=12)
+		for rot_x, rot_y, rot_z in rotations:
+			result = keyslib.unroll_rotations(rot_x, rot_y, rot_z)
+
+			# z is only ever moved by whole turns or the half turn of a flip
+			for before, after in zip(rot_z, result[2]):
+				half_turns = (after - before) / 180.0
+				self.assertAlmostEqual(half_turns, round(half_turns), 6)
+
+
+class TestUnrollPython(UnrollCases, unittest.TestCase):
+	use_numpy = False
+
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class TestUnrollNumpy(UnrollCases, unittest.TestCase):
+	use_numpy = True
+
+	def test_matches_python(self):
+		rotations = get_rotations(300, 12, seed=13)
+		result = keyslib.unroll_rotations(*[[r[axis] for r in rotations] for axis in range(3)])
+
+		for i, (rot_x, rot_y, rot_z) in enumerate(rotations):
+			expected = keyslib.unroll_rotation_keys(list(rot_x), list(rot_y), list(rot_z))
+			for axis in range(3):
+				for value, expected_value in zip(result[axis][i], expected[axis]):
+					self.assertAlmostEqual(value, expected_value, 6)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from helpers import load_module
+
+loader = load_module("build/loader.py")
+
+
+class TestLoad(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.module_names = []
+		sys.path.insert(0, self.directory)
+		loader.MODULE_CACHE.clear()
+
+	def tearDown(self):
+		sys.path.remove(self.directory)
+		for name in self.module_names:
+			sys.modules.pop(name, None)
+
+		loader.MODULE_CACHE.clear()
+		shutil.rmtree(self.directory)
+
+	def write_module(self, name, value):
+		"""
+		Write a step module, the modification time is moved forward so every
+		write changes the stamp.
+		"""
+		file_path = os.path.join(self.directory, name + ".py")
+		with open(file_path, "w") as f:
+			f.write("VALUE = {!r}\n".format(value))
+
+		mtime = time.time() + len(self.module_names) + 10
+		os.utime(file_path, (mtime, mtime))
+
+		if name not in self.module_names:
+			self.module_names.append(name)
+
+		return file_path
+
+	def test_first_import_is_not_reloaded(self):
+		file_path = self.write_module("loader_step_a", 1)
+		namespace, result_path = loader.load("import loader_step_a")
+
+		self.assertEqual(result_path, os.path.abspath(file_path))
+		self.assertEqual(namespace.get("loader_step_a").VALUE, 1)
+		self.assertEqual(loader.MODULE_CACHE.get(result_path).get("reloads"), 0)
+
+	def test_changed_file_is_reloaded(self):
+		self.write_module("loader_step_b", 1)
+		loader.load("import loader_step_b")
+		namespace, result_path = loader.load("import loader_step_b")
+		self.assertEqual(loader.MODULE_CACHE.get(result_path).get("reloads"), 0)
+
+		self.write_module("loader_step_b", 2)
+		namespace, result_path = loader.load("import loader_step_b")
+
+		self.assertEqual(namespace.get("loader_step_b").VALUE, 2)
+		self.assertEqual(loader.MODULE_CACHE.get(result_path).get("reloads"), 1)
+
+	def test_module_imported_before_first_load_is_reloaded(self):
+		self.write_module("loader_step_c", 1)
+		__import__("loader_step_c")
+
+		# edited after another tool imported it
+		self.write_module("loader_step_c", 2)
+		namespace, result_path = loader.load("from loader_step_c import VALUE")
+
+		self.assertEqual(namespace.get("VALUE"), 2)
+		self.assertEqual(loader.MODULE_CACHE.get(result_path).get("reloads"), 1)
+
+		loader.load("from loader_step_c import VALUE")
+		self.assertEqual(loader.MODULE_CACHE.get(result_path).get("reloads"), 1)
+
+
+if __name__ == "__main__":
+	unittest.main()
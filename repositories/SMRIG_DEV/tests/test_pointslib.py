@@ -0,0 +1,52 @@
+import unittest
+
+from helpers import load_module
+
+pointslib = load_module("lib/pointslib.py")
+numpy = pointslib.numpy
+
+
+class GetDeltasCases(object):
+	"""
+	Shared get_deltas tests, run with and without numpy.
+	"""
+	use_numpy = False
+
+	def setUp(self):
+		pointslib.numpy = numpy if self.use_numpy else None
+
+	def tearDown(self):
+		pointslib.numpy = numpy
+
+	def test_flat_buffers(self):
+		deltas, changed = pointslib.get_deltas([0, 0, 0, 1, 1, 1], [0, 0, 0, 1, 2, 3])
+		self.assertEqual(deltas, [[0.0, 0.0, 0.0], [0.0, 1.0, 2.0]])
+		self.assertEqual(changed, [1])
+
+	def test_nested_points(self):
+		deltas, changed = pointslib.get_deltas([[1, 2, 3], [4, 5, 6]], [[1, 2, 4], [4, 5, 6]])
+		self.assertEqual(deltas, [[0.0, 0.0, 1.0], [0.0, 0.0, 0.0]])
+		self.assertEqual(changed, [0])
+
+	def test_epsilon_skips_small_deltas(self):
+		deltas, changed = pointslib.get_deltas([0, 0, 0, 0, 0, 0], [1e-7, 0, -1e-7, 0, 0.5, 0], epsilon=1e-5)
+		self.assertEqual(deltas, [[0.0, 0.0, 0.0], [0.0, 0.5, 0.0]])
+		self.assertEqual(changed, [1])
+
+	def test_mismatched_lengths(self):
+		deltas, changed = pointslib.get_deltas([0, 0, 0, 0, 0, 0, 9, 9, 9], [1, 0, 0, 0, 0, 0])
+		self.assertEqual(deltas, [[1.0, 0.0, 0.0], [0.0, 0.0, 0.0]])
+		self.assertEqual(changed, [0])
+
+
+class TestGetDeltasPython(GetDeltasCases, unittest.TestCase):
+	use_numpy = False
+
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class TestGetDeltasNumpy(GetDeltasCases, unittest.TestCase):
+	use_numpy = True
+
+
+if __name__ == "__main__":
+	unittest.main()
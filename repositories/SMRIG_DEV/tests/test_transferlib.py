@@ -0,0 +1,167 @@
+import random
+import unittest
+
+from helpers import load_module
+
+transferlib = load_module("lib/transferlib.py")
+numpy = transferlib.numpy
+
+
+def get_grid(size, height=0.0, seed=3):
+	"""
+	Mesh data of a grid of quads with a little noise, every vertex has a uv.
+	"""
+	rng = random.Random(seed)
+	points = [(x + rng.uniform(-0.2, 0.2), y + rng.uniform(-0.2, 0.2), height + rng.uniform(-0.5, 0.5))
+	          for y in range(size) for x in range(size)]
+
+	poly_connects = []
+	for y in range(size - 1):
+		for x in range(size - 1):
+			poly_connects.extend([y * size + x, y * size + x + 1, (y + 1) * size + x + 1, (y + 1) * size + x])
+
+	poly_count = [4] * ((size - 1) * (size - 1))
+	uvs = [[(i % size) / float(size - 1) for i in range(size * size)],
+	       [(i // size) / float(size - 1) for i in range(size * size)]]
+
+	return {"points": points,
+	        "poly_count": poly_count,
+	        "poly_connects": poly_connects,
+	        "uvs": uvs,
+	        "uv_counts": poly_count,
+	        "uv_ids": poly_connects}
+
+
+def get_closest_brute_force(point, points, triangles):
+	"""
+	:return: squared distance and triangle of the closest point
+	"""
+	results = []
+	for triangle in triangles:
+		corners = [points[i] for i in triangle]
+		results.append((transferlib.closest_point_on_triangle(point, *corners)[0], triangle))
+
+	return min(results)
+
+
+class TestKDTree(unittest.TestCase):
+
+	def test_matches_brute_force(self):
+		rng = random.Random(1)
+		points = [(rng.uniform(-5, 5), rng.uniform(-5, 5), rng.uniform(-5, 5)) for _ in range(300)]
+		tree = transferlib.KDTree(points)
+
+		for _ in range(50):
+			point = (rng.uniform(-6, 6), rng.uniform(-6, 6), rng.uniform(-6, 6))
+			expected = sorted((transferlib.get_squared_distance(point, p), i) for i, p in enumerate(points))
+
+			for k in [1, 3, 8]:
+				self.assertEqual(tree.query(point, k=k), expected[:k])
+
+	def test_empty(self):
+		self.assertEqual(transferlib.KDTree([]).query((0, 0, 0)), [])
+
+
+class TestTriangleMesh(unittest.TestCase):
+
+	def test_matches_brute_force(self):
+		mesh_data = get_grid(12)
+		triangles = transferlib.triangulate(mesh_data.get("poly_count"), mesh_data.get("poly_connects"))
+		mesh = transferlib.TriangleMesh(mesh_data.get("points"), triangles)
+
+		rng = random.Random(2)
+		for _ in range(200):
+			point = (rng.uniform(-2, 13), rng.uniform(-2, 13), rng.uniform(-3, 3))
+			indices, weights = mesh.closest(point)
+
+			corners = [mesh_data.get("points")[i] for i in indices]
+			closest = [sum(c[axis] * w for c, w in zip(corners, weights)) for axis in range(3)]
+			distance = transferlib.get_squared_distance(point, closest)
+
+			self.assertAlmostEqual(distance, get_closest_brute_force(point, mesh_data.get("points"), triangles)[0])
+			self.assertAlmostEqual(sum(weights), 1.0)
+
+	def test_large_triangle_next_to_small_ones(self):
+		# the closest vertices belong to the small patch above the floor
+		points = [(0, 0, 0), (100, 0, 0), (0, 100, 0), (29, 29, 5), (31, 29, 5), (30, 31, 5)]
+		mesh = transferlib.TriangleMesh(points, [(0, 1, 2), (3, 4, 5)])
+
+		indices, weights = mesh.closest((30, 30, 0.1))
+		self.assertEqual(indices, (0, 1, 2))
+		self.assertAlmostEqual(weights[1], 0.3)
+		self.assertAlmostEqual(weights[2], 0.3)
+
+	def test_empty(self):
+		self.assertEqual(transferlib.TriangleMesh([], []).closest((0, 0, 0)), ((), ()))
+
+
+class TestTransferMap(unittest.TestCase):
+
+	def test_same_mesh_maps_onto_itself(self):
+		mesh_data = get_grid(6)
+		transfer_map = transferlib.get_transfer_map(mesh_data, mesh_data)
+
+		for i, (indices, weights) in enumerate(transfer_map):
+			self.assertAlmostEqual(dict(zip(indices, weights)).get(i), 1.0)
+
+	def test_uv_lookup(self):
+		source = get_grid(6)
+		target = dict(get_grid(6, height=50.0, seed=4))
+		transfer_map = transferlib.get_transfer_map(source, target, method="uvs")
+
+		# the target is far away in space but shares the uv layout
+		for i, (indices, weights) in enumerate(transfer_map):
+			self.assertAlmostEqual(dict(zip(indices, weights)).get(i), 1.0)
+
+	def test_uv_lookup_without_uvs_uses_closest_point(self):
+		source = dict(get_grid(4), uvs=None, uv_counts=None, uv_ids=None)
+		transfer_map = transferlib.get_transfer_map(source, get_grid(4), method="uvs")
+
+		self.assertEqual(len(transfer_map), 16)
+		self.assertTrue(all(len(indices) == 3 for indices, _ in transfer_map))
+
+
+class InterpolateCases(object):
+	"""
+	Shared interpolate tests, run with and without numpy.
+	"""
+	use_numpy = False
+
+	def setUp(self):
+		transferlib.numpy = numpy if self.use_numpy else None
+
+	def tearDown(self):
+		transferlib.numpy = numpy
+
+	def test_interpolate(self):
+		transfer_map = [((0, 1, 2), (0.5, 0.5, 0.0)), ((2,), (1.0,))]
+		result = transferlib.interpolate([1.0, 3.0, 10.0], transfer_map)
+		self.assertEqual(result, [2.0, 10.0])
+
+	def test_interpolate_width(self):
+		transfer_map = [((0, 1, 2), (0.25, 0.75, 0.0))]
+		result = transferlib.interpolate([1.0, 0.0, 0.0, 1.0, 0.5, 0.5], transfer_map, width=2)
+		self.assertEqual(result, [0.25, 0.75])
+
+	def test_interpolate_sparse(self):
+		sparse = {"influence_count": 3,
+		          "offsets": [0, 1, 3],
+		          "indices": [0, 1, 2],
+		          "values": [1.0, 0.5, 0.5]}
+		transfer_map = [((0, 1, 0), (0.5, 0.5, 0.0))]
+
+		dense = transferlib.interpolate([1.0, 0.0, 0.0, 0.0, 0.5, 0.5], transfer_map, width=3)
+		self.assertEqual(transferlib.interpolate_sparse(sparse, transfer_map), dense)
+
+
+class TestInterpolatePython(InterpolateCases, unittest.TestCase):
+	use_numpy = False
+
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class TestInterpolateNumpy(InterpolateCases, unittest.TestCase):
+	use_numpy = True
+
+
+if __name__ == "__main__":
+	unittest.main()